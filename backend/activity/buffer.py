@@ -0,0 +1,161 @@
+"""
+Activity — Buffered ActivityEvent writer
+
+ActivityLoggingMiddleware used to INSERT one ActivityEvent per request
+before returning the response. With ACTIVITY_BUFFERED_WRITES the request
+only appends the unsaved row to a bounded in-process ring buffer; a daemon
+thread bulk-inserts the buffer every ACTIVITY_BUFFER_FLUSH_INTERVAL_MS, or
+as soon as ACTIVITY_BUFFER_FLUSH_ROWS rows are waiting, and once more on
+stop() or at process exit.
+
+When the buffer holds ACTIVITY_BUFFER_SIZE rows (the database is down or
+slower than the traffic) the oldest row is overwritten and counted in
+`dropped`. Rows whose INSERT fails are counted in `failed`, not retried:
+activity logging must never hold back requests or grow without bound.
+created_at is the flush time, so it trails the request by at most one
+flush interval. Rows queued from the async middleware path may carry a
+still-lazy request.user, which the flusher resolves (session lookup) off the
+event loop.
+
+Code that owns the database lifetime (scripts, benchmarks, embedded
+servers) calls activity_buffer.stop() before tearing it down; if the
+database is already gone at exit, the last flush logs one warning line
+instead of a traceback.
+"""
+
+import atexit
+import logging
+import os
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+
+log = logging.getLogger('activity')
+
+
+def resolve_actor(event) -> None:
+    """Set event.actor from a request.user the async middleware left unevaluated."""
+    user = event.__dict__.pop('_pending_actor', None)
+    if user is not None and user.is_authenticated:
+        event.actor_id = user.pk
+
+
+class ActivityBuffer:
+    """Per-process ring buffer of unsaved ActivityEvent rows, reset after fork."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._reset()
+
+    def _reset(self):
+        self.pid      = os.getpid()
+        self._rows    = deque()
+        self._thread  = None
+        self._stopped = False
+        self.written = 0
+        self.dropped = 0
+        self.failed  = 0
+
+    @staticmethod
+    def enabled() -> bool:
+        return getattr(settings, 'ACTIVITY_BUFFERED_WRITES', True)
+
+    def add(self, event) -> None:
+        """Queue an unsaved ActivityEvent; never blocks on the database."""
+        size = getattr(settings, 'ACTIVITY_BUFFER_SIZE', 10_000)
+        with self._lock:
+            if self.pid != os.getpid():
+                self._reset()  # rows and thread belong to the parent process
+            if len(self._rows) >= size:
+                self._rows.popleft()
+                self.dropped += 1
+                if self.dropped % 1000 == 1:
+                    log.warning('Activity buffer full: %d events dropped so far', self.dropped)
+            self._rows.append(event)
+            if self._thread is None and not self._stopped:
+                self._thread = threading.Thread(target=self._run, name='activity-buffer', daemon=True)
+                self._thread.start()
+            due = len(self._rows) >= getattr(settings, 'ACTIVITY_BUFFER_FLUSH_ROWS', 500)
+        if due:
+            self._wake.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'buffered': len(self._rows),
+                'written':  self.written,
+                'dropped':  self.dropped,
+                'failed':   self.failed,
+            }
+
+    def flush(self, quiet: bool = False) -> int:
+        """
+        Bulk-insert every buffered row; returns the number written. With
+        quiet=True a database error is logged without a traceback.
+        """
+        from .models import ActivityEvent
+
+        with self._lock:
+            if self.pid != os.getpid():
+                self._reset()
+            rows, self._rows = list(self._rows), deque()
+        if not rows:
+            return 0
+        for row in rows:
+            try:
+                resolve_actor(row)
+            except Exception:
+                pass  # anonymous it is
+        try:
+            ActivityEvent.objects.bulk_create(rows, batch_size=500)
+        except DatabaseError as exc:
+            if quiet:
+                log.warning('Activity buffer flush failed; %d events discarded (%s)', len(rows), exc)
+            else:
+                log.exception('Activity buffer flush failed; %d events discarded', len(rows))
+            with self._lock:
+                self.failed += len(rows)
+            return 0
+        with self._lock:
+            self.written += len(rows)
+        return len(rows)
+
+    def stop(self, timeout: float = 5.0) -> int:
+        """
+        Stop the flusher thread and write what is left; returns the number
+        written. Later rows are only written by explicit flush() calls.
+        """
+        with self._lock:
+            self._stopped = True
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            self._wake.set()
+            thread.join(timeout)
+        return self.flush()
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(getattr(settings, 'ACTIVITY_BUFFER_FLUSH_INTERVAL_MS', 1000) / 1000)
+            self._wake.clear()
+            if self._stopped:
+                return
+            # Same connection lifecycle as a request: honours CONN_MAX_AGE
+            close_old_connections()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+
+activity_buffer = ActivityBuffer()
+
+
+def _flush_at_exit():
+    if activity_buffer.pid == os.getpid():
+        activity_buffer.flush(quiet=True)
+
+
+atexit.register(_flush_at_exit)
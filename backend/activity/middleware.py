@@ -1,29 +1,88 @@
+"""
+Activity — request logging middleware
+
+One ActivityEvent per request outside ACTIVITY_EXCLUDE_PATHS, handed to the
+buffered writer (activity/buffer.py). The middleware is sync- and
+async-capable: under ASGI (Daphne) the __acall__ path awaits the view and
+queues the event without any blocking I/O on the event loop — no
+sync_to_async hop per request. A request.user that nothing has evaluated
+yet is resolved by the buffer's flusher thread, not in the loop.
+"""
+
 import time
-from django.utils.deprecation import MiddlewareMixin
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.conf import settings
-from django.contrib.auth.models import AnonymousUser
+from django.utils.functional import SimpleLazyObject, empty
+
+from .buffer import activity_buffer, resolve_actor
 from .models import ActivityEvent
 
 
-class ActivityLoggingMiddleware(MiddlewareMixin):
-    def process_request(self, request):
-        request._activity_start = time.time()
+def _save(event):
+    resolve_actor(event)
+    event.save()
 
-    def process_response(self, request, response):
-        if not getattr(settings, 'ACTIVITY_TRACKING_ENABLED', True):
-            return response
 
-        path = request.path
-        exclude = set(getattr(settings, 'ACTIVITY_EXCLUDE_PATHS', ['/admin/', '/static/', '/media/']))
-        if any(path.startswith(p) for p in exclude):
-            return response
+class ActivityLoggingMiddleware:
+    sync_capable  = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # One C-level str.startswith over a tuple instead of a set per request;
+        # ACTIVITY_EXCLUDE_PATHS is read once, when the handler is built.
+        self._excluded = tuple(
+            p for p in getattr(settings, 'ACTIVITY_EXCLUDE_PATHS', ['/admin/', '/static/', '/media/']) if p
+        )
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.monotonic()
+        response = self.get_response(request)
+        try:
+            event = self._event(request, response, started, lazy_user=False)
+            if event is not None:
+                if activity_buffer.enabled():
+                    activity_buffer.add(event)
+                else:
+                    event.save()
+        except Exception:
+            # Do not break request flow due to logging failures
+            pass
+        return response
+
+    async def __acall__(self, request):
+        started = time.monotonic()
+        response = await self.get_response(request)
+        try:
+            event = self._event(request, response, started, lazy_user=True)
+            if event is not None:
+                if activity_buffer.enabled():
+                    activity_buffer.add(event)   # lock + deque append, no I/O
+                else:
+                    await sync_to_async(_save)(event)
+        except Exception:
+            pass
+        return response
 
-        duration_ms = None
-        if hasattr(request, '_activity_start'):
-            duration_ms = int((time.time() - request._activity_start) * 1000)
+    def _event(self, request, response, started, lazy_user):
+        if not getattr(settings, 'ACTIVITY_TRACKING_ENABLED', True):
+            return None
+        path = request.path
+        if path.startswith(self._excluded):
+            return None
 
         user = getattr(request, 'user', None)
-        actor = None if isinstance(user, AnonymousUser) else user
+        pending = None
+        if lazy_user and type(user) is SimpleLazyObject and user._wrapped is empty:
+            # Evaluating it would hit the session store from the event loop
+            actor, pending = None, user
+        else:
+            actor = user if getattr(user, 'is_authenticated', False) else None
 
         ip = request.META.get('HTTP_X_FORWARDED_FOR')
         if ip:
@@ -31,23 +90,17 @@ class ActivityLoggingMiddleware(MiddlewareMixin):
         else:
             ip = request.META.get('REMOTE_ADDR')
 
-        ua = request.META.get('HTTP_USER_AGENT')
-        ref = request.META.get('HTTP_REFERER')
-
-        try:
-            ActivityEvent.objects.create(
-                actor=actor,
-                action='api_call' if path.startswith('/api/') else 'view',
-                path=path,
-                method=request.method,
-                status_code=getattr(response, 'status_code', None),
-                duration_ms=duration_ms,
-                ip_address=ip,
-                user_agent=ua,
-                referrer=ref,
-            )
-        except Exception:
-            # Do not break request flow due to logging failures
-            pass
-
-        return response
+        event = ActivityEvent(
+            actor=actor,
+            action='api_call' if path.startswith('/api/') else 'view',
+            path=path,
+            method=request.method,
+            status_code=getattr(response, 'status_code', None),
+            duration_ms=int((time.monotonic() - started) * 1000),
+            ip_address=ip,
+            user_agent=request.META.get('HTTP_USER_AGENT'),
+            referrer=request.META.get('HTTP_REFERER'),
+        )
+        if pending is not None:
+            event._pending_actor = pending
+        return event
@@ -1,86 +1,159 @@
-from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
-from django.contrib.contenttypes.models import ContentType
+"""
+Activity — model change log (post_save / post_delete on every model)
+
+Each row is handed over by transaction.on_commit, so changes rolled back
+(entirely or to a savepoint) are never logged; outside a transaction the
+row is handed over immediately. With ACTIVITY_BUFFERED_WRITES committed
+rows go to the activity buffer (activity/buffer.py), which bulk-inserts
+them together with the request log, so a loop that saves N objects adds no
+INSERTs of its own. Without it, and while migrations run, each row is
+inserted at commit.
+
+Which models are logged is decided once per model class and cached together
+with its ContentType:
+  ACTIVITY_INCLUDE_APPS / ACTIVITY_EXCLUDE_APPS     — by app label
+  ACTIVITY_SIGNAL_INCLUDE_MODELS                    — allow-list of app.model
+  ACTIVITY_SIGNAL_EXCLUDE_MODELS                    — deny-list of app.model
+  ACTIVITY_SIGNAL_SAMPLE_RATES                      — app.model=rate, 0 < rate <= 1
+"""
+
+import logging
+import random
+import threading
+from functools import partial
+
 from django.conf import settings
-from django.db import transaction
+from django.contrib.contenttypes.models import ContentType
+from django.core.signals import setting_changed
+from django.db import DatabaseError, transaction
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_migrate
+from django.dispatch import receiver
+
+from .buffer import activity_buffer
 from .models import ActivityEvent
 
+log = logging.getLogger('activity')
+
+_policies = {}                 # model class → (content type id, label, sample rate) | None
+_policies_lock = threading.Lock()
+_migrating = False             # no flusher thread racing schema changes
+
+
+# ─── Per-model policy ────────────────────────────────────────────────────────
 
-def _should_track(instance):
-    # Prevent infinite recursion: creating an ActivityEvent triggers post_save again.
-    if isinstance(instance, ActivityEvent):
-        return False
-    # Avoid tracking ContentType churn from get_for_model.
-    if isinstance(instance, ContentType):
-        return False
+def _labels(name) -> set:
+    return {label.strip().lower() for label in getattr(settings, name, []) if label.strip()}
+
+
+def _sample_rates() -> dict:
+    rates = {}
+    for item in getattr(settings, 'ACTIVITY_SIGNAL_SAMPLE_RATES', []):
+        label, _, rate = item.partition('=')
+        try:
+            rates[label.strip().lower()] = min(max(float(rate), 0.0), 1.0)
+        except ValueError:
+            log.warning('Ignoring ACTIVITY_SIGNAL_SAMPLE_RATES entry %r', item)
+    return rates
+
+
+def _policy_for(model):
+    meta = model._meta
+    # Prevent infinite recursion and ContentType churn from get_for_model
+    if issubclass(model, (ActivityEvent, ContentType)):
+        return None
 
-    # Allow configuration to limit tracked apps/models
     include_apps = getattr(settings, 'ACTIVITY_INCLUDE_APPS', [])
-    exclude_apps = set(getattr(settings, 'ACTIVITY_EXCLUDE_APPS', []))
-    app_label = instance._meta.app_label
-    if include_apps and app_label not in include_apps:
-        return False
-    if app_label in exclude_apps:
-        return False
-    return True
+    if include_apps and meta.app_label not in include_apps:
+        return None
+    if meta.app_label in set(getattr(settings, 'ACTIVITY_EXCLUDE_APPS', [])):
+        return None
+    include_models = _labels('ACTIVITY_SIGNAL_INCLUDE_MODELS')
+    if include_models and meta.label_lower not in include_models:
+        return None
+    if meta.label_lower in _labels('ACTIVITY_SIGNAL_EXCLUDE_MODELS'):
+        return None
+    rate = _sample_rates().get(meta.label_lower, 1.0)
+    if rate <= 0:
+        return None
 
+    ct = ContentType.objects.get_for_model(model)
+    return ct.pk, f'signal:{ct.app_label}.{ct.model}', rate
 
-@receiver(post_save)
-def on_post_save(sender, instance, created, **kwargs):
-    if not getattr(settings, 'ACTIVITY_TRACKING_ENABLED', True):
-        return
-    if not _should_track(instance):
-        return
+
+def _policy(model):
     try:
-        ct = ContentType.objects.get_for_model(instance.__class__)
-        action = 'create' if created else 'update'
-        ct_pk = ct.pk
-        obj_pk = str(getattr(instance, 'pk'))
-        label = f"signal:{ct.app_label}.{ct.model}"
-
-        def _create():
-            try:
-                ActivityEvent.objects.create(
-                    actor=None,
-                    action=action,
-                    object_type_id=ct_pk,
-                    object_id=obj_pk,
-                    path=label,
-                    method='SIGNAL',
-                )
-            except Exception:
-                pass
-
-        transaction.on_commit(_create)
-    except Exception:
+        return _policies[model]
+    except KeyError:
         pass
+    policy = _policy_for(model)
+    with _policies_lock:
+        _policies[model] = policy
+    return policy
 
 
-@receiver(post_delete)
-def on_post_delete(sender, instance, **kwargs):
-    if not getattr(settings, 'ACTIVITY_TRACKING_ENABLED', True):
+@receiver(setting_changed)
+def _clear_on_setting_change(setting, **kwargs):
+    if setting.startswith('ACTIVITY_'):
+        _policies.clear()
+
+
+@receiver(pre_migrate)
+def _start_migrate(**kwargs):
+    global _migrating
+    _migrating = True
+
+
+@receiver(post_migrate)
+def _clear_on_migrate(**kwargs):
+    global _migrating
+    _migrating = False
+    _policies.clear()  # content type ids may have changed
+
+
+# ─── Hand-over at commit ─────────────────────────────────────────────────────
+
+def _write(row):
+    if activity_buffer.enabled() and not _migrating:
+        activity_buffer.add(row)
         return
-    if not _should_track(instance):
+    try:
+        row.save()
+    except DatabaseError:
+        # e.g. during migrations, before the activity table exists
+        log.debug('Activity signal write failed; event discarded', exc_info=True)
+
+
+def _queue(row):
+    transaction.on_commit(partial(_write, row))
+
+
+def _record(instance, action):
+    if not getattr(settings, 'ACTIVITY_TRACKING_ENABLED', True):
         return
     try:
-        ct = ContentType.objects.get_for_model(instance.__class__)
-        ct_pk = ct.pk
-        obj_pk = str(getattr(instance, 'pk'))
-        label = f"signal:{ct.app_label}.{ct.model}"
-
-        def _create():
-            try:
-                ActivityEvent.objects.create(
-                    actor=None,
-                    action='delete',
-                    object_type_id=ct_pk,
-                    object_id=obj_pk,
-                    path=label,
-                    method='SIGNAL',
-                )
-            except Exception:
-                pass
-
-        transaction.on_commit(_create)
+        policy = _policy(instance.__class__)
+        if policy is None:
+            return
+        ct_pk, label, rate = policy
+        if rate < 1.0 and random.random() >= rate:
+            return
+        _queue(ActivityEvent(
+            actor=None,
+            action=action,
+            object_type_id=ct_pk,
+            object_id=str(getattr(instance, 'pk')),
+            path=label,
+            method='SIGNAL',
+        ))
     except Exception:
         pass
+
+
+@receiver(post_save)
+def on_post_save(sender, instance, created, **kwargs):
+    _record(instance, 'create' if created else 'update')
+
+
+@receiver(post_delete)
+def on_post_delete(sender, instance, **kwargs):
+    _record(instance, 'delete')
@@ -0,0 +1,193 @@
+"""
+AtonixDev Activity — request / model activity logging tests
+
+Run:
+    python manage.py test activity
+"""
+
+import uuid
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from billing.models import Organization, UsageEvent
+
+from .buffer import ActivityBuffer
+from .middleware import ActivityLoggingMiddleware
+from .models import ActivityEvent
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Buffered writes
+# ─────────────────────────────────────────────────────────────────────────────
+
+# The flusher thread stays asleep; tests flush explicitly on the test connection.
+# Sessions live in the cache: the file backend needs SESSION_FILE_PATH to exist.
+QUIET_FLUSHER = {
+    'ACTIVITY_BUFFERED_WRITES':          True,
+    'ACTIVITY_BUFFER_FLUSH_INTERVAL_MS': 3_600_000,
+    'ACTIVITY_BUFFER_FLUSH_ROWS':        1_000_000,
+    'SESSION_ENGINE':                    'django.contrib.sessions.backends.cache',
+}
+
+
+@override_settings(**QUIET_FLUSHER)
+class ActivityBufferTests(TestCase):
+    def setUp(self):
+        self.requests = ActivityEvent.objects.exclude(method='SIGNAL')
+        self.buffer = ActivityBuffer()
+        patcher = mock.patch('activity.middleware.activity_buffer', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_request_is_logged_without_a_synchronous_insert(self):
+        response = self.client.get('/api/activity-buffer-probe/')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.requests.count(), 0)
+        self.assertEqual(self.buffer.stats()['buffered'], 1)
+
+        self.assertEqual(self.buffer.flush(), 1)
+        event = self.requests.get()
+        self.assertEqual(event.path, '/api/activity-buffer-probe/')
+        self.assertEqual(event.action, 'api_call')
+        self.assertEqual(event.status_code, 404)
+        self.assertEqual(self.buffer.stats(), {'buffered': 0, 'written': 1, 'dropped': 0, 'failed': 0})
+
+    @override_settings(ACTIVITY_BUFFER_SIZE=3)
+    def test_full_buffer_drops_the_oldest_events(self):
+        with self.assertLogs('activity', 'WARNING'):
+            for n in range(5):
+                self.buffer.add(ActivityEvent(action='view', path=f'/page/{n}/', method='GET'))
+        self.assertEqual(self.buffer.stats()['dropped'], 2)
+
+        self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(
+            sorted(self.requests.values_list('path', flat=True)),
+            ['/page/2/', '/page/3/', '/page/4/'],
+        )
+
+    def test_stop_writes_the_rest_and_retires_the_flusher(self):
+        self.buffer.add(ActivityEvent(action='view', path='/before-stop/', method='GET'))
+        flusher = self.buffer._thread
+        self.assertEqual(self.buffer.stop(), 1)
+        self.assertFalse(flusher.is_alive())
+
+        self.buffer.add(ActivityEvent(action='view', path='/after-stop/', method='GET'))
+        self.assertIs(self.buffer._thread, flusher)  # no new flusher is started
+        self.assertEqual(self.buffer.stats()['buffered'], 1)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Model change log
+# ─────────────────────────────────────────────────────────────────────────────
+
+@override_settings(**QUIET_FLUSHER)
+class ActivitySignalTests(TestCase):
+    def setUp(self):
+        self.buffer = ActivityBuffer()
+        patcher = mock.patch('activity.signals.activity_buffer', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _logged(self, model_label) -> list:
+        self.buffer.flush()
+        return list(
+            ActivityEvent.objects.filter(path=f'signal:{model_label}', method='SIGNAL')
+            .order_by('id').values_list('action', 'object_id')
+        )
+
+    def test_committed_activity_is_buffered_not_inserted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            orgs = [Organization.objects.create(name=f'Org {n}', slug=f'org-{n}') for n in range(5)]
+            orgs[0].name = 'Renamed'
+            orgs[0].save()
+            self.assertEqual(self.buffer.stats()['buffered'], 0)
+        self.assertFalse(ActivityEvent.objects.filter(path='signal:billing.organization').exists())
+        self.assertEqual(self.buffer.stats()['buffered'], 6)
+        self.assertEqual(
+            self._logged('billing.organization'),
+            [('create', str(org.pk)) for org in orgs] + [('update', str(orgs[0].pk))],
+        )
+
+    @override_settings(ACTIVITY_BUFFERED_WRITES=False)
+    def test_unbuffered_activity_is_written_at_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            org = Organization.objects.create(name='Direct', slug='direct')
+            self.assertFalse(ActivityEvent.objects.filter(path='signal:billing.organization').exists())
+        self.assertEqual(self._logged('billing.organization'), [('create', str(org.pk))])
+
+    def test_rolled_back_savepoint_is_not_logged(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            kept = Organization.objects.create(name='Kept', slug='kept')
+            try:
+                with transaction.atomic():
+                    Organization.objects.create(name='Gone', slug='gone')
+                    raise RuntimeError('roll back')
+            except RuntimeError:
+                pass
+            Organization.objects.filter(pk=kept.pk).get().delete()
+        self.assertEqual(
+            self._logged('billing.organization'),
+            [('create', str(kept.pk)), ('delete', str(kept.pk))],
+        )
+
+    def test_model_deny_list_and_sampling(self):
+        org = Organization.objects.create(name='Quiet', slug='quiet')
+        with self.captureOnCommitCallbacks(execute=True):
+            UsageEvent.objects.create(
+                event_id=uuid.uuid4(), organization=org, service='compute', event_type='vm.started',
+                units=Decimal('1'), unit_type='vm_hour', event_timestamp=timezone.now(),
+            )
+        self.assertEqual(self._logged('billing.usageevent'), [])
+
+        with override_settings(ACTIVITY_SIGNAL_SAMPLE_RATES=['billing.organization=0']):
+            with self.captureOnCommitCallbacks(execute=True):
+                Organization.objects.create(name='Sampled out', slug='sampled-out')
+        self.assertEqual(self._logged('billing.organization'), [])
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Async middleware path
+# ─────────────────────────────────────────────────────────────────────────────
+
+@override_settings(**QUIET_FLUSHER)
+class AsyncActivityMiddlewareTests(TestCase):
+    def setUp(self):
+        self.requests = ActivityEvent.objects.exclude(method='SIGNAL')
+        self.buffer = ActivityBuffer()
+        patcher = mock.patch('activity.middleware.activity_buffer', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_middleware_is_async_under_an_async_handler(self):
+        async def get_response(request):
+            return None
+
+        self.assertTrue(iscoroutinefunction(ActivityLoggingMiddleware(get_response)))
+        self.assertFalse(iscoroutinefunction(ActivityLoggingMiddleware(lambda request: None)))
+
+    async def test_async_request_is_queued_without_database_access(self):
+        def no_queries(execute, sql, params, many, context):
+            raise AssertionError(f'query from the async request path: {sql}')
+
+        with connection.execute_wrapper(no_queries):
+            response = await self.async_client.get('/api/activity-async-probe/')
+            await self.async_client.get('/static/activity-async-probe.css')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.buffer.stats()['buffered'], 1)
+
+        user = await sync_to_async(User.objects.create_user)('probe', password='probe')
+        await sync_to_async(self.async_client.force_login)(user)
+        await self.async_client.get('/api/activity-async-probe/')
+        self.assertEqual(await sync_to_async(self.buffer.flush)(), 2)
+
+        actors = await sync_to_async(list)(self.requests.order_by('id').values_list('path', 'actor_id'))
+        self.assertEqual(actors, [
+            ('/api/activity-async-probe/', None),
+            ('/api/activity-async-probe/', user.pk),
+        ])
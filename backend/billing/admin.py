@@ -2,6 +2,8 @@ from django.contrib import admin
 from .models import (
     Organization, PricingRule, UsageEvent, LedgerEntry,
     Invoice, InvoiceLineItem, Credit, Payment, OrgBalance, BillingAuditLog,
+    BillingSequence, IngestQueueItem, DuplicateEventCount, BillingRun, BillingRunItem,
+    LedgerCheckpoint,
 )
 
 
@@ -72,8 +74,8 @@ class PaymentAdmin(admin.ModelAdmin):
 
 @admin.register(OrgBalance)
 class OrgBalanceAdmin(admin.ModelAdmin):
-    list_display  = ('organization', 'total_charges', 'total_payments', 'total_credits', 'outstanding', 'last_computed')
-    readonly_fields = ('id', 'last_computed')
+    list_display  = ('organization', 'total_charges', 'total_payments', 'total_credits', 'outstanding', 'ledger_balance', 'last_computed')
+    readonly_fields = ('id', 'ledger_balance', 'last_computed')
 
 
 @admin.register(BillingAuditLog)
@@ -87,3 +89,47 @@ class BillingAuditLogAdmin(admin.ModelAdmin):
 
     def has_delete_permission(self, request, obj=None):
         return False
+
+
+@admin.register(BillingSequence)
+class BillingSequenceAdmin(admin.ModelAdmin):
+    list_display  = ('name', 'next_value', 'updated_at')
+    readonly_fields = ('name', 'next_value', 'updated_at')
+
+
+@admin.register(IngestQueueItem)
+class IngestQueueItemAdmin(admin.ModelAdmin):
+    list_display  = ('id', 'status', 'attempts', 'source_ip', 'enqueued_at')
+    list_filter   = ('status',)
+    readonly_fields = ('id', 'payload', 'source_ip', 'attempts', 'last_error', 'enqueued_at')
+
+
+@admin.register(DuplicateEventCount)
+class DuplicateEventCountAdmin(admin.ModelAdmin):
+    list_display  = ('event_id', 'count', 'first_seen_at', 'last_seen_at')
+    search_fields = ('event_id',)
+    readonly_fields = ('event_id', 'count', 'first_seen_at', 'last_seen_at')
+
+
+class BillingRunItemInline(admin.TabularInline):
+    model           = BillingRunItem
+    extra           = 0
+    readonly_fields = ('organization', 'status', 'invoice', 'attempts', 'duration_ms', 'error', 'finished_at')
+    can_delete      = False
+
+
+@admin.register(BillingRun)
+class BillingRunAdmin(admin.ModelAdmin):
+    list_display  = ('id', 'period_start', 'period_end', 'status', 'started_at', 'finished_at')
+    list_filter   = ('status',)
+    readonly_fields = ('period_start', 'period_end', 'status', 'started_at', 'finished_at', 'created_by')
+    inlines       = [BillingRunItemInline]
+
+
+@admin.register(LedgerCheckpoint)
+class LedgerCheckpointAdmin(admin.ModelAdmin):
+    list_display  = ('organization', 'as_of', 'ledger_balance', 'entry_count', 'last_seq')
+    readonly_fields = (
+        'organization', 'as_of', 'last_seq', 'entry_count', 'total_charges',
+        'total_payments', 'total_credits', 'ledger_balance', 'created_at',
+    )
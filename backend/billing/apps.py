@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class BillingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'billing'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from .models import PricingRule
+        from .pricing import invalidate_pricing_cache
+
+        post_save.connect(invalidate_pricing_cache, sender=PricingRule, dispatch_uid='billing_pricing_save')
+        post_delete.connect(invalidate_pricing_cache, sender=PricingRule, dispatch_uid='billing_pricing_delete')
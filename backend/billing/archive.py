@@ -0,0 +1,365 @@
+"""
+AtonixDev Billing — Columnar archive of expired usage events
+
+billing_retention --archive streams UsageEvents that are past their retention
+window into compressed files, one set per event month, before deleting them:
+
+  parquet    — Parquet with zstd (needs pyarrow)
+  arrow      — Arrow IPC file with zstd (needs pyarrow; used when the
+               pyarrow build lacks Parquet support)
+  ndjson.gz  — gzipped NDJSON, the dependency-free fallback
+
+BILLING_ARCHIVE_FORMAT picks one explicitly; 'auto' takes the first available.
+
+Layout (BILLING_ARCHIVE_DIR, or default_storage under billing-archive/):
+  usage_events/manifest-<generation>.json
+  usage_events/<YYYY-MM>/part-<stamp>-<id>.<ext>
+
+The manifest lists every part with its month, format, row count, event time
+range and processed totals. query_archive() re-aggregates archived months
+straight from the parts, without restoring anything to the database.
+
+Reruns are idempotent. Each part records the (event_timestamp, id) key range
+it covers and its received_before bound; an event inside both was archived
+by that part, so a rerun after a failed delete (or a crash mid-run) skips it
+instead of archiving it twice. Late events that landed inside an archived
+range afterwards have a later received_at and are still archived.
+
+The manifest is never rewritten in place: every update is saved as the next
+generation and older generations are deleted afterwards, keeping the
+previous one as a fallback for a torn write. Works on any Storage backend.
+"""
+
+import gzip
+import json
+import os
+import re
+import tempfile
+import uuid
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .exports import EVENT_EXPORT_FIELDS, _plain
+from .services import _as_datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc  # noqa: F401 — registers pa.ipc
+except ImportError:  # optional: archives fall back to gzipped NDJSON
+    pa = None
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+FORMATS = ('parquet', 'arrow', 'ndjson.gz')
+_MANIFEST_DIR = 'usage_events'
+_LEGACY_MANIFEST = 'usage_events/manifest.json'
+_GENERATION = re.compile(r'manifest-(\d{12})\.json')
+_UUID_FIELDS = {'id', 'event_id', 'organization_id'}
+
+
+# ─── Configuration ───────────────────────────────────────────────────────────
+
+def archive_format() -> str:
+    wanted = getattr(settings, 'BILLING_ARCHIVE_FORMAT', 'auto')
+    if wanted == 'auto':
+        return 'parquet' if pq else 'arrow' if pa else 'ndjson.gz'
+    if wanted not in FORMATS:
+        raise ImproperlyConfigured(f'BILLING_ARCHIVE_FORMAT must be auto or one of {FORMATS}')
+    if (wanted == 'parquet' and pq is None) or (wanted == 'arrow' and pa is None):
+        raise ImproperlyConfigured(f'BILLING_ARCHIVE_FORMAT={wanted} requires pyarrow')
+    return wanted
+
+
+def archive_storage():
+    directory = getattr(settings, 'BILLING_ARCHIVE_DIR', '')
+    return (FileSystemStorage(location=directory), '') if directory else (default_storage, 'billing-archive/')
+
+
+def _generations(storage, prefix) -> list:
+    """(generation, name) of every saved manifest, newest first."""
+    try:
+        _, files = storage.listdir(prefix + _MANIFEST_DIR)
+    except OSError:
+        return []
+    found = [(int(m.group(1)), f'{prefix}{_MANIFEST_DIR}/{f}') for f in files if (m := _GENERATION.fullmatch(f))]
+    return sorted(found, reverse=True)
+
+
+def read_manifest() -> dict:
+    storage, prefix = archive_storage()
+    names = [name for _, name in _generations(storage, prefix)] + [prefix + _LEGACY_MANIFEST]
+    for name in names:
+        if not storage.exists(name):
+            continue
+        try:
+            with storage.open(name, 'rb') as fh:
+                return json.load(fh)
+        except ValueError:
+            continue  # torn write: fall back to the previous generation
+    return {'version': 1, 'parts': []}
+
+
+def _write_manifest(manifest: dict) -> None:
+    """Save the manifest as a new generation, then prune all but the previous one."""
+    storage, prefix = archive_storage()
+    generations = _generations(storage, prefix)
+    generation = (generations[0][0] if generations else 0) + 1
+    name = f'{prefix}{_MANIFEST_DIR}/manifest-{generation:012d}.json'
+    storage.save(name, ContentFile(json.dumps(manifest, indent=2, cls=DjangoJSONEncoder).encode()))
+    stale = [old for _, old in generations[1:]]
+    if storage.exists(prefix + _LEGACY_MANIFEST):
+        stale.append(prefix + _LEGACY_MANIFEST)
+    for old in stale:
+        storage.delete(old)
+
+
+# ─── Part writers ────────────────────────────────────────────────────────────
+
+def _arrow_schema():
+    string, ts = pa.string(), pa.timestamp('us', tz='UTC')
+    types = {
+        'user_id':         pa.int64(),
+        'units':           pa.decimal128(20, 6),
+        'unit_price':      pa.decimal128(12, 6),
+        'total_cost':      pa.decimal128(16, 6),
+        'event_timestamp': ts,
+        'received_at':     ts,
+        'processed_at':    ts,
+    }
+    return pa.schema([(name, types.get(name, string)) for name in EVENT_EXPORT_FIELDS])
+
+
+def _arrow_value(name, value):
+    if value is None:
+        return None
+    if name in _UUID_FIELDS:
+        return str(value)
+    if name == 'metadata':
+        return json.dumps(value, cls=DjangoJSONEncoder)
+    return value
+
+
+class _ArrowPart:
+    def __init__(self, path: str, fmt: str):
+        self.schema = _arrow_schema()
+        if fmt == 'parquet':
+            self._sink   = None
+            self._writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+        else:
+            self._sink   = pa.OSFile(path, 'wb')
+            self._writer = pa.ipc.new_file(
+                self._sink, self.schema, options=pa.ipc.IpcWriteOptions(compression='zstd'),
+            )
+        self._fmt = fmt
+
+    def write(self, rows: list) -> None:
+        arrays = [
+            pa.array([_arrow_value(name, row[i]) for row in rows], type=self.schema.field(name).type)
+            for i, name in enumerate(EVENT_EXPORT_FIELDS)
+        ]
+        batch = pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+        if self._fmt == 'parquet':
+            self._writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self._writer.write_batch(batch)
+
+    def close(self) -> None:
+        self._writer.close()
+        if self._sink is not None:
+            self._sink.close()
+
+
+class _NdjsonPart:
+    def __init__(self, path: str, fmt: str):
+        self._fh = gzip.open(path, 'wt', encoding='utf-8')
+
+    def write(self, rows: list) -> None:
+        for row in rows:
+            self._fh.write(json.dumps(dict(zip(EVENT_EXPORT_FIELDS, map(_plain, row))), cls=DjangoJSONEncoder) + '\n')
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+# ─── Archive ─────────────────────────────────────────────────────────────────
+
+def _month(when) -> str:
+    return _as_datetime(when).astimezone(dt_timezone.utc).strftime('%Y-%m')
+
+
+def _covered_ranges(manifest: dict) -> dict:
+    """month → [(first key, last key, received_before)] of the parts already archived."""
+    ranges = {}
+    for entry in manifest['parts']:
+        if not entry.get('received_before'):
+            continue  # written before ranges were recorded
+        ranges.setdefault(entry['month'], []).append((
+            (_as_datetime(entry['first_event_at']), uuid.UUID(entry['first_id'])),
+            (_as_datetime(entry['last_event_at']), uuid.UUID(entry['last_id'])),
+            _as_datetime(entry['received_before']),
+        ))
+    return ranges
+
+
+def archive_usage_events(queryset, chunk_size: int = None, received_before=None) -> list:
+    """
+    Stream the events of `queryset` received before `received_before`
+    (default: now) into one archive part per event month and record each
+    part in the manifest. Events an earlier run already archived are skipped.
+    Returns the new manifest entries. Rows are read with a chunked iterator,
+    so memory stays flat.
+    """
+    fmt = archive_format()
+    writer_cls = _NdjsonPart if fmt == 'ndjson.gz' else _ArrowPart
+    chunk_size = chunk_size or getattr(settings, 'BILLING_EXPORT_CHUNK_SIZE', 2000)
+    received_before = _as_datetime(received_before) or timezone.now()
+    storage, prefix = archive_storage()
+    ts_index, status_index = EVENT_EXPORT_FIELDS.index('event_timestamp'), EVENT_EXPORT_FIELDS.index('status')
+    units_index, cost_index = EVENT_EXPORT_FIELDS.index('units'), EVENT_EXPORT_FIELDS.index('total_cost')
+    id_index, received_index = EVENT_EXPORT_FIELDS.index('id'), EVENT_EXPORT_FIELDS.index('received_at')
+    covered = _covered_ranges(read_manifest())
+
+    def archived(month, key, received_at) -> bool:
+        return any(
+            first <= key <= last and received_at < bound
+            for first, last, bound in covered.get(month, ())
+        )
+
+    rows = (
+        queryset.filter(received_at__lt=received_before)
+        .order_by('event_timestamp', 'id')
+        .values_list(*EVENT_EXPORT_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+    parts = []
+    stamp = timezone.now().strftime('%Y%m%dT%H%M%SZ')
+
+    with tempfile.TemporaryDirectory(prefix='billing-archive-') as tmp:
+        part = None
+
+        def finish(part):
+            if part['buffer']:
+                part['writer'].write(part['buffer'])
+            part['writer'].close()
+            name = f'{prefix}usage_events/{part["month"]}/part-{stamp}-{uuid.uuid4().hex[:8]}.{fmt}'
+            with open(part['path'], 'rb') as fh:
+                name = storage.save(name, File(fh))
+            entry = {
+                'month':            part['month'],
+                'path':             name[len(prefix):],
+                'format':           fmt,
+                'rows':             part['rows'],
+                'bytes':            os.path.getsize(part['path']),
+                'first_event_at':   part['first'],
+                'last_event_at':    part['last'],
+                'first_id':         part['first_id'],
+                'last_id':          part['last_id'],
+                'received_before':  received_before.isoformat(),
+                'processed_units':  str(part['units']),
+                'processed_cost':   str(part['cost']),
+                'archived_at':      timezone.now().isoformat(),
+            }
+            os.remove(part['path'])
+            manifest = read_manifest()
+            manifest['parts'].append(entry)
+            _write_manifest(manifest)
+            parts.append(entry)
+
+        for row in rows:
+            month = _month(row[ts_index])
+            if archived(month, (row[ts_index], row[id_index]), row[received_index]):
+                continue
+            if part is None or part['month'] != month:
+                if part is not None:
+                    finish(part)
+                path = os.path.join(tmp, f'{month}.{fmt}')
+                part = {
+                    'month': month, 'path': path, 'writer': writer_cls(path, fmt), 'buffer': [],
+                    'rows': 0, 'first': row[ts_index].isoformat(), 'last': None,
+                    'first_id': str(row[id_index]), 'last_id': None,
+                    'units': Decimal('0'), 'cost': Decimal('0'),
+                }
+            part['buffer'].append(row)
+            part['rows'] += 1
+            part['last'] = row[ts_index].isoformat()
+            part['last_id'] = str(row[id_index])
+            if row[status_index] == 'processed':
+                part['units'] += row[units_index]
+                part['cost'] += row[cost_index]
+            if len(part['buffer']) >= chunk_size:
+                part['writer'].write(part['buffer'])
+                part['buffer'] = []
+        if part is not None:
+            finish(part)
+    return parts
+
+
+# ─── Query ───────────────────────────────────────────────────────────────────
+
+def _iter_part(entry: dict, columns: list):
+    """Yield dicts with `columns` from one archived part."""
+    storage, prefix = archive_storage()
+    with storage.open(prefix + entry['path'], 'rb') as fh:
+        if entry['format'] == 'ndjson.gz':
+            with gzip.open(fh, 'rt', encoding='utf-8') as lines:
+                for line in lines:
+                    row = json.loads(line)
+                    yield {c: row.get(c) for c in columns}
+            return
+        if pa is None:
+            raise ImproperlyConfigured(f'Reading {entry["format"]} archives requires pyarrow')
+        if entry['format'] == 'parquet':
+            batches = pq.ParquetFile(fh).iter_batches(columns=columns)
+        else:
+            reader  = pa.ipc.open_file(fh)
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        for batch in batches:
+            data = batch.to_pydict()
+            yield from (dict(zip(columns, values)) for values in zip(*(data[c] for c in columns)))
+
+
+def query_archive(since=None, until=None, group_by=('service', 'unit_type'), statuses=('processed',)) -> list:
+    """
+    Re-aggregate archived events with since <= event_timestamp < until,
+    grouped by any export column or 'month'. Returns one dict per group
+    with event_count, total_units and total_cost, sorted by the group key.
+    Parts outside the range are skipped using the manifest alone.
+    """
+    since, until = _as_datetime(since), _as_datetime(until)
+    columns = sorted(
+        ({c for c in group_by if c != 'month'} | {'event_timestamp', 'status', 'units', 'total_cost'})
+    )
+    unknown = set(columns) - set(EVENT_EXPORT_FIELDS)
+    if unknown:
+        raise ValueError(f'Unknown group_by columns: {sorted(unknown)}')
+
+    groups = {}
+    for entry in read_manifest()['parts']:
+        if (since and _as_datetime(entry['last_event_at']) < since) or \
+           (until and _as_datetime(entry['first_event_at']) >= until):
+            continue
+        for row in _iter_part(entry, columns):
+            if statuses and row['status'] not in statuses:
+                continue
+            when = _as_datetime(row['event_timestamp'])
+            if (since and when < since) or (until and when >= until):
+                continue
+            key = tuple(entry['month'] if c == 'month' else row[c] for c in group_by)
+            acc = groups.setdefault(key, [0, Decimal('0'), Decimal('0')])
+            acc[0] += 1
+            acc[1] += Decimal(str(row['units']))
+            acc[2] += Decimal(str(row['total_cost']))
+    return [
+        {**dict(zip(group_by, key)), 'event_count': n, 'total_units': units, 'total_cost': cost}
+        for key, (n, units, cost) in sorted(groups.items(), key=lambda item: tuple(map(str, item[0])))
+    ]
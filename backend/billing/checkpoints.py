@@ -0,0 +1,175 @@
+"""
+AtonixDev Billing — Ledger checkpoints for point-in-time balances
+
+OrgBalance only holds the current balance. "What did this org owe at time T"
+used to mean summing every LedgerEntry since the beginning of time.
+LedgerCheckpoint rows materialize per-org totals at a point in time:
+
+  balance at T = nearest checkpoint with as_of <= T
+               + entries with checkpoint.as_of < created_at <= T
+
+so statements and audits of long-lived organizations read a short tail of
+entries, not the whole history.
+
+billing_ledger_checkpoints writes the checkpoints on a shared grid: each run
+picks a cut-off (now minus BILLING_LEDGER_CHECKPOINT_LAG), sums the entries
+between the previous cut-off and the new one with one grouped query, and
+writes a checkpoint only for orgs that had activity in that window. An org
+without a new checkpoint had no entries, so its older checkpoint is still
+exact. The lag keeps transactions that are still in flight out of the
+window; created_at is set before commit.
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from .models import LedgerCheckpoint, LedgerEntry
+from .services import BalanceEngine, _IN_CHUNK, _as_datetime, _chunked, _round
+
+TOTAL_FIELDS = ('total_charges', 'total_payments', 'total_credits', 'ledger_balance')
+
+
+# ─── Aggregation ─────────────────────────────────────────────────────────────
+
+def _zero() -> dict:
+    return {field: Decimal('0') for field in TOTAL_FIELDS} | {'entry_count': 0, 'last_seq': None}
+
+
+def _window_totals(qs) -> dict:
+    """{org_id: totals} for the entries in `qs`, in OrgBalance conventions."""
+    rows = (
+        qs.order_by()
+        .values('organization_id', 'entry_type')
+        .annotate(s=Sum('amount'), n=Count('id'), last=Max('seq'))
+    )
+    totals = {}
+    for row in rows:
+        t = totals.setdefault(row['organization_id'], _zero())
+        amount = row['s'] or Decimal('0')
+        t['ledger_balance'] += amount
+        t['entry_count']    += row['n']
+        if row['last'] is not None:
+            t['last_seq'] = max(t['last_seq'] or 0, row['last'])
+        bucket = BalanceEngine._BUCKETS.get(row['entry_type'])
+        # payments / credits are negative ledger amounts, stored as positive totals
+        if bucket == 'charge':
+            t['total_charges'] += amount
+        elif bucket == 'payment':
+            t['total_payments'] -= amount
+        elif bucket == 'credit':
+            t['total_credits'] -= amount
+    return totals
+
+
+def _add(base: dict, tail: dict) -> dict:
+    out = {field: _round(base[field] + tail[field]) for field in TOTAL_FIELDS}
+    out['entry_count'] = base['entry_count'] + tail['entry_count']
+    seqs = [s for s in (base['last_seq'], tail['last_seq']) if s is not None]
+    out['last_seq'] = max(seqs) if seqs else None
+    return out
+
+
+def _from_checkpoint(checkpoint) -> dict:
+    if checkpoint is None:
+        return _zero()
+    return {field: getattr(checkpoint, field) for field in (*TOTAL_FIELDS, 'entry_count', 'last_seq')}
+
+
+# ─── Point-in-time queries ───────────────────────────────────────────────────
+
+def nearest_checkpoint(organization_id, when):
+    return (
+        LedgerCheckpoint.objects
+        .filter(organization_id=organization_id, as_of__lte=when)
+        .order_by('-as_of')
+        .first()
+    )
+
+
+def ledger_totals_at(organization_id, when=None) -> dict:
+    """
+    Ledger totals of one org over entries with created_at <= `when` (default
+    now): total_charges, total_payments, total_credits, outstanding,
+    ledger_balance and entry_count. `checkpoint` is the as_of of the
+    checkpoint the tail was added to, or None if the whole ledger was read.
+    """
+    when = _as_datetime(when) or timezone.now()
+    checkpoint = nearest_checkpoint(organization_id, when)
+    tail = LedgerEntry.objects.filter(organization_id=organization_id, created_at__lte=when)
+    if checkpoint is not None:
+        tail = tail.filter(created_at__gt=checkpoint.as_of)
+    totals = _add(_from_checkpoint(checkpoint), _window_totals(tail).get(organization_id, _zero()))
+    totals['outstanding'] = _round(totals['total_charges'] - totals['total_payments'] - totals['total_credits'])
+    totals['as_of']       = when
+    totals['checkpoint']  = checkpoint.as_of if checkpoint else None
+    return totals
+
+
+def ledger_statement(organization_id, since=None, until=None) -> dict:
+    """
+    Opening totals as of `since` (zero when omitted), closing totals as of
+    `until` (default now) and the movement of each total in between.
+    """
+    closing = ledger_totals_at(organization_id, until)
+    opening = ledger_totals_at(organization_id, since) if since else {**_zero(), 'outstanding': Decimal('0')}
+    fields = (*TOTAL_FIELDS, 'outstanding', 'entry_count')
+    return {
+        'opening':   opening,
+        'closing':   closing,
+        'movements': {field: closing[field] - opening[field] for field in fields},
+    }
+
+
+# ─── Writer ──────────────────────────────────────────────────────────────────
+
+def checkpoint_cutoff():
+    """Newest instant that is safe to checkpoint (now minus the settle lag)."""
+    return timezone.now() - timedelta(seconds=getattr(settings, 'BILLING_LEDGER_CHECKPOINT_LAG', 300))
+
+
+def latest_cutoff():
+    """as_of of the most recent checkpoint run, or None before the first one."""
+    return LedgerCheckpoint.objects.aggregate(m=Max('as_of'))['m']
+
+
+@transaction.atomic
+def write_checkpoints(until=None) -> int:
+    """
+    Advance the checkpoint grid to `until` (default checkpoint_cutoff()):
+    one grouped query over the entries since the previous cut-off, a query
+    for the affected orgs' latest checkpoints, one bulk insert. Returns the
+    number of checkpoints written.
+    """
+    until = _as_datetime(until) or checkpoint_cutoff()
+    previous = latest_cutoff()
+    if previous is not None and until <= previous:
+        return 0
+
+    window = LedgerEntry.objects.filter(created_at__lte=until)
+    if previous is not None:
+        window = window.filter(created_at__gt=previous)
+    tails = _window_totals(window)
+    if not tails:
+        return 0
+
+    newest = LedgerCheckpoint.objects.filter(organization=OuterRef('organization')).order_by('-as_of')
+    bases = {}
+    for chunk in _chunked(list(tails)):
+        bases.update(
+            (cp.organization_id, cp)
+            for cp in LedgerCheckpoint.objects.filter(
+                organization_id__in=chunk,
+                as_of=Subquery(newest.values('as_of')[:1]),
+            )
+        )
+    checkpoints = []
+    for org_id, tail in tails.items():
+        totals = _add(_from_checkpoint(bases.get(org_id)), tail)
+        checkpoints.append(LedgerCheckpoint(organization_id=org_id, as_of=until, **totals))
+    LedgerCheckpoint.objects.bulk_create(checkpoints, batch_size=_IN_CHUNK)
+    return len(checkpoints)
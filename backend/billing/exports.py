@@ -0,0 +1,214 @@
+"""
+AtonixDev Billing — Keyset pagination and streaming exports
+
+Offset paging (qs[offset:offset + limit]) makes the database walk and discard
+every skipped row, so pulling a month of events page by page is quadratic.
+Keyset pagination instead remembers the sort key of the last row returned and
+asks for rows strictly after it, which is one index range scan per page:
+
+  UsageEvent   ordered by (event_timestamp, id)
+  LedgerEntry  ordered by seq
+
+The cursor handed to clients is the last key, JSON-encoded in URL-safe base64.
+It is opaque to clients but not signed — it only ever narrows a queryset the
+caller is already allowed to read.
+
+Exports stream the same orderings as NDJSON or CSV through
+StreamingHttpResponse, so memory stays flat whatever the size of the export:
+
+  WSGI  a sync generator reading rows with .values_list().iterator(chunk_size)
+        (server-side cursors on PostgreSQL).
+  ASGI  an async generator fetching keyset pages of chunk_size rows through
+        sync_to_async. Django consumes a sync iterator on ASGI with
+        sync_to_async(list), which would load the whole export into memory.
+"""
+
+import base64
+import csv
+import json
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .services import _as_datetime
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv':    'text/csv; charset=utf-8',
+}
+
+EVENT_EXPORT_FIELDS = (
+    'id', 'event_id', 'service', 'event_type', 'organization_id', 'organization_id_raw',
+    'user_id', 'project_id', 'units', 'unit_type', 'unit_price', 'total_cost',
+    'status', 'rejection_reason', 'metadata', 'event_timestamp', 'received_at', 'processed_at',
+)
+LEDGER_EXPORT_FIELDS = (
+    'seq', 'id', 'entry_type', 'organization_id', 'service', 'unit_type',
+    'units', 'unit_price', 'amount', 'running_balance', 'currency', 'reference',
+    'note', 'created_at',
+)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+# ─── Cursors ─────────────────────────────────────────────────────────────────
+
+def encode_cursor(key: list) -> str:
+    raw = json.dumps(key, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token: str) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        key = json.loads(raw)
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursor('Malformed cursor') from exc
+    if not isinstance(key, list):
+        raise InvalidCursor('Malformed cursor')
+    return key
+
+
+def events_after(qs, token: str):
+    """Order events by (event_timestamp, id) and skip past the cursor, if any."""
+    qs = qs.order_by('event_timestamp', 'id')
+    if token:
+        key = decode_cursor(token)
+        try:
+            ts, pk = _as_datetime(key[0]), uuid.UUID(key[1])
+        except (IndexError, ValueError, TypeError, AttributeError) as exc:
+            raise InvalidCursor('Malformed cursor') from exc
+        if ts is None:
+            raise InvalidCursor('Malformed cursor')
+        qs = qs.filter(Q(event_timestamp__gt=ts) | Q(event_timestamp=ts, id__gt=pk))
+    return qs
+
+
+def event_cursor(event) -> str:
+    # isoformat() keeps microseconds (DjangoJSONEncoder would cut them to ms)
+    return encode_cursor([event.event_timestamp.isoformat(), str(event.id)])
+
+
+def ledger_after(qs, token: str):
+    """
+    Order ledger entries by seq and skip past the cursor, if any. Every
+    LedgerWriter entry has a seq; rows without one cannot be paged by it.
+    """
+    qs = qs.filter(seq__isnull=False).order_by('seq')
+    if token:
+        key = decode_cursor(token)
+        try:
+            seq = int(key[0])
+        except (IndexError, ValueError, TypeError) as exc:
+            raise InvalidCursor('Malformed cursor') from exc
+        qs = qs.filter(seq__gt=seq)
+    return qs
+
+
+def ledger_cursor(entry) -> str:
+    return encode_cursor([entry.seq])
+
+
+def keyset_page(qs, limit: int, cursor_of) -> tuple:
+    """Return (rows, next_cursor); next_cursor is None on the last page."""
+    rows = list(qs[:limit + 1])
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, cursor_of(rows[-1])
+    return rows, None
+
+
+# ─── Streaming export ────────────────────────────────────────────────────────
+
+class _Echo:
+    """File-like object whose write() hands the line straight back to csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _plain(value):
+    """Full-precision timestamps; DjangoJSONEncoder handles Decimal / UUID."""
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def _formatter(fields, output: str):
+    """(header line or None, row → line) for an export format."""
+    if output == 'csv':
+        writer = csv.writer(_Echo())
+
+        def csv_line(row):
+            return writer.writerow([
+                json.dumps(v, cls=DjangoJSONEncoder) if isinstance(v, (dict, list))
+                else '' if v is None
+                else _plain(v)
+                for v in row
+            ])
+        return writer.writerow(fields), csv_line
+
+    def ndjson_line(row):
+        return json.dumps(dict(zip(fields, map(_plain, row))), cls=DjangoJSONEncoder) + '\n'
+    return None, ndjson_line
+
+
+def _lines(qs, fields, output: str, chunk_size: int):
+    header, line = _formatter(fields, output)
+    if header is not None:
+        yield header
+    for row in qs.values_list(*fields).iterator(chunk_size=chunk_size):
+        yield line(row)
+
+
+def _keyset_filter(order: list, key: list) -> Q:
+    """Rows strictly after `key` in ascending `order`."""
+    condition = Q()
+    for i, name in enumerate(order):
+        condition |= Q(**{f'{name}__gt': key[i]}, **dict(zip(order[:i], key[:i])))
+    return condition
+
+
+async def _alines(qs, fields, output: str, chunk_size: int):
+    """
+    Async variant of _lines: one keyset page per sync_to_async call, so no
+    cursor is held open between pages and at most chunk_size rows are in memory.
+    """
+    header, line = _formatter(fields, output)
+    if header is not None:
+        yield header
+    order   = [name.lstrip('-') for name in qs.query.order_by]   # ascending, see *_after()
+    columns = tuple(fields) + tuple(name for name in order if name not in fields)
+    keys    = [columns.index(name) for name in order]
+    fetch   = sync_to_async(lambda page: list(page.values_list(*columns)[:chunk_size]))
+    page = qs
+    while True:
+        rows = await fetch(page)
+        for row in rows:
+            yield line(row[:len(fields)])
+        if len(rows) < chunk_size:
+            return
+        page = qs.filter(_keyset_filter(order, [rows[-1][i] for i in keys]))
+
+
+def stream_export(qs, fields: tuple, output: str, basename: str, request=None) -> StreamingHttpResponse:
+    """
+    Stream a keyset-ordered queryset (events_after / ledger_after) as NDJSON
+    or CSV without materialising it. Pass the request so ASGI requests get
+    an async iterator.
+    """
+    chunk_size = getattr(settings, 'BILLING_EXPORT_CHUNK_SIZE', 2000)
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        lines = _alines(qs, fields, output, chunk_size)
+    else:
+        lines = _lines(qs, fields, output, chunk_size)
+    response = StreamingHttpResponse(lines, content_type=EXPORT_FORMATS[output])
+    stamp = timezone.now().strftime('%Y%m%dT%H%M%SZ')
+    response['Content-Disposition'] = f'attachment; filename="{basename}-{stamp}.{output}"'
+    return response
@@ -0,0 +1,280 @@
+"""
+AtonixDev Billing — In-memory idempotency front for event_id checks
+
+Every ingested event used to cost a SELECT on UsageEvent.event_id before its
+INSERT. Most event_ids are new, and retry storms repeat the same few ids, so
+each process keeps two structures in front of the unique index:
+
+  RecentIdCache      — LRU of event_ids known to be committed. A hit is a
+                       duplicate, answered without touching the database.
+  RotatingBloomFilter — every event_id this process has inserted within the
+                       last BILLING_IDEMPOTENCY_WINDOW seconds, split into
+                       generations that rotate out. A miss means "not seen
+                       here", so the pipeline skips the SELECT and goes
+                       straight to INSERT; only a (possibly false) hit is
+                       checked against the database.
+
+The unique index on UsageEvent.event_id stays the source of truth: ids
+inserted by other processes, before a restart or outside the window are
+not in the filter, so the INSERT path catches IntegrityError and
+reclassifies the clashing events as duplicates.
+
+Duplicates never rewrite the original event. DuplicateLog counts them in
+memory once their transaction commits and folds the counts into
+DuplicateEventCount with one additive upsert per flush. A daemon thread
+flushes every BILLING_DEDUP_FLUSH_INTERVAL seconds whether or not more
+duplicates arrive; the committing request flushes early once
+BILLING_DEDUP_FLUSH_ROWS distinct ids are pending, and the process flushes
+once more at exit. Counts still pending when a worker is killed (SIGKILL)
+are lost — at most one interval's worth.
+"""
+
+import atexit
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.utils import timezone
+
+log = logging.getLogger('billing')
+
+
+class RotatingBloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.01, generations: int = 4, window: float = 86400.0):
+        """
+        capacity    — expected insertions per generation
+        error_rate  — target false-positive rate per generation
+        generations — number of generations covering `window` seconds
+        """
+        self.bits        = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes      = max(1, round(self.bits / capacity * math.log(2)))
+        self.generations = generations
+        self.ttl         = window / generations
+        self._lock       = threading.Lock()
+        self._gens       = []   # [(created_at, bytearray)], newest last
+        self._rotate(time.monotonic())
+
+    def _positions(self, key: int):
+        h1 = key & 0xFFFFFFFFFFFFFFFF
+        h2 = (key >> 64) | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def _rotate(self, now: float):
+        if not self._gens or now - self._gens[-1][0] >= self.ttl:
+            self._gens.append((now, bytearray(self.bits // 8 + 1)))
+            del self._gens[:-self.generations]
+
+    def add(self, key: int) -> None:
+        positions = self._positions(key)
+        with self._lock:
+            self._rotate(time.monotonic())
+            bits = self._gens[-1][1]
+            for p in positions:
+                bits[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, key: int) -> bool:
+        positions = self._positions(key)
+        with self._lock:
+            for _, bits in self._gens:
+                if all(bits[p >> 3] & (1 << (p & 7)) for p in positions):
+                    return True
+        return False
+
+
+class RecentIdCache:
+    def __init__(self, size: int):
+        self.size  = size
+        self._ids  = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add_many(self, keys) -> None:
+        with self._lock:
+            for key in keys:
+                self._ids[key] = None
+                self._ids.move_to_end(key)
+            while len(self._ids) > self.size:
+                self._ids.popitem(last=False)
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            if key in self._ids:
+                self._ids.move_to_end(key)
+                return True
+        return False
+
+
+class IdempotencyFront:
+    def __init__(self):
+        self._lock   = threading.Lock()
+        self._bloom  = None
+        self._recent = None
+
+    def _structures(self):
+        with self._lock:
+            if self._bloom is None:
+                self._bloom = RotatingBloomFilter(
+                    capacity=getattr(settings, 'BILLING_IDEMPOTENCY_BLOOM_CAPACITY', 1_000_000),
+                    window=getattr(settings, 'BILLING_IDEMPOTENCY_WINDOW', 86400),
+                )
+                self._recent = RecentIdCache(getattr(settings, 'BILLING_IDEMPOTENCY_LRU_SIZE', 100_000))
+            return self._bloom, self._recent
+
+    def enabled(self) -> bool:
+        return getattr(settings, 'BILLING_IDEMPOTENCY_FRONT', True)
+
+    def classify(self, event_ids) -> tuple:
+        """
+        Split uuid event_ids into (known_duplicates, needs_db_check, definitely_new).
+        With the front disabled every id needs a database check.
+        """
+        if not self.enabled():
+            return set(), set(event_ids), set()
+        bloom, recent = self._structures()
+        known, maybe, new = set(), set(), set()
+        for event_id in event_ids:
+            if event_id in recent:
+                known.add(event_id)
+            elif event_id.int in bloom:
+                maybe.add(event_id)
+            else:
+                new.add(event_id)
+        return known, maybe, new
+
+    def remember(self, event_ids) -> None:
+        """
+        Record inserted event_ids: in the Bloom filter immediately (a stale
+        bit only costs a database check), in the LRU once the transaction
+        commits (an LRU hit is trusted without one).
+        """
+        if not self.enabled():
+            return
+        event_ids = list(event_ids)
+        bloom, recent = self._structures()
+        for event_id in event_ids:
+            bloom.add(event_id.int)
+        transaction.on_commit(lambda: recent.add_many(event_ids))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._bloom = None
+            self._recent = None
+
+
+idempotency = IdempotencyFront()
+
+
+class DuplicateLog:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.pid      = os.getpid()
+        self._pending = {}     # event_id -> [count, first_seen_at, last_seen_at]
+        self._thread  = None
+
+    def record(self, event_ids) -> None:
+        """Count one redelivery per id once the surrounding transaction commits."""
+        event_ids = list(event_ids)
+        if event_ids:
+            transaction.on_commit(lambda: self._add(event_ids, timezone.now()))
+
+    def _add(self, event_ids, seen_at) -> None:
+        with self._lock:
+            if self.pid != os.getpid():
+                self._reset()  # counts belong to the parent process
+            for event_id in event_ids:
+                row = self._pending.get(event_id)
+                if row is None:
+                    self._pending[event_id] = [1, seen_at, seen_at]
+                else:
+                    row[0] += 1
+                    row[2] = seen_at
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='billing-dedup-flush', daemon=True)
+                self._thread.start()
+            due = len(self._pending) >= getattr(settings, 'BILLING_DEDUP_FLUSH_ROWS', 1000)
+        if due:
+            self.flush()
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(row[0] for row in self._pending.values())
+
+    def flush(self) -> int:
+        """Write pending counts to DuplicateEventCount; returns the number of ids flushed."""
+        with self._lock:
+            if self.pid != os.getpid():
+                self._reset()
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            self._upsert(pending)
+        except DatabaseError:
+            log.exception('Duplicate counter flush failed; %d ids kept for the next flush', len(pending))
+            with self._lock:
+                for event_id, (count, first, last) in pending.items():
+                    row = self._pending.setdefault(event_id, [0, first, last])
+                    row[0] += count
+                    row[1] = min(row[1], first)
+            return 0
+        return len(pending)
+
+    def _run(self):
+        me = threading.current_thread()
+        while True:
+            time.sleep(getattr(settings, 'BILLING_DEDUP_FLUSH_INTERVAL', 5.0))
+            if self._thread is not me:
+                return  # superseded by _reset()
+            if not self._pending:
+                continue
+            # Same connection lifecycle as a request: honours CONN_MAX_AGE
+            close_old_connections()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    @staticmethod
+    def _upsert(pending: dict) -> None:
+        from django.db import connection
+        from .models import DuplicateEventCount
+
+        qn = connection.ops.quote_name
+        table = qn(DuplicateEventCount._meta.db_table)
+        field = DuplicateEventCount._meta.get_field
+        sql = (
+            f'INSERT INTO {table} (event_id, count, first_seen_at, last_seen_at) '
+            f'VALUES (%s, %s, %s, %s) '
+            f'ON CONFLICT (event_id) DO UPDATE SET '
+            f'count = {table}.count + excluded.count, '
+            f'last_seen_at = excluded.last_seen_at'
+        )
+        params = [
+            (
+                field('event_id').get_db_prep_value(event_id, connection),
+                count,
+                field('first_seen_at').get_db_prep_value(first, connection),
+                field('last_seen_at').get_db_prep_value(last, connection),
+            )
+            for event_id, (count, first, last) in sorted(pending.items())  # stable lock order
+        ]
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+
+
+duplicate_log = DuplicateLog()
+
+
+def _flush_at_exit():
+    if duplicate_log.pid == os.getpid():
+        duplicate_log.flush()
+
+
+atexit.register(_flush_at_exit)
@@ -0,0 +1,175 @@
+"""
+billing_ingest_worker — Drain the async ingest queue (BILLING_INGEST_MODE=async)
+
+Each worker process repeatedly claims a batch of staged payloads with
+SELECT … FOR UPDATE SKIP LOCKED, runs it through the batch pipeline
+(process_events) and deletes the claimed rows in the same transaction.
+A crashed worker's batch simply becomes claimable again.
+
+SAFETY RULES
+  • Parallel workers (--processes > 1) require PostgreSQL. On other
+    databases the command falls back to a single worker.
+  • SIGTERM / SIGINT stop the pool after the in-flight batches commit.
+  • Payloads that keep failing are marked 'failed' after
+    BILLING_INGEST_MAX_ATTEMPTS tries and left in the table for inspection.
+
+Usage:
+    python manage.py billing_ingest_worker                   # 1 worker, run forever
+    python manage.py billing_ingest_worker --processes 4     # worker pool
+    python manage.py billing_ingest_worker --once            # drain backlog, then exit
+"""
+
+import multiprocessing
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from billing.services import drain_ingest_queue, ingest_queue_stats
+
+
+def _work(batch_size, poll_interval, once, stop, totals=None):
+    """Worker loop. Returns the summed per-outcome counts."""
+    summed = {}
+    while not stop.is_set():
+        counts = drain_ingest_queue(batch_size)
+        for key, value in counts.items():
+            summed[key] = summed.get(key, 0) + value
+        if not counts['claimed']:
+            if once:
+                break
+            stop.wait(poll_interval)
+    if totals is not None:
+        totals.put(summed)
+    return summed
+
+
+def _child(batch_size, poll_interval, once, stop, totals):
+    # The parent owns signal handling; forked DB connections must not be shared.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    connections.close_all()
+    _work(batch_size, poll_interval, once, stop, totals)
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Drain the async billing ingest queue through the batch pipeline '
+        'with a pool of worker processes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=1,
+            help='Number of worker processes (default: 1). >1 requires PostgreSQL.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=getattr(settings, 'BILLING_INGEST_WORKER_BATCH', 500),
+            dest='batch_size',
+            help='Payloads claimed per transaction (default: BILLING_INGEST_WORKER_BATCH).',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            dest='poll_interval',
+            help='Seconds to sleep when the queue is empty (default: 1.0).',
+        )
+        parser.add_argument(
+            '--stats-interval',
+            type=float,
+            default=30.0,
+            dest='stats_interval',
+            help='Seconds between backlog depth / lag reports (default: 30).',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            default=False,
+            help='Exit once the queue is empty instead of polling forever.',
+        )
+
+    def handle(self, *args, **options):
+        processes  = options['processes']
+        batch_size = options['batch_size']
+        if processes < 1 or batch_size < 1:
+            raise CommandError('--processes and --batch-size must be positive.')
+        if processes > 1 and connection.vendor != 'postgresql':
+            self.stderr.write(self.style.WARNING(
+                f'{connection.vendor} has no SKIP LOCKED — running a single worker.'
+            ))
+            processes = 1
+
+        self._report()
+        if processes == 1:
+            stop = threading.Event()
+            previous = self._install_signals(stop)
+            try:
+                totals = _work(batch_size, options['poll_interval'], options['once'], stop)
+            finally:
+                for signum, handler in previous.items():
+                    signal.signal(signum, handler)
+            self._summary([totals])
+            return
+
+        ctx    = multiprocessing.get_context('fork')
+        stop   = ctx.Event()
+        queue  = ctx.Queue()
+        self._install_signals(stop)
+        connections.close_all()
+        pool = [
+            ctx.Process(
+                target=_child,
+                args=(batch_size, options['poll_interval'], options['once'], stop, queue),
+                name=f'billing-ingest-{n}',
+            )
+            for n in range(processes)
+        ]
+        for proc in pool:
+            proc.start()
+        self.stdout.write(f'Started {processes} ingest workers.')
+
+        last_report = time.monotonic()
+        results = []
+        while any(proc.is_alive() for proc in pool):
+            while not queue.empty():
+                results.append(queue.get())
+            for proc in pool:
+                proc.join(timeout=0.5)
+            if time.monotonic() - last_report >= options['stats_interval']:
+                self._report()
+                last_report = time.monotonic()
+        while len(results) < processes and not queue.empty():
+            results.append(queue.get())
+        self._summary(results)
+
+    @staticmethod
+    def _install_signals(stop) -> dict:
+        """Route SIGINT / SIGTERM to the stop flag; returns the previous handlers."""
+        def _stop(signum, frame):
+            stop.set()
+        return {signum: signal.signal(signum, _stop) for signum in (signal.SIGINT, signal.SIGTERM)}
+
+    def _report(self):
+        stats = ingest_queue_stats()
+        self.stdout.write(
+            f'Ingest queue: depth={stats["depth"]} lag={stats["lag_seconds"]}s failed={stats["failed"]}'
+        )
+
+    def _summary(self, results):
+        totals = {}
+        for counts in results:
+            for key, value in counts.items():
+                totals[key] = totals.get(key, 0) + value
+        drained = ', '.join(f'{k}={v}' for k, v in sorted(totals.items())) or 'nothing'
+        self.stdout.write(self.style.SUCCESS(f'Drained: {drained}'))
+        self._report()
+
@@ -0,0 +1,78 @@
+"""
+billing_ledger_checkpoints — Materialize per-org ledger totals for point-in-time balances
+
+Advances the LedgerCheckpoint grid (see billing/checkpoints.py) to now minus
+BILLING_LEDGER_CHECKPOINT_LAG. Run it from cron (hourly or daily); the
+checkpoint spacing is the cron interval, and a point-in-time query never reads
+more than one interval of ledger entries.
+
+SAFETY RULES
+  • Checkpoints are derived data. The ledger is never modified.
+  • Run one instance at a time. A concurrent run for the same cut-off fails
+    on the (organization, as_of) unique constraint and writes nothing.
+  • --rebuild deletes every checkpoint before backfilling. Point-in-time
+    queries stay correct meanwhile; they just read more ledger entries.
+
+Usage:
+    python manage.py billing_ledger_checkpoints                 # cron: advance to now - lag
+    python manage.py billing_ledger_checkpoints --backfill      # first run: one checkpoint per month
+    python manage.py billing_ledger_checkpoints --rebuild       # drop and backfill from scratch
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Min
+
+from billing.checkpoints import checkpoint_cutoff, latest_cutoff, write_checkpoints
+from billing.models import LedgerCheckpoint, LedgerEntry
+from billing.partitioning import add_months, month_bound, month_start
+
+
+class Command(BaseCommand):
+    help = (
+        'Write per-organization ledger checkpoints so point-in-time balances '
+        'only read the entries after the nearest checkpoint.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backfill',
+            action='store_true',
+            default=False,
+            help='Write one checkpoint per calendar month since the last checkpoint (or the first entry).',
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            default=False,
+            help='Delete all checkpoints, then backfill.',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            deleted, _ = LedgerCheckpoint.objects.all().delete()
+            self.stdout.write(f'Deleted {deleted:,} checkpoint(s).')
+
+        cutoff = checkpoint_cutoff()
+        grid = []
+        if options['backfill'] or options['rebuild']:
+            start = latest_cutoff() or LedgerEntry.objects.aggregate(m=Min('created_at'))['m']
+            if start is not None:
+                month = add_months(month_start(start), 1)
+                while month_bound(month) < cutoff:
+                    grid.append(month_bound(month))
+                    month = add_months(month, 1)
+        grid.append(cutoff)
+
+        total = 0
+        for until in grid:
+            started = time.perf_counter()
+            written = write_checkpoints(until)
+            total += written
+            if written:
+                self.stdout.write(
+                    f'  {until:%Y-%m-%d %H:%M}  {written:>6} checkpoint(s)  '
+                    f'{(time.perf_counter() - started) * 1000:.0f}ms'
+                )
+        self.stdout.write(self.style.SUCCESS(f'Wrote {total:,} ledger checkpoint(s) up to {cutoff:%Y-%m-%d %H:%M:%S}.'))
@@ -0,0 +1,136 @@
+"""
+billing_partitions — Manage monthly partitions of UsageEvent / LedgerEntry (PostgreSQL)
+
+See billing/partitioning.py for the layout and the key changes that
+partitioning implies.
+
+SAFETY RULES
+  • PostgreSQL only. Other databases are refused.
+  • --convert is a one-time, one-way rewrite. It holds an ACCESS EXCLUSIVE
+    lock on the table while rows are copied, so run it in a maintenance
+    window.
+  • LedgerEntry partitions are never dropped (immutable financial records).
+    --detach-before only detaches them into standalone tables.
+  • Without --execute, --detach-before only reports what it would do.
+
+Usage:
+    python manage.py billing_partitions --list
+    python manage.py billing_partitions --convert --table usage_event
+    python manage.py billing_partitions --ahead 3                  # cron: create upcoming months
+    python manage.py billing_partitions --detach-before 2024-01 --table usage_event --drop --execute
+"""
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from billing.partitioning import (
+    SPECS,
+    PartitioningError,
+    convert_table,
+    drop_partition,
+    ensure_partitions,
+    is_partitioned,
+    list_partitions,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Create, list and detach monthly partitions of the billing event / ledger '
+        'tables, or convert them to partitioned tables (PostgreSQL).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--table',
+            choices=[*SPECS, 'all'],
+            default='all',
+            help='Table to operate on (default: all).',
+        )
+        parser.add_argument(
+            '--convert',
+            action='store_true',
+            default=False,
+            help='Rebuild the table(s) as monthly-partitioned tables (one-time).',
+        )
+        parser.add_argument(
+            '--ahead',
+            type=int,
+            default=3,
+            help='Months after the current one to create partitions for (default: 3).',
+        )
+        parser.add_argument(
+            '--list',
+            action='store_true',
+            default=False,
+            help='List existing partitions and exit.',
+        )
+        parser.add_argument(
+            '--detach-before',
+            dest='detach_before',
+            help='YYYY-MM: detach every month partition older than this month.',
+        )
+        parser.add_argument(
+            '--drop',
+            action='store_true',
+            default=False,
+            help='Drop detached UsageEvent partitions instead of keeping them as tables.',
+        )
+        parser.add_argument(
+            '--execute',
+            action='store_true',
+            default=False,
+            help='Actually detach / drop. Without this flag --detach-before only reports.',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError(f'Partitioning requires PostgreSQL (database is {connection.vendor}).')
+        specs = list(SPECS.values()) if options['table'] == 'all' else [SPECS[options['table']]]
+        before = None
+        if options['detach_before']:
+            try:
+                before = datetime.strptime(options['detach_before'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError('--detach-before must be YYYY-MM.')
+        if options['ahead'] < 0:
+            raise CommandError('--ahead must be >= 0.')
+
+        try:
+            for spec in specs:
+                self._handle_table(spec, options, before)
+        except PartitioningError as exc:
+            raise CommandError(str(exc))
+
+    def _handle_table(self, spec, options, before):
+        if options['convert']:
+            copied = convert_table(spec, ahead=options['ahead'])
+            self.stdout.write(self.style.SUCCESS(f'{spec.table}: converted, {copied:,} rows copied.'))
+        elif not is_partitioned(spec):
+            raise PartitioningError(f'{spec.table} is not partitioned — run with --convert first.')
+
+        if options['list']:
+            for name, month in list_partitions(spec):
+                self.stdout.write(f'  {name:<40} {month.strftime("%Y-%m") if month else "default"}')
+            return
+
+        for name in ensure_partitions(spec, ahead=options['ahead']):
+            self.stdout.write(f'  {spec.table}: created {name}')
+
+        if before is None:
+            return
+        drop = options['drop'] and spec.key != 'ledger_entry'
+        if options['drop'] and not drop:
+            self.stderr.write(self.style.WARNING(
+                f'{spec.table}: ledger partitions are never dropped — detaching only.'
+            ))
+        for name, month in list_partitions(spec):
+            if month is None or month >= before:
+                continue
+            if not options['execute']:
+                self.stdout.write(f'  {spec.table}: would {"drop" if drop else "detach"} {name}')
+                continue
+            rows = drop_partition(spec, name, drop=drop)
+            self.stdout.write(f'  {spec.table}: {"dropped" if drop else "detached"} {name} ({rows:,} rows)')
@@ -2,7 +2,7 @@
 billing_retention — Data retention enforcement command (§4.4 E)
 
 Retention Policy
-  UsageEvent      2 years   (event data)
+  UsageEvent      2 years   (event data, with its DuplicateEventCount rows)
   BillingAuditLog 1 year    (audit logs)
   LedgerEntry     7 years   (financial records — soft-delete only)
   Invoice         7 years   (financial records — soft-delete only)
@@ -11,6 +11,13 @@ SAFETY RULES
   • LedgerEntry and Invoice are NEVER hard-deleted (immutable financial records).
     They are only flagged / reported, never removed.
   • UsageEvent and BillingAuditLog are hard-deleted after their retention window.
+  • With --archive, expired UsageEvents are first written to the columnar
+    archive (billing/archive.py); if archiving fails nothing is deleted.
+  • Expiry, archiving and deletion all go by received_at. When
+    billing_usageevent is partitioned by month of event_timestamp
+    (billing_partitions), an expired month is dropped as a partition only if
+    none of its rows was received on or after the cutoff; the PK-batch
+    delete handles everything else.
   • A dry-run mode (--dry-run) prints what WOULD be deleted without touching data.
   • All deletions are logged to BillingAuditLog before execution.
 
@@ -18,6 +25,7 @@ Usage:
     python manage.py billing_retention             # report only
     python manage.py billing_retention --execute   # enforce deletions
     python manage.py billing_retention --dry-run   # same as report-only (explicit)
+    python manage.py billing_retention --execute --archive   # archive, then delete
 """
 
 from datetime import timedelta
@@ -26,7 +34,7 @@ from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 from django.utils import timezone
 
-from billing.models import BillingAuditLog, Invoice, LedgerEntry, UsageEvent
+from billing.models import BillingAuditLog, DuplicateEventCount, Invoice, LedgerEntry, UsageEvent
 
 
 # Retention windows (§4.4 E)
@@ -59,6 +67,12 @@ class Command(BaseCommand):
             dest='dry_run',
             help='Alias for report-only mode (no deletions performed).',
         )
+        parser.add_argument(
+            '--archive',
+            action='store_true',
+            default=False,
+            help='Archive expired UsageEvents (Parquet / Arrow / NDJSON, see BILLING_ARCHIVE_*) before deleting them.',
+        )
         parser.add_argument(
             '--batch-size',
             type=int,
@@ -88,11 +102,29 @@ class Command(BaseCommand):
             f'(cutoff: {events_cutoff.date()})'
         )
 
+        if options['archive'] and expired_events_count:
+            self._archive(expired_events_qs, events_cutoff, execute)
+
         events_deleted = 0
         if execute and expired_events_count:
-            events_deleted = self._batch_delete(expired_events_qs, batch_size, 'UsageEvent')
+            events_deleted = self._drop_event_partitions(events_cutoff)
+            events_deleted += self._batch_delete(expired_events_qs, batch_size, 'UsageEvent')
             self._log_deletion('UsageEvent', events_deleted, events_cutoff)
 
+        # Redelivery counters expire with the events they count
+        expired_dups_qs = DuplicateEventCount.objects.filter(last_seen_at__lt=events_cutoff)
+        expired_dups_count = expired_dups_qs.count()
+
+        self.stdout.write(
+            f'  DupCounter   > 2 years : {expired_dups_count:,} records '
+            f'(cutoff: {events_cutoff.date()})'
+        )
+
+        dups_deleted = 0
+        if execute and expired_dups_count:
+            dups_deleted = self._batch_delete(expired_dups_qs, batch_size, 'DuplicateEventCount')
+            self._log_deletion('DuplicateEventCount', dups_deleted, events_cutoff)
+
         # ── 2. Audit Logs (1-year window) ─────────────────────────────────
         audit_cutoff = now - RETENTION['audit']
         expired_audit_qs = BillingAuditLog.objects.filter(created_at__lt=audit_cutoff)
@@ -130,6 +162,7 @@ class Command(BaseCommand):
             self.stdout.write(self.style.SUCCESS(
                 f'Retention enforcement complete:\n'
                 f'  UsageEvent   deleted: {events_deleted:,}\n'
+                f'  Dup counters deleted: {dups_deleted:,}\n'
                 f'  AuditLog     deleted: {audit_deleted:,}\n'
                 f'  LedgerEntry  kept:    {expired_ledger_count:,} (immutable)\n'
                 f'  Invoice      kept:    {expired_invoice_count:,} (immutable)\n'
@@ -143,6 +176,51 @@ class Command(BaseCommand):
     # Helpers
     # ──────────────────────────────────────────────────────────────────────
 
+    def _archive(self, queryset, cutoff, execute: bool):
+        """
+        Write expired events to the archive; any failure aborts before deletion.
+        Events a previous (failed) run already archived are not written again.
+        """
+        from django.core.exceptions import ImproperlyConfigured
+        from billing.archive import archive_format, archive_usage_events
+
+        try:
+            fmt = archive_format()
+        except ImproperlyConfigured as exc:
+            raise CommandError(str(exc))
+        if not execute:
+            self.stdout.write(f'    [archive] would archive as {fmt} before deletion')
+            return
+        try:
+            parts = archive_usage_events(queryset, received_before=cutoff)
+        except Exception as exc:
+            raise CommandError(f'Archive failed, nothing deleted: {exc}')
+        for part in parts:
+            self.stdout.write(f'    [archive] {part["month"]}: {part["rows"]:,} events → {part["path"]}')
+
+    def _drop_event_partitions(self, cutoff) -> int:
+        """
+        Drop monthly UsageEvent partitions whose rows were all received before
+        the cutoff — the predicate the archive and the batch delete use.
+        """
+        from billing.partitioning import (
+            SPECS, PartitioningError, drop_partition, expired_partitions, is_partitioned,
+        )
+
+        spec = SPECS['usage_event']
+        if not is_partitioned(spec):
+            return 0
+        total = 0
+        for name in expired_partitions(spec, cutoff):
+            try:
+                rows = drop_partition(spec, name, rows_before=('received_at', cutoff))
+            except PartitioningError as exc:
+                self.stdout.write(f'    [UsageEvent] kept partition {name}: {exc} Expired rows are deleted in batches.')
+                continue
+            total += rows
+            self.stdout.write(f'    [UsageEvent] dropped partition {name} ({rows:,} rows)')
+        return total
+
     def _batch_delete(self, queryset, batch_size: int, label: str) -> int:
         """Delete a queryset in batches to avoid long table locks."""
         total_deleted = 0
@@ -0,0 +1,56 @@
+"""
+billing_rollup_backfill — Rebuild hourly / daily usage rollups from raw events
+
+The ingest pipeline keeps UsageRollup up to date incrementally. Run this
+after deploying the rollup tables, after bulk imports that bypassed the
+pipeline, or to repair a range whose raw events were corrected.
+
+SAFETY RULES
+  • Only UsageRollup rows are touched; raw events and the ledger are read-only.
+  • The selected range (whole UTC days) is deleted and rebuilt in one
+    transaction, so dashboards never see a half-built range.
+
+Usage:
+    python manage.py billing_rollup_backfill                          # everything
+    python manage.py billing_rollup_backfill --since 2025-01-01
+    python manage.py billing_rollup_backfill --since 2025-01-01 --until 2025-02-01
+"""
+
+from datetime import datetime, time, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.services import RollupWriter
+
+
+def _day(value: str):
+    try:
+        return datetime.combine(datetime.strptime(value, '%Y-%m-%d').date(), time.min, tzinfo=timezone.utc)
+    except ValueError:
+        raise CommandError(f'Invalid date {value!r} — expected YYYY-MM-DD.')
+
+
+class Command(BaseCommand):
+    help = 'Rebuild hourly and daily UsageRollup rows from processed UsageEvents.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            default=None,
+            help='First day to rebuild (YYYY-MM-DD, inclusive). Default: beginning of time.',
+        )
+        parser.add_argument(
+            '--until',
+            default=None,
+            help='Day to stop at (YYYY-MM-DD, exclusive). Default: no upper bound.',
+        )
+
+    def handle(self, *args, **options):
+        since = _day(options['since']) if options['since'] else None
+        until = _day(options['until']) if options['until'] else None
+        if since and until and since >= until:
+            raise CommandError('--since must be before --until.')
+
+        written = RollupWriter.rebuild(since=since, until=until)
+        span = f"{options['since'] or 'start'} → {options['until'] or 'now'}"
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} rollup rows ({span}).'))
@@ -0,0 +1,169 @@
+"""
+billing_run — Month-end invoicing for every active organization
+
+Creates a BillingRun with one checkpoint item per organization, then fans
+the items out over a pool of worker processes. Each worker claims one item
+at a time with SELECT … FOR UPDATE SKIP LOCKED and marks it done in the
+same transaction that creates the invoice. Invoice numbers come from
+invoice_seq in blocks of BILLING_INVOICE_NUMBER_BLOCK, so workers do not
+contend on a single counter row.
+
+SAFETY RULES
+  • Re-running the command for the same period resumes the unfinished run
+    instead of starting a new one. Organizations that already have an
+    invoice for the period are skipped, never invoiced twice.
+  • Failed organizations are recorded with their error and left alone until
+    the command is re-run with --retry-failed, which reopens the run.
+  • Parallel workers (--processes > 1) require PostgreSQL. On other
+    databases the command falls back to a single worker.
+  • SIGTERM / SIGINT stop the pool after the in-flight invoices commit.
+
+Usage:
+    python manage.py billing_run                              # previous calendar month
+    python manage.py billing_run --period 2024-05 --processes 8
+    python manage.py billing_run --period 2024-05 --retry-failed
+    python manage.py billing_run --period 2024-05 --org acme --org globex
+"""
+
+import multiprocessing
+import signal
+import threading
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.utils import timezone
+
+from billing.models import BillingRun, Organization
+from billing.services import finish_billing_run, run_billing_items, start_billing_run
+
+
+def _child(run_id, stop, totals):
+    # The parent owns signal handling; forked DB connections must not be shared.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    connections.close_all()
+    totals.put(run_billing_items(BillingRun.objects.get(pk=run_id), stop))
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Invoice every active organization for a month with a pool of worker '
+        'processes; resumable after a crash.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--period',
+            help='YYYY-MM to invoice (default: the previous calendar month).',
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=1,
+            help='Number of worker processes (default: 1). >1 requires PostgreSQL.',
+        )
+        parser.add_argument(
+            '--org',
+            action='append',
+            dest='orgs',
+            help='Organization slug to invoice (repeatable). Only applies to a new run.',
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            default=False,
+            dest='retry_failed',
+            help='Reopen the latest run for the period and queue its failed organizations again.',
+        )
+
+    def handle(self, *args, **options):
+        period_start, period_end = self._period(options['period'])
+        processes = options['processes']
+        if processes < 1:
+            raise CommandError('--processes must be positive.')
+        if processes > 1 and connection.vendor != 'postgresql':
+            self.stderr.write(self.style.WARNING(
+                f'{connection.vendor} has no SKIP LOCKED — running a single worker.'
+            ))
+            processes = 1
+
+        org_ids = None
+        if options['orgs']:
+            found = dict(Organization.objects.filter(slug__in=options['orgs']).values_list('slug', 'pk'))
+            missing = sorted(set(options['orgs']) - set(found))
+            if missing:
+                raise CommandError(f'Unknown organization(s): {", ".join(missing)}')
+            org_ids = list(found.values())
+
+        run, resumed = start_billing_run(
+            period_start, period_end, org_ids=org_ids, retry_failed=options['retry_failed'],
+        )
+        pending = run.items.filter(status='pending').count()
+        self.stdout.write(
+            f'{"Resuming" if resumed else "Started"} billing run #{run.pk} '
+            f'for {period_start}–{period_end}: {pending} organization(s) pending.'
+        )
+
+        if processes == 1:
+            stop = threading.Event()
+            previous = self._install_signals(stop)
+            try:
+                run_billing_items(run, stop)
+            finally:
+                for signum, handler in previous.items():
+                    signal.signal(signum, handler)
+        else:
+            ctx   = multiprocessing.get_context('fork')
+            stop  = ctx.Event()
+            queue = ctx.Queue()
+            self._install_signals(stop)
+            connections.close_all()
+            pool = [
+                ctx.Process(target=_child, args=(run.pk, stop, queue), name=f'billing-run-{n}')
+                for n in range(min(processes, pending) or 1)
+            ]
+            for proc in pool:
+                proc.start()
+            self.stdout.write(f'Started {len(pool)} billing workers.')
+            while any(proc.is_alive() for proc in pool):
+                while not queue.empty():
+                    queue.get()
+                for proc in pool:
+                    proc.join(timeout=0.5)
+
+        run.refresh_from_db()
+        self._summary(finish_billing_run(run))
+
+    @staticmethod
+    def _period(value) -> tuple:
+        if value:
+            try:
+                start = datetime.strptime(value, '%Y-%m').date()
+            except ValueError:
+                raise CommandError('--period must be YYYY-MM.')
+        else:
+            first_of_month = timezone.now().date().replace(day=1)
+            start = (first_of_month - timedelta(days=1)).replace(day=1)
+        next_month = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+        return start, next_month - timedelta(days=1)
+
+    @staticmethod
+    def _install_signals(stop) -> dict:
+        """Route SIGINT / SIGTERM to the stop flag; returns the previous handlers."""
+        def _stop(signum, frame):
+            stop.set()
+        return {signum: signal.signal(signum, _stop) for signum in (signal.SIGINT, signal.SIGTERM)}
+
+    def _summary(self, report):
+        counts, timing = report['counts'], report['timing_ms']
+        self.stdout.write(
+            'Per-org timing: '
+            f'p50={timing["p50"]}ms p95={timing["p95"]}ms max={timing["max"]}ms total={timing["total"]}ms'
+        )
+        for slug, duration_ms, status in report['slowest']:
+            self.stdout.write(f'  {slug:<40} {duration_ms:>8}ms  {status}')
+        summary = ', '.join(f'{k}={v}' for k, v in counts.items())
+        style = self.style.SUCCESS if report['status'] == 'completed' else self.style.WARNING
+        self.stdout.write(style(f'Billing run #{report["run"]} {report["status"]}: {summary}'))
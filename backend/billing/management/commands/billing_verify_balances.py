@@ -0,0 +1,77 @@
+"""
+billing_verify_balances — OrgBalance drift detection & repair
+
+OrgBalance snapshots are maintained incrementally (BILLING_BALANCE_MODE =
+'incremental'): each ledger write applies its delta with an atomic F() update.
+This command re-aggregates the full ledger and reports any org whose stored
+snapshot has drifted from it.
+
+Usage:
+    python manage.py billing_verify_balances                 # report drift
+    python manage.py billing_verify_balances --repair        # report + recompute drifting orgs
+    python manage.py billing_verify_balances --org <uuid>    # limit to one organization
+"""
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.models import BillingAuditLog, Organization
+from billing.services import BalanceEngine
+
+
+class Command(BaseCommand):
+    help = (
+        'Verify OrgBalance snapshots against a full ledger re-aggregation. '
+        'Reports drift; pass --repair to recompute the drifting organizations.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repair',
+            action='store_true',
+            default=False,
+            help='Recompute the snapshot of every organization that has drifted.',
+        )
+        parser.add_argument(
+            '--org',
+            dest='org_id',
+            default=None,
+            help='Only verify this organization (UUID).',
+        )
+
+    def handle(self, *args, **options):
+        org_ids = None
+        if options['org_id']:
+            try:
+                org_ids = {Organization.objects.get(pk=options['org_id']).pk}
+            except (Organization.DoesNotExist, ValidationError) as exc:
+                raise CommandError(f'Organization not found: {options["org_id"]}') from exc
+
+        drift = BalanceEngine.verify(org_ids)
+        drifting = sorted({d['organization_id'] for d in drift}, key=str)
+
+        self.stdout.write(self.style.MIGRATE_HEADING('\nAtonixDev Billing — Balance Verification\n'))
+        for d in drift:
+            self.stdout.write(
+                f"  {d['organization_id']}  {d['field']:<15} "
+                f"stored={d['stored']}  expected={d['expected']}"
+            )
+
+        if not drifting:
+            self.stdout.write(self.style.SUCCESS('No drift detected.\n'))
+            return
+
+        self.stdout.write(self.style.WARNING(f'\n{len(drifting)} organization(s) drifting.'))
+        if not options['repair']:
+            self.stdout.write(self.style.WARNING('Pass --repair to recompute them.\n'))
+            return
+
+        BalanceEngine.recompute_many(Organization.objects.filter(pk__in=drifting))
+        BillingAuditLog.objects.create(
+            actor=None,
+            action='BALANCE_REPAIR',
+            target=f'{len(drifting)} OrgBalance snapshot(s) recomputed',
+            severity='medium',
+            metadata={'organizations': [str(o) for o in drifting]},
+        )
+        self.stdout.write(self.style.SUCCESS(f'Repaired {len(drifting)} organization(s).\n'))
@@ -62,15 +62,15 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         from billing.models import (
             Organization, PricingRule, UsageEvent, OrgBalance, BillingAuditLog,
-            LedgerEntry, Invoice, InvoiceLineItem, Credit, Payment,
+            LedgerEntry, Invoice, InvoiceLineItem, Credit, Payment, UsageRollup,
         )
-        from billing.services import process_event
+        from billing.services import process_events
 
         if options['clear']:
             self.stdout.write('Clearing billing data…')
             for Model in [
                 BillingAuditLog, Payment, Credit, InvoiceLineItem, Invoice,
-                LedgerEntry, OrgBalance, UsageEvent, Organization, PricingRule,
+                LedgerEntry, OrgBalance, UsageRollup, UsageEvent, Organization, PricingRule,
             ]:
                 deleted, _ = Model.objects.all().delete()
                 self.stdout.write(f'  deleted {deleted} {Model.__name__} rows')
@@ -84,7 +84,8 @@ class Command(BaseCommand):
                 defaults={
                     'unit_price':     price,
                     'is_active':      True,
-                    'effective_from': timezone.now(),
+                    # Covers the backdated usage seeded below (priced at event time)
+                    'effective_from': timezone.now() - datetime.timedelta(days=90),
                     'created_by':     admin_user,
                 },
             )
@@ -109,7 +110,7 @@ class Command(BaseCommand):
         # ── Usage Events ──────────────────────────────────────────────────────
         self.stdout.write('Seeding usage events…')
         now = timezone.now()
-        total_created = 0
+        payloads = []
         for org in orgs:
             multiplier = {'starter': 1, 'pro': 3, 'enterprise': 6}.get(org.plan, 1)
             for service, event_type, unit_type, lo, hi in EVENT_TEMPLATES:
@@ -118,7 +119,7 @@ class Command(BaseCommand):
                     hours_ago = random.randint(0, 23)
                     ts = now - datetime.timedelta(days=days_ago, hours=hours_ago)
                     units = Decimal(str(random.randint(lo, hi)))
-                    payload = {
+                    payloads.append({
                         'event_id':        str(uuid.uuid4()),
                         'service':         service,
                         'event_type':      event_type,
@@ -126,13 +127,15 @@ class Command(BaseCommand):
                         'units':           str(units),
                         'unit_type':       unit_type,
                         'timestamp':       ts.isoformat(),
-                    }
-                    try:
-                        ev = process_event(payload, source_ip='127.0.0.1')
-                        if ev.status == 'processed':
-                            total_created += 1
-                    except Exception as exc:
-                        self.stderr.write(f'  !! {service}/{event_type}: {exc}')
+                    })
+
+        results = process_events(payloads, source_ip='127.0.0.1')
+        total_created = 0
+        for payload, result in zip(payloads, results):
+            if result['status'] == 'processed':
+                total_created += 1
+            elif result['error']:
+                self.stderr.write(f"  !! {payload['service']}/{payload['event_type']}: {result['error']}")
 
         self.stdout.write(self.style.SUCCESS(
             f'Done. {total_created} usage events processed.'
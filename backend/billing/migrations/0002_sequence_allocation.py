@@ -0,0 +1,62 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:49
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def seed_ledger_balance(apps, schema_editor):
+    OrgBalance = apps.get_model('billing', 'OrgBalance')
+    LedgerEntry = apps.get_model('billing', 'LedgerEntry')
+    totals = dict(
+        LedgerEntry.objects.values('organization_id')
+        .annotate(total=Sum('amount'))
+        .values_list('organization_id', 'total')
+    )
+    for balance in OrgBalance.objects.all():
+        balance.ledger_balance = totals.get(balance.organization_id) or Decimal('0')
+        balance.save(update_fields=['ledger_balance'])
+
+
+def create_ledger_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    LedgerEntry = apps.get_model('billing', 'LedgerEntry')
+    last = LedgerEntry.objects.order_by('-seq').values_list('seq', flat=True).first() or 0
+    schema_editor.execute('CREATE SEQUENCE IF NOT EXISTS billing_ledger_entry_seq')
+    schema_editor.execute(
+        "SELECT setval('billing_ledger_entry_seq', %s, %s)", [max(last, 1), last > 0],
+    )
+
+
+def drop_ledger_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP SEQUENCE IF EXISTS billing_ledger_entry_seq')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillingSequence',
+            fields=[
+                ('name', models.CharField(max_length=60, primary_key=True, serialize=False)),
+                ('next_value', models.PositiveBigIntegerField(default=1)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Billing Sequence',
+            },
+        ),
+        migrations.AddField(
+            model_name='orgbalance',
+            name='ledger_balance',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=16),
+        ),
+        migrations.RunPython(seed_ledger_balance, migrations.RunPython.noop),
+        migrations.RunPython(create_ledger_sequence, drop_ledger_sequence),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:56
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0002_sequence_allocation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestQueueItem',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('payload', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('source_ip', models.GenericIPAddressField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('enqueued_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Ingest Queue Item',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'id'], name='billing_ing_status_f668b0_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:59
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0003_ingest_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsageRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=4)),
+                ('bucket', models.DateTimeField()),
+                ('service', models.CharField(max_length=30)),
+                ('unit_type', models.CharField(max_length=30)),
+                ('user_key', models.PositiveIntegerField(default=0)),
+                ('event_count', models.PositiveBigIntegerField(default=0)),
+                ('total_units', models.DecimalField(decimal_places=6, default=Decimal('0'), max_digits=24)),
+                ('total_cost', models.DecimalField(decimal_places=6, default=Decimal('0'), max_digits=20)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_rollups', to='billing.organization')),
+            ],
+            options={
+                'verbose_name': 'Usage Rollup',
+                'indexes': [models.Index(fields=['granularity', 'service', 'bucket'], name='billing_usa_granula_4f3cd4_idx'), models.Index(fields=['granularity', 'user_key', 'bucket'], name='billing_usa_granula_5f51c6_idx'), models.Index(fields=['granularity', 'organization', 'bucket'], name='billing_usa_granula_1c4c3a_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='usagerollup',
+            constraint=models.UniqueConstraint(fields=('granularity', 'bucket', 'organization', 'service', 'unit_type', 'user_key'), name='billing_usage_rollup_key'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:11
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def restore_duplicate_statuses(apps, schema_editor):
+    """
+    Duplicates used to overwrite the original event's status with 'duplicate'.
+    Put back the status the event's own fields imply and count the
+    redelivery (at least one) in DuplicateEventCount.
+    """
+    UsageEvent = apps.get_model('billing', 'UsageEvent')
+    DuplicateEventCount = apps.get_model('billing', 'DuplicateEventCount')
+    now = timezone.now()
+    rewritten = UsageEvent.objects.filter(status='duplicate')
+    DuplicateEventCount.objects.bulk_create(
+        [
+            DuplicateEventCount(event_id=event_id, count=1, first_seen_at=now, last_seen_at=now)
+            for event_id in rewritten.values_list('event_id', flat=True).iterator()
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    rewritten.exclude(rejection_reason='').update(status='rejected')
+    rewritten.filter(processed_at__isnull=False).update(status='processed')
+    rewritten.update(status='pending')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0004_usage_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DuplicateEventCount',
+            fields=[
+                ('event_id', models.UUIDField(primary_key=True, serialize=False)),
+                ('count', models.PositiveBigIntegerField(default=0)),
+                ('first_seen_at', models.DateTimeField()),
+                ('last_seen_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Duplicate Event Count',
+            },
+        ),
+        migrations.RunPython(restore_duplicate_statuses, migrations.RunPython.noop),
+    ]
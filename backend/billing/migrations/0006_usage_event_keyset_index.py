@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0005_duplicate_event_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usageevent',
+            index=models.Index(fields=['event_timestamp', 'id'], name='billing_usa_event_t_19f8a4_idx'),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_invoice_number_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Invoice = apps.get_model('billing', 'Invoice')
+    last = 1000
+    for number in Invoice.objects.values_list('invoice_number', flat=True).iterator():
+        try:
+            last = max(last, int(number.split('-')[1]))
+        except (IndexError, ValueError):
+            continue
+    schema_editor.execute('CREATE SEQUENCE IF NOT EXISTS billing_invoice_number_seq')
+    schema_editor.execute("SELECT setval('billing_invoice_number_seq', %s, true)", [last])
+
+
+def drop_invoice_number_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP SEQUENCE IF EXISTS billing_invoice_number_seq')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('billing', '0006_usage_event_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillingRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateField()),
+                ('period_end', models.DateField()),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed'), ('failed', 'Completed with failures')], db_index=True, default='running', max_length=20)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Billing Run',
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BillingRunItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('done', 'Done'), ('skipped', 'Skipped'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('duration_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('invoice', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='billing.invoice')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='billing_run_items', to='billing.organization')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='billing.billingrun')),
+            ],
+            options={
+                'verbose_name': 'Billing Run Item',
+                'indexes': [models.Index(fields=['run', 'status'], name='billing_bil_run_id_36bc63_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='billingrunitem',
+            constraint=models.UniqueConstraint(fields=('run', 'organization'), name='billing_run_item_org'),
+        ),
+        migrations.AddIndex(
+            model_name='billingrun',
+            index=models.Index(fields=['period_start', 'period_end', 'status'], name='billing_bil_period__d5efef_idx'),
+        ),
+        migrations.RunPython(create_invoice_number_sequence, drop_invoice_number_sequence),
+    ]
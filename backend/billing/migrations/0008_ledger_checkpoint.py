@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:29
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0007_billing_run'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateTimeField()),
+                ('last_seq', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('entry_count', models.PositiveBigIntegerField(default=0)),
+                ('total_charges', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=16)),
+                ('total_payments', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=16)),
+                ('total_credits', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=16)),
+                ('ledger_balance', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=16)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_checkpoints', to='billing.organization')),
+            ],
+            options={
+                'verbose_name': 'Ledger Checkpoint',
+                'ordering': ['-as_of'],
+                'indexes': [models.Index(fields=['organization', '-as_of'], name='billing_led_organiz_a2214b_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='ledgercheckpoint',
+            constraint=models.UniqueConstraint(fields=('organization', 'as_of'), name='ledger_checkpoint_org_as_of'),
+        ),
+    ]
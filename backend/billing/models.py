@@ -14,12 +14,20 @@ Hierarchy:
 
   PricingRule          — Layer 2: versioned, immutable-once-applied pricing
   BillingAuditLog      — cross-cutting: admin & billing action trail
+  BillingSequence      — cross-cutting: counter rows for block sequence allocation
+  IngestQueueItem      — Layer 1: staged raw payloads awaiting async processing
+  UsageRollup          — Layer 3: hourly / daily pre-aggregated usage for dashboards
+  DuplicateEventCount  — Layer 1: redelivery counters for already-ingested event_ids
+  BillingRun           — Layer 3: month-end invoicing run across all organizations
+  BillingRunItem       — Layer 3: per-organization checkpoint of a BillingRun
+  LedgerCheckpoint     — Layer 3: materialized per-org ledger totals at a point in time
 """
 
 import uuid
 from decimal import Decimal
 
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils import timezone
 
@@ -161,6 +169,7 @@ class UsageEvent(models.Model):
             models.Index(fields=['organization', 'service', '-event_timestamp']),
             models.Index(fields=['status', '-received_at']),
             models.Index(fields=['service', '-event_timestamp']),
+            models.Index(fields=['event_timestamp', 'id']),   # keyset paging / exports
         ]
 
     def __str__(self):
@@ -375,6 +384,9 @@ class OrgBalance(models.Model):
     total_payments = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0'))
     total_credits  = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0'))
     outstanding    = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0'))
+    # Sum of every ledger amount for the org — the running_balance of its next
+    # LedgerEntry is computed from this while the row is locked.
+    ledger_balance = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0'))
     currency       = models.CharField(max_length=3, default='USD')
     last_computed  = models.DateTimeField(auto_now=True)
 
@@ -418,3 +430,227 @@ class BillingAuditLog(models.Model):
 
     def __str__(self):
         return f'[{self.severity.upper()}] {self.action} — {self.target}'
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 9 — BillingSequence (cross-cutting — block sequence allocation)
+# ─────────────────────────────────────────────────────────────────────────────
+
+class BillingSequence(models.Model):
+    """
+    Counter row backing billing.sequences.SequenceAllocator on databases
+    without native sequences (SQLite). On PostgreSQL a real SEQUENCE is used.
+    The row billing.pricing.VERSION_ROW holds the pricing rule version on
+    every database.
+    """
+    name       = models.CharField(max_length=60, primary_key=True)
+    next_value = models.PositiveBigIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Billing Sequence'
+
+    def __str__(self):
+        return f'{self.name} → {self.next_value}'
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 10 — IngestQueueItem (Layer 1 — async ingest staging)
+# ─────────────────────────────────────────────────────────────────────────────
+
+class IngestQueueItem(models.Model):
+    """
+    A validated raw event payload accepted in async ingest mode
+    (BILLING_INGEST_MODE='async'). Drained in id order by the
+    billing_ingest_worker command; rows are deleted once processed.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('failed', 'Failed'),
+    ]
+
+    id          = models.BigAutoField(primary_key=True)
+    payload     = models.JSONField(encoder=DjangoJSONEncoder)
+    source_ip   = models.GenericIPAddressField(null=True, blank=True)
+    status      = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts    = models.PositiveSmallIntegerField(default=0)
+    last_error  = models.TextField(blank=True)
+    enqueued_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Ingest Queue Item'
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+
+    def __str__(self):
+        return f'#{self.pk} [{self.status}] {self.payload.get("event_id", "")}'
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 11 — UsageRollup (Layer 3 — pre-aggregated usage)
+# ─────────────────────────────────────────────────────────────────────────────
+
+class UsageRollup(models.Model):
+    """
+    Processed usage summed per (granularity, bucket, org, service, unit_type, user).
+    Maintained incrementally by the ingest pipeline (RollupWriter) and rebuilt
+    by billing_rollup_backfill. Buckets are UTC hour / day starts.
+
+    user_key is the user's pk, or 0 for events without a user — a plain
+    integer rather than a nullable FK so the unique key also covers them.
+    """
+    GRANULARITY_CHOICES = [
+        ('hour', 'Hourly'),
+        ('day',  'Daily'),
+    ]
+
+    granularity  = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    bucket       = models.DateTimeField()
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='usage_rollups')
+    service      = models.CharField(max_length=30)
+    unit_type    = models.CharField(max_length=30)
+    user_key     = models.PositiveIntegerField(default=0)
+    event_count  = models.PositiveBigIntegerField(default=0)
+    total_units  = models.DecimalField(max_digits=24, decimal_places=6, default=Decimal('0'))
+    total_cost   = models.DecimalField(max_digits=20, decimal_places=6, default=Decimal('0'))
+
+    class Meta:
+        verbose_name = 'Usage Rollup'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['granularity', 'bucket', 'organization', 'service', 'unit_type', 'user_key'],
+                name='billing_usage_rollup_key',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['granularity', 'service', 'bucket']),
+            models.Index(fields=['granularity', 'user_key', 'bucket']),
+            models.Index(fields=['granularity', 'organization', 'bucket']),
+        ]
+
+    def __str__(self):
+        return f'{self.granularity} {self.bucket:%Y-%m-%d %H:00} {self.service}/{self.unit_type} ×{self.event_count}'
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 12 — DuplicateEventCount (Layer 1 — redelivery tracking)
+# ─────────────────────────────────────────────────────────────────────────────
+
+class DuplicateEventCount(models.Model):
+    """
+    How often an already-ingested event_id was delivered again. The original
+    UsageEvent is never touched; the pipeline counts redeliveries in memory
+    and folds them in here with a batched additive upsert (DuplicateLog).
+    """
+    event_id      = models.UUIDField(primary_key=True)
+    count         = models.PositiveBigIntegerField(default=0)
+    first_seen_at = models.DateTimeField()
+    last_seen_at  = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = 'Duplicate Event Count'
+
+    def __str__(self):
+        return f'{self.event_id} ×{self.count}'
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 13 — BillingRun / BillingRunItem (Layer 3 — month-end invoicing checkpoints)
+# ─────────────────────────────────────────────────────────────────────────────
+
+class BillingRun(models.Model):
+    """
+    One month-end invoicing pass (manage.py billing_run). Every organization
+    in scope gets a BillingRunItem; an item is marked done in the same
+    transaction that creates its invoice, so a crashed run resumes exactly
+    where it stopped.
+    """
+    STATUS_CHOICES = [
+        ('running',   'Running'),
+        ('completed', 'Completed'),
+        ('failed',    'Completed with failures'),
+    ]
+
+    period_start = models.DateField()
+    period_end   = models.DateField()
+    status       = models.CharField(max_length=20, choices=STATUS_CHOICES, default='running', db_index=True)
+    started_at   = models.DateTimeField(auto_now_add=True)
+    finished_at  = models.DateTimeField(null=True, blank=True)
+    created_by   = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+        verbose_name = 'Billing Run'
+        indexes = [
+            models.Index(fields=['period_start', 'period_end', 'status']),
+        ]
+
+    def __str__(self):
+        return f'Run #{self.pk} {self.period_start}–{self.period_end} [{self.status}]'
+
+
+class BillingRunItem(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('done',    'Done'),
+        ('skipped', 'Skipped'),
+        ('failed',  'Failed'),
+    ]
+
+    run          = models.ForeignKey(BillingRun, on_delete=models.CASCADE, related_name='items')
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='billing_run_items')
+    status       = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    invoice      = models.ForeignKey(Invoice, on_delete=models.SET_NULL, null=True, blank=True)
+    attempts     = models.PositiveIntegerField(default=0)
+    duration_ms  = models.PositiveIntegerField(null=True, blank=True)
+    error        = models.TextField(blank=True)
+    finished_at  = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Billing Run Item'
+        constraints = [
+            models.UniqueConstraint(fields=['run', 'organization'], name='billing_run_item_org'),
+        ]
+        indexes = [
+            models.Index(fields=['run', 'status']),
+        ]
+
+    def __str__(self):
+        return f'Run #{self.run_id} — {self.organization_id} [{self.status}]'
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 14 — LedgerCheckpoint (Layer 3 — point-in-time balance snapshots)
+# ─────────────────────────────────────────────────────────────────────────────
+
+class LedgerCheckpoint(models.Model):
+    """
+    Totals of an organization's ledger entries with created_at <= as_of.
+    A point-in-time balance is the nearest checkpoint plus the entries after
+    it (see billing/checkpoints.py). Written by billing_ledger_checkpoints.
+    """
+    organization   = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='ledger_checkpoints')
+    as_of          = models.DateTimeField()
+    last_seq       = models.PositiveBigIntegerField(null=True, blank=True)
+    entry_count    = models.PositiveBigIntegerField(default=0)
+    total_charges  = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0'))
+    total_payments = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0'))
+    total_credits  = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0'))
+    ledger_balance = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0'))
+    created_at     = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-as_of']
+        verbose_name = 'Ledger Checkpoint'
+        constraints = [
+            models.UniqueConstraint(fields=['organization', 'as_of'], name='ledger_checkpoint_org_as_of'),
+        ]
+        indexes = [
+            models.Index(fields=['organization', '-as_of']),
+        ]
+
+    def __str__(self):
+        return f'{self.organization_id} @ {self.as_of:%Y-%m-%d %H:%M} balance={self.ledger_balance}'
+
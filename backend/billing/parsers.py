@@ -0,0 +1,36 @@
+"""
+AtonixDev Billing — Request parsers for the ingest endpoints
+
+The SDKs gzip request bodies of 1 KB and more and mark them with
+Content-Encoding: gzip. GzipJSONParser inflates such bodies before JSON
+parsing. The inflated size is capped at BILLING_INGEST_MAX_INFLATED_BYTES,
+so a small compressed body cannot expand into an unbounded one.
+"""
+
+import io
+import zlib
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+
+def _inflate(data: bytes, limit: int) -> bytes:
+    inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)   # gzip container
+    try:
+        body = inflater.decompress(data, limit)
+    except zlib.error as exc:
+        raise ParseError(f'Invalid gzip body: {exc}') from exc
+    if inflater.unconsumed_tail:
+        raise ParseError(f'Decompressed body exceeds {limit} bytes')
+    return body
+
+
+class GzipJSONParser(JSONParser):
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = (parser_context or {}).get('request')
+        encoding = request.META.get('HTTP_CONTENT_ENCODING', '') if request is not None else ''
+        if encoding.strip().lower() == 'gzip':
+            limit = getattr(settings, 'BILLING_INGEST_MAX_INFLATED_BYTES', 32 * 1024 * 1024)
+            stream = io.BytesIO(_inflate(stream.read(), limit))
+        return super().parse(stream, media_type, parser_context)
@@ -0,0 +1,325 @@
+"""
+AtonixDev Billing — Monthly range partitioning (PostgreSQL)
+
+UsageEvent and LedgerEntry can be stored as PostgreSQL tables partitioned
+by month:
+
+  billing_usageevent    PARTITION BY RANGE (event_timestamp)
+  billing_ledgerentry   PARTITION BY RANGE (created_at)
+
+Each month lives in <table>_pYYYYMM, with <table>_default catching rows
+outside every bound. Range filters on the partition column only scan the
+months they touch, and an expired month is removed by detaching (and
+dropping) its partition rather than deleting rows in batches.
+
+Partitioned mode is opt-in and one-way. `billing_partitions --convert`
+rewrites a table under an ACCESS EXCLUSIVE lock. The same conversion can be
+run from a migration with RunPython(convert_forwards). PostgreSQL requires
+every unique key of a partitioned table to include the partition column,
+so conversion changes these keys:
+  • primary keys become (id, <column>)
+  • UsageEvent.event_id is unique per (event_id, event_timestamp), and
+    LedgerEntry.seq is unique per (seq, created_at). The ledger sequence
+    still hands out unique seq values. Event ids stay unique globally
+    through EVENT_KEY_TABLE: a row trigger on the partitioned table
+    inserts / deletes each event_id there, so a redelivery with a
+    different timestamp still fails with IntegrityError, as ingest expects.
+  • LedgerEntry.event no longer has a database-level foreign key, because
+    nothing can reference a partitioned table's id alone. Django still
+    follows the relation. drop_partition() nulls ledger references before
+    it drops an event month, as on_delete=SET_NULL would.
+
+Keep partitions created ahead of time (`billing_partitions --ahead 3` from
+cron). A bound cannot be attached while matching rows sit in the default
+partition.
+
+Retention selects UsageEvents by received_at, not by the partition column.
+A late delivery lands in an old month with a recent received_at, so
+retention drops a month only if drop_partition(rows_before=...) finds no
+such row while the partition is locked.
+"""
+
+from dataclasses import dataclass
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+
+
+@dataclass(frozen=True)
+class PartitionSpec:
+    key:    str   # CLI name
+    table:  str
+    column: str
+
+
+SPECS = {
+    'usage_event':  PartitionSpec('usage_event', 'billing_usageevent', 'event_timestamp'),
+    'ledger_entry': PartitionSpec('ledger_entry', 'billing_ledgerentry', 'created_at'),
+}
+
+
+# Global event_id dedup key for partitioned billing_usageevent
+EVENT_KEY_TABLE = 'billing_usageevent_eventkey'
+
+
+class PartitioningError(Exception):
+    pass
+
+
+# ─── Bounds & names ──────────────────────────────────────────────────────────
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, n: int) -> date:
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(spec: PartitionSpec, month: date) -> str:
+    return f'{spec.table}_p{month:%Y%m}'
+
+
+def month_bound(month: date) -> datetime:
+    return datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+
+
+def _bound(month: date) -> str:
+    return month_bound(month).isoformat()
+
+
+def create_partition_sql(spec: PartitionSpec, month: date) -> str:
+    qn = connection.ops.quote_name
+    return (
+        f'CREATE TABLE IF NOT EXISTS {qn(partition_name(spec, month))} PARTITION OF {qn(spec.table)} '
+        f"FOR VALUES FROM ('{_bound(month)}') TO ('{_bound(add_months(month, 1))}')"
+    )
+
+
+# ─── Introspection ───────────────────────────────────────────────────────────
+
+def _require_postgres():
+    if connection.vendor != 'postgresql':
+        raise PartitioningError(f'Partitioning requires PostgreSQL (database is {connection.vendor}).')
+
+
+def is_partitioned(spec: PartitionSpec) -> bool:
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid '
+            'WHERE c.relname = %s AND pg_table_is_visible(c.oid)',
+            [spec.table],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(spec: PartitionSpec) -> list:
+    """[(name, month | None for the default partition)], oldest first."""
+    _require_postgres()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits i '
+            'JOIN pg_class parent ON parent.oid = i.inhparent '
+            'JOIN pg_class child  ON child.oid  = i.inhrelid '
+            'WHERE parent.relname = %s AND pg_table_is_visible(parent.oid)',
+            [spec.table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    prefix = f'{spec.table}_p'
+    parts = []
+    for name in names:
+        suffix = name[len(prefix):] if name.startswith(prefix) else ''
+        month = date(int(suffix[:4]), int(suffix[4:]), 1) if len(suffix) == 6 and suffix.isdigit() else None
+        parts.append((name, month))
+    return sorted(parts, key=lambda p: (p[1] is None, p[1] or date.min))
+
+
+# ─── Maintenance ─────────────────────────────────────────────────────────────
+
+def ensure_partitions(spec: PartitionSpec, ahead: int = 3, today: date = None) -> list:
+    """Create partitions for the current month and `ahead` months after it. Returns new names."""
+    _require_postgres()
+    current = month_start(today or datetime.now(dt_timezone.utc))
+    existing = {name for name, _ in list_partitions(spec)}
+    created = []
+    with connection.cursor() as cursor:
+        for n in range(ahead + 1):
+            month = add_months(current, n)
+            if partition_name(spec, month) not in existing:
+                cursor.execute(create_partition_sql(spec, month))
+                created.append(partition_name(spec, month))
+    return created
+
+
+@transaction.atomic
+def drop_partition(spec: PartitionSpec, name: str, drop: bool = True, rows_before: tuple = None) -> int:
+    """
+    Detach partition `name`; with drop=True also drop it. Returns its row
+    count. Ledger references into a dropped UsageEvent month are nulled first,
+    and the detached event ids leave EVENT_KEY_TABLE.
+
+    rows_before=(column, bound) refuses with PartitioningError unless every
+    row's `column` is before `bound`. The partition is locked against writes
+    before the check, so a concurrent late insert cannot slip past it.
+    """
+    _require_postgres()
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {qn(name)} IN SHARE MODE')
+        if rows_before is not None:
+            column, bound = rows_before
+            cursor.execute(f'SELECT 1 FROM {qn(name)} WHERE {qn(column)} >= %s LIMIT 1', [bound])
+            if cursor.fetchone() is not None:
+                raise PartitioningError(f'{name} has rows with {column} on or after {bound.isoformat()}.')
+        cursor.execute(f'SELECT COUNT(*) FROM {qn(name)}')
+        rows = cursor.fetchone()[0]
+        if spec.key == 'usage_event' and _has_event_keys():
+            cursor.execute(
+                f'DELETE FROM {qn(EVENT_KEY_TABLE)} WHERE event_id IN (SELECT event_id FROM {qn(name)})'
+            )
+        if drop and spec.key == 'usage_event':
+            cursor.execute(
+                f'UPDATE {qn(SPECS["ledger_entry"].table)} SET event_id = NULL '
+                f'WHERE event_id IN (SELECT id FROM {qn(name)})'
+            )
+        cursor.execute(f'ALTER TABLE {qn(spec.table)} DETACH PARTITION {qn(name)}')
+        if drop:
+            cursor.execute(f'DROP TABLE {qn(name)}')
+    return rows
+
+
+def expired_partitions(spec: PartitionSpec, cutoff) -> list:
+    """
+    Month partitions whose whole range of `spec.column` lies before `cutoff`.
+    Pass rows_before to drop_partition() when retention goes by another column.
+    """
+    return [
+        name for name, month in list_partitions(spec)
+        if month is not None and month_bound(add_months(month, 1)) <= cutoff
+    ]
+
+
+# ─── Global event keys ───────────────────────────────────────────────────────
+
+def _has_event_keys() -> bool:
+    return EVENT_KEY_TABLE in connection.introspection.table_names()
+
+
+def _create_event_keys(cursor):
+    """Create EVENT_KEY_TABLE from billing_usageevent and keep it in sync by trigger."""
+    qn = connection.ops.quote_name
+    table, keys = qn(SPECS['usage_event'].table), qn(EVENT_KEY_TABLE)
+    sync = qn(f'{EVENT_KEY_TABLE}_sync')
+    cursor.execute(f'CREATE TABLE {keys} (event_id uuid PRIMARY KEY)')
+    cursor.execute(f'INSERT INTO {keys} (event_id) SELECT event_id FROM {table}')
+    # AFTER row triggers: a duplicate raises unique_violation for the whole
+    # statement (IntegrityError in Django); moving a row across partitions
+    # fires DELETE then INSERT, which leaves its key in place.
+    cursor.execute(
+        f'CREATE FUNCTION {sync}() RETURNS trigger LANGUAGE plpgsql AS $$\n'
+        f'BEGIN\n'
+        f"  IF TG_OP IN ('DELETE', 'UPDATE') THEN\n"
+        f'    DELETE FROM {keys} WHERE event_id = OLD.event_id;\n'
+        f'  END IF;\n'
+        f"  IF TG_OP IN ('INSERT', 'UPDATE') THEN\n"
+        f'    INSERT INTO {keys} (event_id) VALUES (NEW.event_id);\n'
+        f'  END IF;\n'
+        f'  RETURN NULL;\n'
+        f'END $$'
+    )
+    cursor.execute(
+        f'CREATE TRIGGER {sync} AFTER INSERT OR DELETE OR UPDATE OF event_id ON {table} '
+        f'FOR EACH ROW EXECUTE FUNCTION {sync}()'
+    )
+
+
+# ─── Conversion ──────────────────────────────────────────────────────────────
+
+@transaction.atomic
+def convert_table(spec: PartitionSpec, ahead: int = 3) -> int:
+    """
+    Rebuild `spec.table` as a monthly-partitioned table and copy its rows.
+    Plain indexes are replayed from their definitions, foreign keys are
+    recreated on the parent, and primary / unique keys gain the partition
+    column; UsageEvent also gets EVENT_KEY_TABLE. Returns the number of
+    rows copied.
+    """
+    _require_postgres()
+    if is_partitioned(spec):
+        raise PartitioningError(f'{spec.table} is already partitioned.')
+    qn = connection.ops.quote_name
+    legacy = f'{spec.table}_unpartitioned'
+
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, spec.table)
+        cursor.execute(
+            'SELECT pg_get_indexdef(ix.indexrelid) FROM pg_index ix '
+            'JOIN pg_class t ON t.oid = ix.indrelid '
+            'WHERE t.relname = %s AND pg_table_is_visible(t.oid) '
+            'AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = ix.indexrelid)',
+            [spec.table],
+        )
+        index_defs = [row[0] for row in cursor.fetchall()]   # still name spec.table
+        cursor.execute(f'SELECT MIN({qn(spec.column)}), MAX({qn(spec.column)}) FROM {qn(spec.table)}')
+        first, last = cursor.fetchone()
+
+        # Foreign keys pointing at this table cannot target a partitioned table's id
+        cursor.execute(
+            'SELECT con.conname, rel.relname FROM pg_constraint con '
+            'JOIN pg_class rel ON rel.oid = con.conrelid '
+            'JOIN pg_class ref ON ref.oid = con.confrelid '
+            "WHERE con.contype = 'f' AND ref.relname = %s",
+            [spec.table],
+        )
+        for conname, relname in cursor.fetchall():
+            cursor.execute(f'ALTER TABLE {qn(relname)} DROP CONSTRAINT {qn(conname)}')
+
+        cursor.execute(f'ALTER TABLE {qn(spec.table)} RENAME TO {qn(legacy)}')
+        cursor.execute(
+            f'CREATE TABLE {qn(spec.table)} (LIKE {qn(legacy)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE) '
+            f'PARTITION BY RANGE ({qn(spec.column)})'
+        )
+        cursor.execute(f'CREATE TABLE {qn(spec.table + "_default")} PARTITION OF {qn(spec.table)} DEFAULT')
+        current = month_start(datetime.now(dt_timezone.utc))
+        month = month_start(first) if first else current
+        stop = add_months(max(month_start(last) if last else current, current), ahead)
+        while month <= stop:
+            cursor.execute(create_partition_sql(spec, month))
+            month = add_months(month, 1)
+
+        cursor.execute(f'INSERT INTO {qn(spec.table)} SELECT * FROM {qn(legacy)}')
+        copied = cursor.rowcount
+        cursor.execute(f'DROP TABLE {qn(legacy)}')
+
+        for definition in index_defs:
+            cursor.execute(definition)
+        for name, info in constraints.items():
+            if info['index'] or info['check']:
+                continue  # replayed above / copied by LIKE … INCLUDING CONSTRAINTS
+            columns = ', '.join(qn(c) for c in info['columns'])
+            if info['primary_key'] or info['unique']:
+                if spec.column not in info['columns']:
+                    columns += f', {qn(spec.column)}'
+                kind = 'PRIMARY KEY' if info['primary_key'] else 'UNIQUE'
+                cursor.execute(f'ALTER TABLE {qn(spec.table)} ADD CONSTRAINT {qn(name)} {kind} ({columns})')
+            elif info['foreign_key']:
+                ref_table, ref_column = info['foreign_key']
+                cursor.execute(
+                    f'ALTER TABLE {qn(spec.table)} ADD CONSTRAINT {qn(name)} FOREIGN KEY ({columns}) '
+                    f'REFERENCES {qn(ref_table)} ({qn(ref_column)}) DEFERRABLE INITIALLY DEFERRED'
+                )
+        if spec.key == 'usage_event':
+            _create_event_keys(cursor)
+    return copied
+
+
+def convert_forwards(apps, schema_editor):
+    """RunPython entry point: partition both tables on PostgreSQL, no-op elsewhere."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for spec in SPECS.values():
+        if not is_partitioned(spec):
+            convert_table(spec)
@@ -0,0 +1,145 @@
+"""
+AtonixDev Billing — In-process pricing rule cache
+
+There are only a few dozen active PricingRule rows, but the pipeline looks
+one up for every event and every invoice line. PricingCache keeps a snapshot
+of all active rules in memory, keyed by (service, unit_type).
+
+Each key maps to a RuleTimeline: the effective windows of its rules cut into
+non-overlapping segments, each resolved up front to the highest-version rule
+covering it. Pricing at an arbitrary instant (e.g. a late or replayed event's
+event_timestamp) is then a bisect over the segment starts — O(log n), no query.
+
+Invalidation:
+  - A version counter lives in the database, in the BillingSequence row
+    VERSION_ROW, so every worker process sees it. PricingRule post_save /
+    post_delete (see BillingConfig.ready) increment it in the same
+    transaction as the rule write: other processes see the new version
+    exactly when they can see the new rule.
+  - Each process compares the counter with the version its snapshot was
+    built from. Batch entry points (process_events, invoice generation) read
+    it once per batch with snapshot(verify=True); single lookups read it at
+    most every BILLING_PRICING_VERSION_CHECK_INTERVAL seconds.
+  - The snapshot is also rebuilt after BILLING_PRICING_CACHE_TTL seconds, which
+    covers writes that bypass signals (queryset.update(), raw SQL).
+"""
+
+import threading
+import time
+from bisect import bisect_right
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+VERSION_ROW = 'pricing_rules_version'
+
+
+class RuleTimeline:
+    """Sorted, non-overlapping effective segments for one (service, unit_type)."""
+
+    def __init__(self, rules: list):
+        bounds = sorted(
+            {r.effective_from for r in rules} | {r.effective_to for r in rules if r.effective_to}
+        )
+        self.starts = []
+        self.rules  = []   # rule in effect from starts[i] until starts[i + 1] (None = unpriced gap)
+        for start in bounds:
+            covering = [
+                r for r in rules
+                if r.effective_from <= start and (r.effective_to is None or start < r.effective_to)
+            ]
+            rule = max(covering, key=lambda r: r.version) if covering else None
+            if self.rules and self.rules[-1] is rule:
+                continue  # same rule as the previous segment — merge
+            self.starts.append(start)
+            self.rules.append(rule)
+
+    def at(self, when):
+        i = bisect_right(self.starts, when) - 1
+        return self.rules[i] if i >= 0 else None
+
+
+def read_version():
+    """The shared pricing rule version (None until the first rule write)."""
+    from .models import BillingSequence
+
+    return BillingSequence.objects.filter(name=VERSION_ROW).values_list('next_value', flat=True).first()
+
+
+def bump_version() -> None:
+    """Increment the shared version inside the caller's transaction."""
+    from .models import BillingSequence
+
+    counter = BillingSequence.objects.filter(name=VERSION_ROW)
+    if counter.update(next_value=F('next_value') + 1):
+        return
+    _, created = BillingSequence.objects.get_or_create(name=VERSION_ROW, defaults={'next_value': 1})
+    if not created:  # another writer created it first
+        counter.update(next_value=F('next_value') + 1)
+
+
+class PricingCache:
+    def __init__(self):
+        self._lock       = threading.Lock()
+        self._rules      = None   # {(service, unit_type): RuleTimeline}
+        self._version    = None
+        self._built_at   = 0.0
+        self._checked_at = 0.0
+
+    # ── Lookup ────────────────────────────────────────────────────────────────
+
+    def get(self, service: str, unit_type: str, at=None):
+        """Return the highest-version active rule in effect at `at` (default: now)."""
+        timeline = self.snapshot().get((service, unit_type))
+        return timeline.at(at or timezone.now()) if timeline else None
+
+    def snapshot(self, verify: bool = False) -> dict:
+        """
+        The current rule timelines. verify=True checks the shared version
+        now; otherwise it is checked at most every
+        BILLING_PRICING_VERSION_CHECK_INTERVAL seconds.
+        """
+        now      = time.monotonic()
+        ttl      = getattr(settings, 'BILLING_PRICING_CACHE_TTL', 60)
+        interval = getattr(settings, 'BILLING_PRICING_VERSION_CHECK_INTERVAL', 1.0)
+        rules    = self._rules
+        expired  = rules is None or now - self._built_at > ttl
+        if expired or verify or now - self._checked_at >= interval:
+            version = read_version()   # before the rules: a racing write only causes a reload
+            self._checked_at = now
+            if expired or version != self._version:
+                rules = self._load(version)
+        return rules
+
+    # ── Invalidation ─────────────────────────────────────────────────────────
+
+    def clear_local(self) -> None:
+        with self._lock:
+            self._rules = None
+
+    def _load(self, version) -> dict:
+        from .models import PricingRule
+
+        with self._lock:
+            grouped = {}
+            for rule in PricingRule.objects.filter(is_active=True):
+                grouped.setdefault((rule.service, rule.unit_type), []).append(rule)
+            rules = {key: RuleTimeline(group) for key, group in grouped.items()}
+            self._rules    = rules
+            self._version  = version
+            self._built_at = time.monotonic()
+            return rules
+
+
+pricing_cache = PricingCache()
+
+
+def invalidate_pricing_cache(sender=None, **kwargs) -> None:
+    """
+    Signal receiver for PricingRule writes. This process drops its snapshot
+    at once; the shared version is bumped in the same transaction, so other
+    processes pick up the change when it commits and never before.
+    """
+    pricing_cache.clear_local()
+    bump_version()
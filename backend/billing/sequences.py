@@ -0,0 +1,130 @@
+"""
+AtonixDev Billing — Block sequence allocation
+
+LedgerEntry.seq and invoice numbers used to be derived from the latest row
+(max(seq) + 1, last invoice_number + 1), which races between parallel workers. SequenceAllocator hands
+out numbers from per-process blocks instead:
+
+  PostgreSQL — a real SEQUENCE; a block is fetched with one
+               `SELECT nextval(...) FROM generate_series(1, n)`.
+               Sequences are non-transactional, so values are never reissued.
+  Others     — a BillingSequence counter row, locked with SELECT … FOR UPDATE
+               and advanced by a whole block at a time. The counter bump is
+               transactional: it only survives if the caller's transaction
+               commits. Blocks are therefore cached only when fetched in
+               autocommit mode; inside a transaction each take() reserves
+               exactly the values it returns. The start is floored at the live
+               maximum so it can never collide with committed rows.
+
+Values are unique but only monotonic per process; gaps are expected.
+"""
+
+import os
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import connection, transaction
+
+
+class SequenceAllocator:
+    def __init__(self, name: str, pg_sequence: str, floor=None, block_size: int = None,
+                 block_setting: str = 'BILLING_SEQUENCE_BLOCK'):
+        """
+        name          — BillingSequence row name (fallback backend)
+        pg_sequence   — PostgreSQL sequence name (created by migration)
+        floor         — optional callable returning the lowest value that may
+                        still be handed out (e.g. max(seq) + 1)
+        block_size    — values reserved per round-trip (default: the setting below)
+        block_setting — setting that holds the default block size
+        """
+        self.name          = name
+        self.pg_sequence   = pg_sequence
+        self._floor        = floor
+        self._block_size   = block_size
+        self.block_setting = block_setting
+        self._values     = deque()
+        self._pid        = os.getpid()
+        self._lock       = threading.Lock()
+
+    @property
+    def block_size(self) -> int:
+        return self._block_size or getattr(settings, self.block_setting, 100)
+
+    def next(self) -> int:
+        return self.take(1)[0]
+
+    def take(self, n: int) -> list:
+        """Return n unique values, fetching a new block when the cached one runs out."""
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked worker: the parent's cached block is shared with siblings.
+                self._values.clear()
+                self._pid = os.getpid()
+            short = n - len(self._values)
+            if short > 0:
+                if not self._cacheable():
+                    # A rollback would undo the counter bump; don't keep a surplus.
+                    values = list(self._values) + self._fetch(short)
+                    self._values.clear()
+                    return values
+                self._values.extend(self._fetch(max(short, self.block_size)))
+            return [self._values.popleft() for _ in range(n)]
+
+    def reset(self) -> None:
+        """Drop any cached values (tests, or after the backing sequence was reset)."""
+        with self._lock:
+            self._values.clear()
+
+    @staticmethod
+    def _cacheable() -> bool:
+        """Can a fetched block outlive the current transaction?"""
+        return connection.vendor == 'postgresql' or not connection.in_atomic_block
+
+    def _fetch(self, n: int) -> list:
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT nextval(%s) FROM generate_series(1, %s)', [self.pg_sequence, n])
+                return [row[0] for row in cursor.fetchall()]
+        return self._fetch_counter_row(n)
+
+    def _fetch_counter_row(self, n: int) -> list:
+        from .models import BillingSequence
+
+        with transaction.atomic():
+            BillingSequence.objects.get_or_create(name=self.name)
+            row = BillingSequence.objects.select_for_update().get(name=self.name)
+            start = row.next_value
+            if self._floor:
+                start = max(start, self._floor())
+            row.next_value = start + n
+            row.save(update_fields=['next_value', 'updated_at'])
+        return list(range(start, start + n))
+
+
+def _ledger_seq_floor() -> int:
+    from .models import LedgerEntry
+
+    last = LedgerEntry.objects.order_by('-seq').values_list('seq', flat=True).first()
+    return (last or 0) + 1
+
+
+ledger_seq = SequenceAllocator('ledger_entry_seq', 'billing_ledger_entry_seq', floor=_ledger_seq_floor)
+
+
+def _invoice_number_floor() -> int:
+    from .models import Invoice
+
+    last = Invoice.objects.order_by('-created_at').values_list('invoice_number', flat=True).first()
+    try:
+        return int(last.split('-')[1]) + 1 if last else 1001
+    except (IndexError, ValueError):
+        return 1001
+
+
+# Invoice numbers come in smaller blocks: an unused block leaves a visible gap.
+invoice_seq = SequenceAllocator(
+    'invoice_number', 'billing_invoice_number_seq',
+    floor=_invoice_number_floor,
+    block_setting='BILLING_INVOICE_NUMBER_BLOCK',
+)
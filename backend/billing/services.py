@@ -7,22 +7,30 @@ Components:
   UsageNormalizer     — convert raw event units to billing units
   CostCalculator      — apply versioned pricing rules
   LedgerWriter        — write immutable ledger entries
-  BalanceEngine       — recompute OrgBalance snapshots
+  BalanceEngine       — maintain OrgBalance snapshots (incremental or full recompute)
   InvoiceGenerator    — aggregate ledger entries into invoices
+  RollupWriter        — maintain hourly / daily usage rollups for dashboards
+  Ingest queue        — stage raw payloads for async processing by workers
+  Billing run         — checkpointed month-end invoicing across all organizations
 """
 
+import time
 import uuid
 import logging
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta, timezone as dt_timezone
 from decimal import Decimal, ROUND_HALF_UP
 
-from django.db import transaction, models
+from django.db import IntegrityError, transaction, models
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
 from .models import (
     BillingAuditLog,
+    BillingRun,
+    BillingRunItem,
     Credit,
     Invoice,
+    IngestQueueItem,
     InvoiceLineItem,
     LedgerEntry,
     OrgBalance,
@@ -30,7 +38,12 @@ from .models import (
     Payment,
     PricingRule,
     UsageEvent,
+    UsageRollup,
 )
+from .idempotency import duplicate_log, idempotency
+from .pricing import pricing_cache
+from .sequences import invoice_seq, ledger_seq
+from .telemetry import EVENTS_INGESTED, LEDGER_WRITE_SECONDS, STAGE_SECONDS
 
 log = logging.getLogger('billing')
 
@@ -45,21 +58,21 @@ def _round(value: Decimal) -> Decimal:
     return value.quantize(_CENT, rounding=ROUND_HALF_UP)
 
 
+def _as_datetime(value):
+    """Coerce an ISO-8601 string (raw payload timestamp) to an aware datetime; None passes through."""
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if value is not None and timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
 def _next_seq() -> int:
-    last = LedgerEntry.objects.order_by('-seq').values_list('seq', flat=True).first()
-    return (last or 0) + 1
+    return ledger_seq.next()
 
 
 def _next_invoice_number() -> str:
-    last = Invoice.objects.order_by('-created_at').values_list('invoice_number', flat=True).first()
-    if last:
-        try:
-            n = int(last.split('-')[1]) + 1
-        except (IndexError, ValueError):
-            n = 1001
-    else:
-        n = 1001
-    return f'INV-{n}'
+    return f'INV-{invoice_seq.next()}'
 
 
 def _next_credit_number() -> str:
@@ -102,13 +115,13 @@ class EventConsumer:
 
         event_id = uuid.UUID(str(payload['event_id']))
 
-        # Idempotency check — replay-safe
-        existing = UsageEvent.objects.filter(event_id=event_id).first()
-        if existing:
-            log.info('Duplicate event ignored: %s', event_id)
-            existing.status = 'duplicate'
-            existing.save(update_fields=['status'])
-            return existing, False
+        # Idempotency check — replay-safe. Ids the in-memory front has never
+        # seen skip the lookup; the unique index catches any it missed.
+        known, maybe, _ = idempotency.classify([event_id])
+        if known or maybe:
+            existing = UsageEvent.objects.filter(event_id=event_id).first()
+            if existing:
+                return cls._duplicate(existing), False
 
         # Resolve org
         org = None
@@ -133,9 +146,29 @@ class EventConsumer:
             event_timestamp     = payload['timestamp'],
             status              = 'pending',
         )
-        event.save()
+        try:
+            with transaction.atomic():
+                event.save(force_insert=True)
+        except IntegrityError:
+            existing = UsageEvent.objects.filter(event_id=event_id).first()
+            if existing is None:
+                raise
+            return cls._duplicate(existing), False
+        idempotency.remember([event_id])
         return event, True
 
+    @staticmethod
+    def _duplicate(existing: UsageEvent) -> UsageEvent:
+        """
+        Count the redelivery and report it as 'duplicate' to the caller. The
+        status change is in memory only — the stored event keeps its own.
+        """
+        log.info('Duplicate event ignored: %s', existing.event_id)
+        idempotency.remember([existing.event_id])
+        duplicate_log.record([existing.event_id])
+        existing.status = 'duplicate'
+        return existing
+
     @classmethod
     def _validate(cls, payload: dict):
         missing = cls.REQUIRED_FIELDS - set(payload.keys())
@@ -206,20 +239,21 @@ class UsageNormalizer:
 
 class CostCalculator:
     @staticmethod
-    def get_active_rule(service: str, unit_type: str) -> PricingRule | None:
-        """Return the most recent active pricing rule for a service/unit pair."""
-        return (
-            PricingRule.objects.filter(service=service, unit_type=unit_type, is_active=True)
-            .order_by('-version')
-            .first()
-        )
+    def get_active_rule(service: str, unit_type: str, at=None) -> PricingRule | None:
+        """
+        Return the highest-version active pricing rule for a service/unit pair
+        in effect at `at` (default: now). Served from the in-process pricing cache.
+        """
+        return pricing_cache.get(service, unit_type, at=_as_datetime(at))
 
     @classmethod
-    def calculate(cls, service: str, unit_type: str, units: Decimal) -> tuple:
+    def calculate(cls, service: str, unit_type: str, units: Decimal, at=None) -> tuple:
         """
         Returns (unit_price: Decimal, total_cost: Decimal, rule: PricingRule|None).
+        `at` is the instant to price at — pass the event_timestamp so late or
+        replayed events are charged the rate that applied when they happened.
         """
-        rule = cls.get_active_rule(service, unit_type)
+        rule = cls.get_active_rule(service, unit_type, at=at)
         if not rule:
             return Decimal('0'), Decimal('0'), None
         total = _round(rule.unit_price * units)
@@ -245,6 +279,7 @@ class LedgerWriter:
         reference: str = '',
         metadata: dict = None,
         actor=None,
+        update_balance: bool = True,
     ) -> LedgerEntry:
         return LedgerWriter._write(
             organization=organization,
@@ -259,6 +294,7 @@ class LedgerWriter:
             reference=reference,
             metadata=metadata or {},
             actor=actor,
+            update_balance=update_balance,
         )
 
     @staticmethod
@@ -305,6 +341,49 @@ class LedgerWriter:
         )
 
     @staticmethod
+    @transaction.atomic
+    def write_charges_for_events(events: list, update_balance: bool = True) -> list:
+        """
+        Bulk-write one charge entry per priced UsageEvent.
+        The touched orgs' balances are locked once for the whole batch, sequence
+        numbers come from the block allocator, then the entries are bulk-inserted.
+        With update_balance=False the caller must pass the returned entries to
+        BalanceEngine.record() within the same transaction.
+        """
+        events = [e for e in events if e.total_cost > 0]
+        if not events:
+            return []
+
+        start = time.perf_counter()
+        balances = BalanceEngine.lock({e.organization_id for e in events})
+        running = {org_id: b.ledger_balance for org_id, b in balances.items()}
+
+        seqs = ledger_seq.take(len(events))
+        entries = []
+        for seq, event in zip(seqs, events):
+            running[event.organization_id] += _round(event.total_cost)
+            entries.append(LedgerEntry(
+                seq             = seq,
+                event           = event,
+                organization    = event.organization,
+                entry_type      = 'charge',
+                service         = event.service,
+                unit_type       = event.unit_type,
+                units           = event.units,
+                unit_price      = event.unit_price,
+                amount          = _round(event.total_cost),
+                running_balance = _round(running[event.organization_id]),
+                reference       = str(event.event_id),
+                note            = f'{event.event_type} — auto-charged',
+            ))
+        entries = LedgerEntry.objects.bulk_create(entries, batch_size=_IN_CHUNK)
+        LEDGER_WRITE_SECONDS.observe(time.perf_counter() - start, mode='batch')
+        if update_balance:
+            BalanceEngine.record(entries)
+        return entries
+
+    @staticmethod
+    @transaction.atomic
     def _write(
         organization: Organization,
         entry_type: str,
@@ -318,15 +397,13 @@ class LedgerWriter:
         reference: str = '',
         metadata: dict = None,
         actor=None,
+        update_balance: bool = True,
     ) -> LedgerEntry:
-        # Compute running balance from last entry for this org
-        last = (
-            LedgerEntry.objects.filter(organization=organization)
-            .order_by('-created_at', '-seq')
-            .values_list('running_balance', flat=True)
-            .first()
-        )
-        running = (last or Decimal('0')) + amount
+        start = time.perf_counter()
+        # Running balance is computed while the org's balance row is locked,
+        # so concurrent writers for the same org are serialized.
+        balance = BalanceEngine.lock({organization.pk})[organization.pk]
+        running = balance.ledger_balance + _round(amount)
 
         entry = LedgerEntry(
             seq             = _next_seq(),
@@ -345,6 +422,9 @@ class LedgerWriter:
             created_by      = actor,
         )
         entry.save()
+        LEDGER_WRITE_SECONDS.observe(time.perf_counter() - start, mode='single')
+        if update_balance:
+            BalanceEngine.record([entry])
         return entry
 
 
@@ -353,38 +433,199 @@ class LedgerWriter:
 # ─────────────────────────────────────────────────────────────────────────────
 
 class BalanceEngine:
+    """
+    Maintains OrgBalance snapshots.
+
+    In 'incremental' mode (BILLING_BALANCE_MODE, the default) every ledger
+    write applies its delta to the org's OrgBalance row with a single atomic
+    F() update, so the cost per write is constant regardless of ledger size.
+    In 'recompute' mode the snapshot is re-aggregated from the full ledger
+    after each write. recompute() / verify() remain available for repair
+    (see the billing_verify_balances command).
+
+    OrgBalance.ledger_balance doubles as the per-org serialization point:
+    LedgerWriter locks the row (lock()) before deriving the running balance
+    of a new entry, so parallel writers for one org queue up while writers
+    for different orgs proceed independently.
+    """
+
+    # Ledger entry type → OrgBalance bucket
+    _BUCKETS = {
+        'charge':     'charge',
+        'payment':    'payment',
+        'credit':     'credit',
+        'refund':     'credit',
+        'adjustment': 'credit',
+        'promo':      'credit',
+    }
+    _FIELDS = ['total_charges', 'total_payments', 'total_credits', 'outstanding', 'ledger_balance', 'last_computed']
+
+    @staticmethod
+    def incremental() -> bool:
+        from django.conf import settings
+        return getattr(settings, 'BILLING_BALANCE_MODE', 'incremental') == 'incremental'
+
+    @staticmethod
+    def lock(org_ids) -> dict:
+        """
+        Lock the OrgBalance rows of the given orgs (SELECT … FOR UPDATE, in a
+        stable order to avoid deadlocks) and return {org_id: OrgBalance}.
+        Orgs without a snapshot yet get one seeded from their ledger first.
+        Must be called inside a transaction.
+        """
+        org_ids = sorted(set(org_ids), key=str)
+        balances = {
+            b.organization_id: b
+            for b in OrgBalance.objects.select_for_update()
+            .filter(organization_id__in=org_ids).order_by('organization_id')
+        }
+        missing = [org_id for org_id in org_ids if org_id not in balances]
+        if missing:
+            OrgBalance.objects.bulk_create(
+                [OrgBalance(organization_id=org_id) for org_id in missing], ignore_conflicts=True,
+            )
+            list(OrgBalance.objects.select_for_update().filter(organization_id__in=missing).order_by('organization_id'))
+            balances.update(BalanceEngine.recompute_many(Organization.objects.filter(pk__in=missing)))
+        return balances
+
+    @staticmethod
+    def record(entries: list) -> None:
+        """Bring the OrgBalance snapshots up to date after new ledger entries were written."""
+        if not entries:
+            return
+        if BalanceEngine.incremental():
+            BalanceEngine.apply_entries(entries)
+        else:
+            BalanceEngine.recompute_many({entry.organization for entry in entries})
+
     @staticmethod
     @transaction.atomic
-    def recompute(organization: Organization) -> OrgBalance:
+    def apply_entries(entries: list) -> None:
         """
-        Recompute the OrgBalance snapshot from ledger entries.
-        Called after every ledger write.
+        Apply the deltas of freshly written ledger entries to OrgBalance —
+        one UPDATE per touched organization. Orgs without a snapshot yet are
+        seeded with a full recompute (which already includes these entries).
         """
-        from django.db.models import Sum
+        from django.db.models import F
+
+        deltas = {}
+        for entry in entries:
+            d = deltas.setdefault(entry.organization_id, {'charge': Decimal('0'), 'payment': Decimal('0'), 'credit': Decimal('0'), 'all': Decimal('0')})
+            d['all'] += entry.amount
+            bucket = BalanceEngine._BUCKETS.get(entry.entry_type)
+            if bucket:
+                d[bucket] += entry.amount
+
+        now = timezone.now()
+        missing = []
+        for org_id, d in deltas.items():
+            updated = OrgBalance.objects.filter(organization_id=org_id).update(
+                total_charges  = F('total_charges') + d['charge'],
+                # payments / credits are negative ledger amounts, stored as positive totals
+                total_payments = F('total_payments') - d['payment'],
+                total_credits  = F('total_credits') - d['credit'],
+                outstanding    = F('outstanding') + d['charge'] + d['payment'] + d['credit'],
+                ledger_balance = F('ledger_balance') + d['all'],
+                last_computed  = now,
+            )
+            if not updated:
+                missing.append(org_id)
+        if missing:
+            BalanceEngine.recompute_many(Organization.objects.filter(pk__in=missing))
 
-        entries = LedgerEntry.objects.filter(organization=organization)
+    @staticmethod
+    def _ledger_totals(org_ids) -> dict:
+        """Return {org_id: {'charge', 'payment', 'credit', 'all'}} summed over the full ledger."""
+        from django.db.models import Sum
 
-        charges = (
-            entries.filter(entry_type='charge')
-            .aggregate(s=Sum('amount'))['s'] or Decimal('0')
-        )
-        payments = (
-            entries.filter(entry_type='payment')
-            .aggregate(s=Sum('amount'))['s'] or Decimal('0')
+        sums = {org_id: {'charge': Decimal('0'), 'payment': Decimal('0'), 'credit': Decimal('0'), 'all': Decimal('0')}
+                for org_id in org_ids}
+        rows = (
+            LedgerEntry.objects.filter(organization_id__in=org_ids)
+            .values('organization_id', 'entry_type')
+            .annotate(s=Sum('amount'))
         )
-        credits = (
-            entries.filter(entry_type__in=['credit', 'refund', 'adjustment', 'promo'])
-            .aggregate(s=Sum('amount'))['s'] or Decimal('0')
-        )
-        outstanding = _round(charges + payments + credits)  # payments / credits are negative
+        for row in rows:
+            sums[row['organization_id']]['all'] += row['s'] or Decimal('0')
+            bucket = BalanceEngine._BUCKETS.get(row['entry_type'])
+            if bucket:
+                sums[row['organization_id']][bucket] += row['s'] or Decimal('0')
+        return sums
 
-        balance, _ = OrgBalance.objects.get_or_create(organization=organization)
-        balance.total_charges  = _round(charges)
-        balance.total_payments = _round(abs(payments))
-        balance.total_credits  = _round(abs(credits))
-        balance.outstanding    = outstanding
-        balance.save()
-        return balance
+    @staticmethod
+    def _expected(totals: dict) -> dict:
+        charges, payments, credits = totals['charge'], totals['payment'], totals['credit']
+        return {
+            'total_charges':  _round(charges),
+            'total_payments': _round(abs(payments)),
+            'total_credits':  _round(abs(credits)),
+            'outstanding':    _round(charges + payments + credits),  # payments / credits are negative
+            'ledger_balance': _round(totals['all']),
+        }
+
+    @staticmethod
+    @transaction.atomic
+    def recompute(organization: Organization) -> OrgBalance:
+        """Recompute the OrgBalance snapshot from the org's full ledger."""
+        return BalanceEngine.recompute_many([organization])[organization.pk]
+
+    @staticmethod
+    @transaction.atomic
+    def recompute_many(organizations) -> dict:
+        """
+        Recompute OrgBalance snapshots for several organizations at once:
+        one grouped aggregate over their ledger entries, then one bulk
+        insert / update. Returns {org_id: OrgBalance}.
+        """
+        org_ids = {org.pk for org in organizations}
+        if not org_ids:
+            return {}
+
+        totals = BalanceEngine._ledger_totals(org_ids)
+
+        existing = list(OrgBalance.objects.filter(organization_id__in=org_ids))
+        balances = {b.organization_id: b for b in existing}
+        missing = [OrgBalance(organization_id=org_id) for org_id in org_ids if org_id not in balances]
+        for balance in missing:
+            balances[balance.organization_id] = balance
+
+        now = timezone.now()
+        for org_id, balance in balances.items():
+            for field, value in BalanceEngine._expected(totals[org_id]).items():
+                setattr(balance, field, value)
+            balance.last_computed = now
+
+        OrgBalance.objects.bulk_create(missing)
+        OrgBalance.objects.bulk_update(existing, BalanceEngine._FIELDS)
+        return balances
+
+    @staticmethod
+    def verify(org_ids=None) -> list:
+        """
+        Compare stored OrgBalance snapshots with a full ledger re-aggregation.
+        Returns one dict per drifting org: {'organization_id', 'field', 'stored', 'expected'}.
+        An org with ledger entries but no snapshot reports every field with stored=None.
+        """
+        if org_ids is None:
+            org_ids = set(LedgerEntry.objects.values_list('organization_id', flat=True).distinct())
+            org_ids |= set(OrgBalance.objects.values_list('organization_id', flat=True))
+        org_ids = set(org_ids)
+        totals = BalanceEngine._ledger_totals(org_ids)
+        stored = {b.organization_id: b for b in OrgBalance.objects.filter(organization_id__in=org_ids)}
+
+        drift = []
+        for org_id in sorted(org_ids, key=str):
+            balance = stored.get(org_id)
+            for field, expected in BalanceEngine._expected(totals[org_id]).items():
+                actual = getattr(balance, field) if balance else None
+                if actual != expected:
+                    drift.append({
+                        'organization_id': org_id,
+                        'field':           field,
+                        'stored':          actual,
+                        'expected':        expected,
+                    })
+        return drift
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -403,23 +644,31 @@ class InvoiceGenerator:
         """
         Aggregate all charge ledger entries in the period into a new Invoice.
         Applies any active credits automatically.
+
+        The number of queries is constant: one grouped aggregate feeds both the
+        subtotal and the line items, line prices come from one pricing-cache
+        snapshot, and line items / credits are written in bulk.
         """
         from django.db.models import Sum as _Sum
 
-        entries = LedgerEntry.objects.filter(
-            organization=organization,
-            entry_type='charge',
-            created_at__date__gte=period_start,
-            created_at__date__lte=period_end,
+        service_totals = list(
+            LedgerEntry.objects.filter(
+                organization=organization,
+                entry_type='charge',
+                created_at__date__gte=period_start,
+                created_at__date__lte=period_end,
+            )
+            .values('service', 'unit_type')
+            .annotate(
+                total_units  = _Sum('units'),
+                total_amount = _Sum('amount'),
+            )
+            .order_by('service', 'unit_type')
         )
-
-        subtotal = entries.aggregate(s=_Sum('amount'))['s'] or Decimal('0')
-        subtotal = _round(subtotal)
+        subtotal = _round(sum((row['total_amount'] or Decimal('0') for row in service_totals), Decimal('0')))
 
         # Apply outstanding active credits
-        active_credits = Credit.objects.filter(
-            organization=organization, status='active'
-        )
+        active_credits = list(Credit.objects.filter(organization=organization, status='active'))
         credits_total = sum(c.amount for c in active_credits) or Decimal('0')
         credits_applied = min(credits_total, subtotal)
         total = _round(subtotal - credits_applied)
@@ -439,39 +688,37 @@ class InvoiceGenerator:
             created_by      = actor,
         )
 
-        # Build line items grouped by service
-        from django.db.models import Sum as S2
-        service_totals = (
-            entries.values('service', 'unit_type')
-            .annotate(
-                total_units  = S2('units'),
-                total_amount = S2('amount'),
-            )
-        )
+        # Build line items grouped by service, priced from one rule snapshot
+        rules = pricing_cache.snapshot(verify=True)
+        now = timezone.now()
+        line_items = []
         for row in service_totals:
-            unit_price = Decimal('0')
-            rule = CostCalculator.get_active_rule(row['service'], row['unit_type'])
-            if rule:
-                unit_price = rule.unit_price
-            InvoiceLineItem.objects.create(
+            timeline = rules.get((row['service'], row['unit_type']))
+            rule = timeline.at(now) if timeline else None
+            line_items.append(InvoiceLineItem(
                 invoice     = invoice,
                 service     = row['service'],
                 description = f"{row['service'].title()} — {row['unit_type']}",
                 unit_type   = row['unit_type'],
                 units       = row['total_units'] or Decimal('0'),
-                unit_price  = unit_price,
+                unit_price  = rule.unit_price if rule else Decimal('0'),
                 amount      = _round(row['total_amount'] or Decimal('0')),
-            )
+            ))
+        InvoiceLineItem.objects.bulk_create(line_items, batch_size=_IN_CHUNK)
 
         # Mark credits as applied
         remaining = credits_applied
+        applied = []
         for credit in active_credits:
             if remaining <= 0:
                 break
             credit.status     = 'applied'
             credit.applied_to = invoice
-            credit.save(update_fields=['status', 'applied_to', 'updated_at'])
+            credit.updated_at = now   # bulk_update() skips auto_now
+            applied.append(credit)
             remaining -= credit.amount
+        if applied:
+            Credit.objects.bulk_update(applied, ['status', 'applied_to', 'updated_at'])
 
         # Write ledger entry for the invoice issuance
         LedgerWriter._write(
@@ -482,8 +729,6 @@ class InvoiceGenerator:
             note         = f'Invoice {invoice_number} issued',
             actor        = actor,
         )
-
-        BalanceEngine.recompute(organization)
         return invoice
 
     @staticmethod
@@ -515,7 +760,6 @@ class InvoiceGenerator:
             invoice.status  = 'paid'
             invoice.paid_at = timezone.now()
             invoice.save(update_fields=['status', 'paid_at', 'updated_at'])
-        BalanceEngine.recompute(invoice.organization)
         return payment
 
 
@@ -534,26 +778,35 @@ def process_event(payload: dict, source_ip: str = None) -> UsageEvent:
     5. Update balance
     Returns the processed UsageEvent.
     """
-    event, created = EventConsumer.ingest(payload, source_ip=source_ip)
+    try:
+        with STAGE_SECONDS.time(pipeline='event', stage='consume'):
+            event, created = EventConsumer.ingest(payload, source_ip=source_ip)
+    except ValueError:
+        EVENTS_INGESTED.inc(status='invalid')
+        raise
 
     if not created:
+        EVENTS_INGESTED.inc(status='duplicate')
         return event  # duplicate, skip
 
     if not event.organization:
         event.status           = 'rejected'
         event.rejection_reason = 'Unknown organization'
         event.save(update_fields=['status', 'rejection_reason'])
+        EVENTS_INGESTED.inc(status='rejected')
         return event
 
     # Normalize
-    billing_unit, billing_units = UsageNormalizer.normalize(
-        event.service, event.unit_type, event.units
-    )
+    with STAGE_SECONDS.time(pipeline='event', stage='normalize'):
+        billing_unit, billing_units = UsageNormalizer.normalize(
+            event.service, event.unit_type, event.units
+        )
 
     # Calculate cost
-    unit_price, total_cost, rule = CostCalculator.calculate(
-        event.service, billing_unit, billing_units
-    )
+    with STAGE_SECONDS.time(pipeline='event', stage='price'):
+        unit_price, total_cost, rule = CostCalculator.calculate(
+            event.service, billing_unit, billing_units, at=event.event_timestamp
+        )
 
     # Update event with computed values
     event.unit_type     = billing_unit
@@ -564,20 +817,572 @@ def process_event(payload: dict, source_ip: str = None) -> UsageEvent:
     event.status        = 'processed'
     event.processed_at  = timezone.now()
     event.save(update_fields=['unit_type', 'units', 'unit_price', 'total_cost', 'pricing_rule', 'status', 'processed_at'])
+    RollupWriter.record([event])
 
     # Write ledger
     if total_cost > 0:
-        LedgerWriter.write_charge(
-            organization = event.organization,
-            amount       = total_cost,
-            service      = event.service,
-            unit_type    = billing_unit,
-            units        = billing_units,
-            unit_price   = unit_price,
-            event        = event,
-            reference    = str(event.event_id),
-            note         = f'{event.event_type} — auto-charged',
-        )
-        BalanceEngine.recompute(event.organization)
+        with STAGE_SECONDS.time(pipeline='event', stage='ledger'):
+            entry = LedgerWriter.write_charge(
+                organization   = event.organization,
+                amount         = total_cost,
+                service        = event.service,
+                unit_type      = billing_unit,
+                units          = billing_units,
+                unit_price     = unit_price,
+                event          = event,
+                reference      = str(event.event_id),
+                note           = f'{event.event_type} — auto-charged',
+                update_balance = False,
+            )
+        # Update balance
+        with STAGE_SECONDS.time(pipeline='event', stage='balance'):
+            BalanceEngine.record([entry])
 
+    EVENTS_INGESTED.inc(status='processed')
     return event
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# H — Batch event processing pipeline (bulk ingest entry point)
+# ─────────────────────────────────────────────────────────────────────────────
+
+# Upper bound on IN (...) list sizes so very large batches stay within the
+# bound-parameter limits of every supported backend.
+_IN_CHUNK = 1000
+
+
+def _chunked(items: list, size: int = _IN_CHUNK):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _existing_event_ids(event_ids: list) -> set:
+    found = set()
+    for chunk in _chunked(event_ids):
+        found.update(
+            UsageEvent.objects.filter(event_id__in=chunk).values_list('event_id', flat=True)
+        )
+    return found
+
+
+def _duplicate_result(i: int, event_id) -> dict:
+    log.info('Duplicate event ignored: %s', event_id)
+    return {
+        'index': i, 'event_id': str(event_id),
+        'status': 'duplicate', 'total_cost': '0', 'error': '',
+    }
+
+
+def _insert_events(events: list, results: list) -> list:
+    """
+    Bulk-insert (index, UsageEvent) pairs whose ids skipped the database
+    lookup. If the unique index reports an id the idempotency front missed
+    (inserted by another process, or before a restart), the clashing events
+    are re-checked and recorded as duplicates, and the rest inserted again.
+    """
+    try:
+        with transaction.atomic():
+            UsageEvent.objects.bulk_create([e for _, e in events], batch_size=_IN_CHUNK)
+    except IntegrityError:
+        clash = _existing_event_ids([e.event_id for _, e in events])
+        if not clash:
+            raise
+        for i, event in events:
+            if event.event_id in clash:
+                results[i] = _duplicate_result(i, event.event_id)
+        events = [(i, e) for i, e in events if e.event_id not in clash]
+        UsageEvent.objects.bulk_create([e for _, e in events], batch_size=_IN_CHUNK)
+        idempotency.remember(clash)
+    idempotency.remember(e.event_id for _, e in events)
+    return events
+
+
+def _resolve_orgs(raw_refs: set) -> dict:
+    """Map every raw organization reference (UUID or slug) to its Organization."""
+    if not raw_refs:
+        return {}
+    uuids = [r for r in raw_refs if EventConsumer._is_uuid(r)]
+    lookup = {}
+    for org in Organization.objects.filter(models.Q(id__in=uuids) | models.Q(slug__in=list(raw_refs))):
+        lookup[org.slug] = org
+        lookup[str(org.id)] = org
+    resolved = {}
+    for ref in raw_refs:
+        org = lookup.get(ref)
+        if org is None and ref in uuids:
+            org = lookup.get(str(uuid.UUID(ref)))
+        resolved[ref] = org
+    return resolved
+
+
+@transaction.atomic
+def process_events(payloads: list, source_ip: str = None) -> list:
+    """
+    Full Layer 1 → Layer 2 → Layer 3 pipeline for a batch of events.
+
+    Same semantics as process_event(), but deduplication, organization
+    resolution and pricing are resolved once for the whole batch and events
+    are bulk-inserted. Returns one result dict per input payload, in order:
+        {'index', 'event_id', 'status', 'total_cost', 'error'}
+    where status is processed / rejected / duplicate / invalid.
+    """
+    results = [None] * len(payloads)
+    valid = []  # (index, payload, event_id)
+    t0 = time.perf_counter()
+
+    # 1. Consume — validate schema
+    for i, payload in enumerate(payloads):
+        try:
+            EventConsumer._validate(payload)
+            event_id = uuid.UUID(str(payload['event_id']))
+        except (ValueError, TypeError, AttributeError) as exc:
+            results[i] = {
+                'index': i, 'event_id': str(payload.get('event_id', '')) if isinstance(payload, dict) else '',
+                'status': 'invalid', 'total_cost': '0', 'error': str(exc),
+            }
+            continue
+        valid.append((i, payload, event_id))
+
+    # Deduplicate — ids the idempotency front knows are committed are
+    # duplicates outright; only possible Bloom hits need the event_id__in
+    # lookup. In-batch repeats are caught by `seen`.
+    known, maybe, _ = idempotency.classify({event_id for _, _, event_id in valid})
+    existing = known | _existing_event_ids(list(maybe))
+    idempotency.remember(existing - known)
+    seen = set()
+    fresh = []
+    for i, payload, event_id in valid:
+        if event_id in existing or event_id in seen:
+            results[i] = _duplicate_result(i, event_id)
+            continue
+        seen.add(event_id)
+        fresh.append((i, payload, event_id))
+
+    # Resolve orgs once per batch
+    orgs = _resolve_orgs({str(p.get('organization_id', '')) for _, p, _ in fresh} - {''})
+
+    # 2. Normalize units
+    t1 = time.perf_counter()
+    now = timezone.now()
+    events = []
+    for i, payload, event_id in fresh:
+        org_raw = str(payload.get('organization_id', ''))
+        org = orgs.get(org_raw) if org_raw else None
+        raw_units = Decimal(str(payload['units']))
+        event = UsageEvent(
+            event_id            = event_id,
+            service             = payload['service'],
+            event_type          = payload['event_type'],
+            organization        = org,
+            organization_id_raw = org_raw,
+            user_id             = payload.get('user_id'),
+            project_id          = payload.get('project_id', ''),
+            units               = raw_units,
+            unit_type           = payload['unit_type'],
+            metadata            = payload.get('metadata', {}),
+            source_ip           = source_ip,
+            event_timestamp     = payload['timestamp'],
+        )
+        if org is None:
+            event.status           = 'rejected'
+            event.rejection_reason = 'Unknown organization'
+        else:
+            event.unit_type, event.units = UsageNormalizer.normalize(
+                event.service, payload['unit_type'], raw_units
+            )
+            event.status       = 'processed'
+            event.processed_at = now
+        events.append((i, event))
+
+    # 3. Calculate cost — priced at each event's own timestamp from the cached rule timelines
+    t2 = time.perf_counter()
+    rules = pricing_cache.snapshot(verify=True)   # one version check per batch
+    for _, event in events:
+        if event.status != 'processed':
+            continue
+        timeline = rules.get((event.service, event.unit_type))
+        rule = timeline.at(_as_datetime(event.event_timestamp)) if timeline else None
+        if rule:
+            event.unit_price   = rule.unit_price
+            event.total_cost   = _round(rule.unit_price * event.units)
+            event.pricing_rule = rule
+
+    t3 = time.perf_counter()
+    events = _insert_events(events, results)
+    t4 = time.perf_counter()
+
+    # 4. Write ledger, 5. update each touched org's balance once
+    processed = [e for _, e in events if e.status == 'processed']
+    with STAGE_SECONDS.time(pipeline='batch', stage='ledger'):
+        entries = LedgerWriter.write_charges_for_events(processed, update_balance=False)
+    with STAGE_SECONDS.time(pipeline='batch', stage='balance'):
+        BalanceEngine.record(entries)
+    RollupWriter.record(processed)
+
+    # Consume covers validation / dedup / org resolution plus the event insert
+    STAGE_SECONDS.observe((t1 - t0) + (t4 - t3), pipeline='batch', stage='consume')
+    STAGE_SECONDS.observe(t2 - t1, pipeline='batch', stage='normalize')
+    STAGE_SECONDS.observe(t3 - t2, pipeline='batch', stage='price')
+
+    outcomes = {}
+    for i, event in events:
+        results[i] = {
+            'index': i, 'event_id': str(event.event_id), 'status': event.status,
+            'total_cost': str(event.total_cost), 'error': event.rejection_reason,
+        }
+    for result in results:
+        outcomes[result['status']] = outcomes.get(result['status'], 0) + 1
+    duplicate_log.record(uuid.UUID(r['event_id']) for r in results if r['status'] == 'duplicate')
+    for outcome, n in outcomes.items():
+        EVENTS_INGESTED.inc(n, status=outcome)
+    return results
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# I — Async ingest queue (BILLING_INGEST_MODE = 'async')
+# ─────────────────────────────────────────────────────────────────────────────
+
+def ingest_async() -> bool:
+    from django.conf import settings
+    return getattr(settings, 'BILLING_INGEST_MODE', 'sync') == 'async'
+
+
+def enqueue_events(payloads: list, source_ip: str = None) -> list:
+    """
+    Append validated raw payloads to the staging table and return the queue
+    items. No deduplication, pricing or ledger work happens here — the
+    billing_ingest_worker command drains the queue through process_events().
+    """
+    items = [IngestQueueItem(payload=_stageable(payload), source_ip=source_ip) for payload in payloads]
+    return IngestQueueItem.objects.bulk_create(items, batch_size=_IN_CHUNK)
+
+
+def _stageable(payload: dict) -> dict:
+    """
+    Payload with datetimes as full-precision ISO-8601 strings. The staging
+    column's DjangoJSONEncoder would cut them to milliseconds, so an async
+    event would be stored and priced at a different instant than in sync mode.
+    """
+    return {
+        key: value.isoformat() if isinstance(value, datetime) else value
+        for key, value in payload.items()
+    }
+
+
+def drain_ingest_queue(batch_size: int = None) -> dict:
+    """
+    Claim up to batch_size queued payloads (oldest first), run them through
+    the batch pipeline and delete them — all in one transaction, so a worker
+    that dies mid-batch leaves its items queued for the next one.
+
+    Claims use SELECT … FOR UPDATE SKIP LOCKED, so parallel workers on
+    PostgreSQL take disjoint batches. A payload that makes the pipeline raise
+    is retried up to BILLING_INGEST_MAX_ATTEMPTS times, then marked failed.
+    Returns counts per outcome for the claimed batch.
+    """
+    from django.conf import settings
+
+    batch_size   = batch_size or getattr(settings, 'BILLING_INGEST_WORKER_BATCH', 500)
+    max_attempts = getattr(settings, 'BILLING_INGEST_MAX_ATTEMPTS', 5)
+    counts = {'claimed': 0, 'processed': 0, 'rejected': 0, 'duplicate': 0, 'invalid': 0, 'failed': 0}
+
+    with transaction.atomic():
+        items = list(
+            IngestQueueItem.objects.select_for_update(skip_locked=True)
+            .filter(status='queued').order_by('id')[:batch_size]
+        )
+        if not items:
+            return counts
+        counts['claimed'] = len(items)
+
+        by_ip = {}
+        for item in items:
+            by_ip.setdefault(item.source_ip, []).append(item)
+
+        done, errored = [], []
+        for source_ip, group in by_ip.items():
+            try:
+                with transaction.atomic():
+                    results = process_events([item.payload for item in group], source_ip=source_ip)
+                done.extend(group)
+            except Exception:
+                # Isolate the poison payload(s) so the rest of the group still goes through
+                results = []
+                for item in group:
+                    try:
+                        with transaction.atomic():
+                            results.extend(process_events([item.payload], source_ip=source_ip))
+                        done.append(item)
+                    except Exception as exc:
+                        log.exception('Ingest queue item %s failed', item.pk)
+                        item.attempts  += 1
+                        item.last_error = str(exc)[:2000]
+                        if item.attempts >= max_attempts:
+                            item.status = 'failed'
+                            counts['failed'] += 1
+                        errored.append(item)
+            for result in results:
+                counts[result['status']] += 1
+
+        IngestQueueItem.objects.filter(pk__in=[item.pk for item in done]).delete()
+        if errored:
+            IngestQueueItem.objects.bulk_update(errored, ['attempts', 'last_error', 'status'])
+    return counts
+
+
+def ingest_queue_stats() -> dict:
+    """Backlog depth and lag of the async ingest queue, in one query."""
+    agg = IngestQueueItem.objects.aggregate(
+        depth  = models.Count('id', filter=models.Q(status='queued')),
+        failed = models.Count('id', filter=models.Q(status='failed')),
+        oldest = models.Min('enqueued_at', filter=models.Q(status='queued')),
+    )
+    lag = (timezone.now() - agg['oldest']).total_seconds() if agg['oldest'] else 0.0
+    return {
+        'depth':              agg['depth'],
+        'failed':             agg['failed'],
+        'oldest_enqueued_at': agg['oldest'].isoformat() if agg['oldest'] else None,
+        'lag_seconds':        round(max(lag, 0.0), 3),
+    }
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# J — Usage rollups (Layer 3 — dashboard read model)
+# ─────────────────────────────────────────────────────────────────────────────
+
+class RollupWriter:
+    """
+    Maintains UsageRollup rows. record() folds freshly processed events into
+    their hour and day buckets with one additive upsert per batch
+    (INSERT … ON CONFLICT … DO UPDATE, supported by PostgreSQL and SQLite);
+    rebuild() re-derives a time range from the raw events.
+    """
+
+    GRANULARITIES = ('hour', 'day')
+    _KEY_FIELDS = ('granularity', 'bucket', 'organization', 'service', 'unit_type', 'user_key')
+
+    @staticmethod
+    def bucket_start(when, granularity: str):
+        when = _as_datetime(when).astimezone(dt_timezone.utc)
+        if granularity == 'day':
+            return when.replace(hour=0, minute=0, second=0, microsecond=0)
+        return when.replace(minute=0, second=0, microsecond=0)
+
+    @staticmethod
+    def record(events: list) -> None:
+        """Add processed events to their hourly and daily rollups."""
+        sums = {}
+        for event in events:
+            if event.status != 'processed' or not event.organization_id:
+                continue
+            for granularity in RollupWriter.GRANULARITIES:
+                key = (
+                    granularity,
+                    RollupWriter.bucket_start(event.event_timestamp, granularity),
+                    event.organization_id,
+                    event.service,
+                    event.unit_type,
+                    event.user_id or 0,
+                )
+                row = sums.setdefault(key, [0, Decimal('0'), Decimal('0')])
+                row[0] += 1
+                row[1] += event.units
+                row[2] += event.total_cost
+        if not sums:
+            return
+
+        from django.db import connection
+
+        qn = connection.ops.quote_name
+        table = qn(UsageRollup._meta.db_table)
+        key_cols = ', '.join(qn(UsageRollup._meta.get_field(name).column) for name in RollupWriter._KEY_FIELDS)
+        sql = (
+            f'INSERT INTO {table} ({key_cols}, event_count, total_units, total_cost) '
+            f'VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s) '
+            f'ON CONFLICT ({key_cols}) DO UPDATE SET '
+            f'event_count = {table}.event_count + excluded.event_count, '
+            f'total_units = {table}.total_units + excluded.total_units, '
+            f'total_cost = {table}.total_cost + excluded.total_cost'
+        )
+        field = UsageRollup._meta.get_field
+        params = [
+            (
+                granularity,
+                field('bucket').get_db_prep_value(bucket, connection),
+                field('organization').get_db_prep_value(org_id, connection),
+                service, unit_type, user_key,
+                count,
+                field('total_units').get_db_prep_value(units, connection),
+                field('total_cost').get_db_prep_value(cost, connection),
+            )
+            for (granularity, bucket, org_id, service, unit_type, user_key), (count, units, cost)
+            in sorted(sums.items(), key=lambda item: str(item[0]))  # stable lock order
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+
+    @staticmethod
+    @transaction.atomic
+    def rebuild(since=None, until=None) -> int:
+        """
+        Recompute rollups for events with since <= event_timestamp < until
+        (both optional, truncated to whole days) from the raw UsageEvent table.
+        Returns the number of rollup rows written.
+        """
+        from django.db.models import Count, Sum
+        from django.db.models.functions import TruncDay, TruncHour
+
+        events = UsageEvent.objects.filter(status='processed', organization__isnull=False)
+        rollups = UsageRollup.objects.all()
+        if since:
+            since = RollupWriter.bucket_start(since, 'day')
+            events, rollups = events.filter(event_timestamp__gte=since), rollups.filter(bucket__gte=since)
+        if until:
+            until = RollupWriter.bucket_start(until, 'day')
+            events, rollups = events.filter(event_timestamp__lt=until), rollups.filter(bucket__lt=until)
+        rollups.delete()
+
+        written = 0
+        for granularity, trunc in (('hour', TruncHour), ('day', TruncDay)):
+            rows = (
+                events.annotate(b=trunc('event_timestamp', tzinfo=dt_timezone.utc))
+                .values('b', 'organization_id', 'service', 'unit_type', 'user_id')
+                .annotate(n=Count('id'), u=Sum('units'), c=Sum('total_cost'))
+                .order_by()
+            )
+            batch = []
+            for row in rows.iterator(chunk_size=_IN_CHUNK):
+                batch.append(UsageRollup(
+                    granularity     = granularity,
+                    bucket          = row['b'],
+                    organization_id = row['organization_id'],
+                    service         = row['service'],
+                    unit_type       = row['unit_type'],
+                    user_key        = row['user_id'] or 0,
+                    event_count     = row['n'],
+                    total_units     = row['u'] or Decimal('0'),
+                    total_cost      = row['c'] or Decimal('0'),
+                ))
+                if len(batch) >= _IN_CHUNK:
+                    written += len(UsageRollup.objects.bulk_create(batch))
+                    batch = []
+            written += len(UsageRollup.objects.bulk_create(batch))
+        return written
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# K — Month-end billing run (manage.py billing_run)
+# ─────────────────────────────────────────────────────────────────────────────
+
+def start_billing_run(period_start: date, period_end: date, org_ids=None,
+                      retry_failed: bool = False, actor=None) -> tuple:
+    """
+    Return (run, resumed). An unfinished run for the same period is resumed;
+    otherwise a new run gets one pending item per active organization (or
+    per id in org_ids). With retry_failed, a run that finished with failures
+    is reopened too, and its failed items are queued again.
+    """
+    statuses = ['running', 'failed'] if retry_failed else ['running']
+    run = (
+        BillingRun.objects
+        .filter(period_start=period_start, period_end=period_end, status__in=statuses)
+        .order_by('-started_at')
+        .first()
+    )
+    if run is not None:
+        if retry_failed:
+            run.items.filter(status='failed').update(status='pending', error='')
+            if run.status == 'failed':
+                run.status, run.finished_at = 'running', None
+                run.save(update_fields=['status', 'finished_at'])
+        return run, True
+
+    orgs = Organization.objects.filter(status='active')
+    if org_ids is not None:
+        orgs = Organization.objects.filter(pk__in=org_ids)
+    with transaction.atomic():
+        run = BillingRun.objects.create(period_start=period_start, period_end=period_end, created_by=actor)
+        BillingRunItem.objects.bulk_create(
+            [BillingRunItem(run=run, organization_id=pk) for pk in orgs.order_by('pk').values_list('pk', flat=True)],
+            batch_size=_IN_CHUNK,
+        )
+    return run, False
+
+
+def run_billing_items(run: BillingRun, stop=None, actor=None) -> dict:
+    """
+    Worker loop: claim one pending item at a time (SELECT … FOR UPDATE SKIP
+    LOCKED, so parallel workers never share an org) and invoice it. The item
+    checkpoint commits together with the invoice. Orgs that already have an
+    invoice for the period are skipped. Returns per-status counts.
+    """
+    counts = {'done': 0, 'skipped': 0, 'failed': 0}
+    while stop is None or not stop.is_set():
+        with transaction.atomic():
+            item = (
+                # of=('self',): on PostgreSQL a bare FOR UPDATE would also lock the
+                # joined Organization row and block ingest for the whole item
+                BillingRunItem.objects.select_for_update(skip_locked=True, of=('self',))
+                .select_related('organization')
+                .filter(run=run, status='pending')
+                .order_by('id')
+                .first()
+            )
+            if item is None:
+                break
+            started = time.perf_counter()
+            item.attempts += 1
+            try:
+                with transaction.atomic():
+                    existing = Invoice.objects.filter(
+                        organization=item.organization,
+                        period_start=run.period_start,
+                        period_end=run.period_end,
+                    ).first()
+                    if existing is not None:
+                        item.invoice, item.status = existing, 'skipped'
+                    else:
+                        item.invoice = InvoiceGenerator.generate_for_period(
+                            item.organization, run.period_start, run.period_end, actor=actor,
+                        )
+                        item.status = 'done'
+                    item.error = ''
+            except Exception as exc:
+                log.exception('Billing run %s failed for org %s', run.pk, item.organization_id)
+                item.invoice, item.status, item.error = None, 'failed', str(exc)
+            item.duration_ms = int((time.perf_counter() - started) * 1000)
+            item.finished_at = timezone.now()
+            item.save()
+        counts[item.status] += 1
+    return counts
+
+
+def finish_billing_run(run: BillingRun) -> dict:
+    """Close the run once no items are pending and return its timing report."""
+    from django.db.models import Count as _Count
+
+    by_status = dict(run.items.values_list('status').annotate(n=_Count('id')).values_list('status', 'n'))
+    if not by_status.get('pending'):
+        run.status      = 'failed' if by_status.get('failed') else 'completed'
+        run.finished_at = timezone.now()
+        run.save(update_fields=['status', 'finished_at'])
+
+    durations = sorted(run.items.filter(duration_ms__isnull=False).values_list('duration_ms', flat=True))
+
+    def pct(p):
+        return durations[min(len(durations) - 1, int(len(durations) * p))] if durations else 0
+
+    slowest = list(
+        run.items.filter(duration_ms__isnull=False)
+        .order_by('-duration_ms')
+        .values_list('organization__slug', 'duration_ms', 'status')[:10]
+    )
+    return {
+        'run':       run.pk,
+        'status':    run.status,
+        'counts':    {s: by_status.get(s, 0) for s in ('pending', 'done', 'skipped', 'failed')},
+        'timing_ms': {'p50': pct(0.5), 'p95': pct(0.95), 'max': durations[-1] if durations else 0,
+                      'total': sum(durations)},
+        'slowest':   slowest,
+    }
+
@@ -0,0 +1,376 @@
+"""
+AtonixDev Billing — Pipeline telemetry (Prometheus text exposition)
+
+In-process counters and histograms for the ingest pipeline, rendered in the
+Prometheus text format (0.0.4, which OpenMetrics scrapers accept) by
+GET /metrics.
+
+Multi-process aggregation:
+  gunicorn / ingest workers run as separate processes, each with its own
+  in-memory values. When BILLING_METRICS_DIR is set, every process writes its
+  values to <dir>/billing-<pid>-<token>.json (atomically): a daemon thread
+  writes any changed values every BILLING_METRICS_FLUSH_INTERVAL seconds, and
+  once more at exit. The exposition sums all files plus the serving process's
+  live values. The random token keeps a reused pid from overwriting an exited
+  worker's file. inc() / observe() only update memory; values are
+  snapshotted under the metrics lock and written after releasing it.
+  On scrape, files of exited processes on the same host are folded into
+  billing-exited.json and deleted: the directory stays bounded and counters
+  never go backwards. Clear the directory when the whole deployment restarts.
+  Without BILLING_METRICS_DIR only the serving process is reported.
+"""
+
+import atexit
+import glob
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: files of exited processes are not pruned
+    fcntl = None
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+EXITED_FILE = 'billing-exited.json'
+
+
+class _Store:
+    """Per-process metric values, reset after fork."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.pid         = os.getpid()
+        self.token       = uuid.uuid4().hex
+        self.counters    = {}   # (name, labels) -> float
+        self.histograms  = {}   # (name, labels) -> [bucket counts..., sum, count]
+        self.dirty       = False
+        self.version     = 0    # snapshots taken
+        self.written     = 0    # newest snapshot on disk
+        self.write_lock  = threading.Lock()
+        self._thread     = None
+
+    def check_fork(self):
+        if self.pid != os.getpid():
+            self._reset()
+
+    # ── Persistence ──────────────────────────────────────────────────────────
+
+    @staticmethod
+    def directory():
+        return getattr(settings, 'BILLING_METRICS_DIR', '') or None
+
+    @property
+    def filename(self) -> str:
+        return f'billing-{self.pid}-{self.token}.json'
+
+    def dump(self) -> dict:
+        """Copy of the values (caller holds the lock)."""
+        return {
+            'host':       socket.gethostname(),
+            'pid':        self.pid,
+            'counters':   [[n, list(l), v] for (n, l), v in self.counters.items()],
+            'histograms': [[n, list(l), list(v)] for (n, l), v in self.histograms.items()],
+        }
+
+    def changed(self) -> None:
+        """Mark the values dirty and start the flusher (caller holds the lock)."""
+        self.dirty = True
+        if self._thread is None and self.directory():
+            self._thread = threading.Thread(target=self._run, name='billing-metrics-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        me = threading.current_thread()
+        while True:
+            time.sleep(getattr(settings, 'BILLING_METRICS_FLUSH_INTERVAL', 1.0))
+            if self._thread is not me:
+                return  # superseded by _reset()
+            self.flush()
+
+    def flush(self, force: bool = False) -> None:
+        """Write the values if they changed since the last flush (always with force)."""
+        with self.lock:
+            self.check_fork()
+            snapshot = self.snapshot() if self.dirty or force else None
+        self.write(snapshot)
+
+    def snapshot(self):
+        """
+        (version, path, values), or None without BILLING_METRICS_DIR. Caller
+        holds the lock and passes the result to write() after releasing it.
+        """
+        directory = self.directory()
+        if not directory:
+            return None
+        self.dirty = False
+        self.version += 1
+        return self.version, os.path.join(directory, self.filename), self.dump()
+
+    def write(self, snapshot) -> None:
+        """Persist a snapshot; an older snapshot never replaces a newer one."""
+        if snapshot is None:
+            return
+        version, path, values = snapshot
+        with self.write_lock:
+            if version <= self.written:
+                return
+            try:
+                _write_json(path, values)
+                self.written = version
+            except OSError:
+                pass  # telemetry must never break the billing pipeline
+
+
+def _write_json(path: str, values: dict) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as fh:
+        json.dump(values, fh)
+    os.replace(tmp, path)
+
+
+_store = _Store()
+
+
+def _flush_at_exit():
+    if _store.pid == os.getpid():
+        _store.flush(force=True)
+
+
+atexit.register(_flush_at_exit)
+
+
+def _label_key(labelnames, labels) -> tuple:
+    if set(labels) != set(labelnames):
+        raise ValueError(f'Expected labels {labelnames}, got {sorted(labels)}')
+    return tuple((name, str(labels[name])) for name in labelnames)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = (self.name, _label_key(self.labelnames, labels))
+        with _store.lock:
+            _store.check_fork()
+            _store.counters[key] = _store.counters.get(key, 0.0) + amount
+            _store.changed()
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels):
+        key = (self.name, _label_key(self.labelnames, labels))
+        with _store.lock:
+            _store.check_fork()
+            row = _store.histograms.get(key)
+            if row is None:
+                row = _store.histograms[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+                    break
+            row[-2] += value
+            row[-1] += 1
+            _store.changed()
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+
+REGISTRY = []
+
+# ── Billing pipeline metrics ─────────────────────────────────────────────────
+
+EVENTS_INGESTED = Counter(
+    'billing_events_ingested_total',
+    'Usage events run through the ingest pipeline, by outcome.',
+    ['status'],
+)
+STAGE_SECONDS = Histogram(
+    'billing_pipeline_stage_seconds',
+    'Time spent per pipeline stage (consume/normalize/price/ledger/balance); '
+    'pipeline="event" for process_event, "batch" for one process_events call.',
+    ['pipeline', 'stage'],
+)
+LEDGER_WRITE_SECONDS = Histogram(
+    'billing_ledger_write_seconds',
+    'Wall time of a LedgerWriter insert (balance row lock, seq allocation, INSERT).',
+    ['mode'],
+)
+
+
+# ── Exposition ───────────────────────────────────────────────────────────────
+
+def _merge(counters: dict, histograms: dict, dump: dict) -> None:
+    for name, labels, value in dump['counters']:
+        key = (name, tuple(tuple(pair) for pair in labels))
+        counters[key] = counters.get(key, 0.0) + value
+    for name, labels, row in dump['histograms']:
+        key = (name, tuple(tuple(pair) for pair in labels))
+        acc = histograms.get(key)
+        histograms[key] = list(row) if acc is None else [a + b for a, b in zip(acc, row)]
+
+
+def _load(path: str):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _exited(values: dict) -> bool:
+    """Was this file written by a process on this host that has since exited?"""
+    if values.get('host') != socket.gethostname() or not isinstance(values.get('pid'), int):
+        return False
+    try:
+        os.kill(values['pid'], 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        pass  # alive, owned by another user
+    return False
+
+
+def _prune(directory: str, own: str) -> None:
+    """
+    Fold the files of exited processes into EXITED_FILE, then delete them.
+    EXITED_FILE lists the files it already holds, so a crash between the
+    two steps does not count them twice. Caller holds the directory lock.
+    """
+    exited_path = os.path.join(directory, EXITED_FILE)
+    exited = _load(exited_path) or {'counters': [], 'histograms': [], 'folded': []}
+    folded = [name for name in exited.get('folded', []) if os.path.exists(os.path.join(directory, name))]
+    counters, histograms = {}, {}
+    _merge(counters, histograms, exited)
+
+    gone = []
+    for path in glob.glob(os.path.join(directory, 'billing-*.json')):
+        name = os.path.basename(path)
+        if name in (own, EXITED_FILE):
+            continue
+        values = _load(path)
+        if values is None or not _exited(values):
+            continue
+        if name not in folded:
+            _merge(counters, histograms, values)
+            folded.append(name)
+        gone.append(path)
+    if not gone:
+        return
+    _write_json(exited_path, {
+        'counters':   [[n, list(l), v] for (n, l), v in counters.items()],
+        'histograms': [[n, list(l), v] for (n, l), v in histograms.items()],
+        'folded':     folded,
+    })
+    for path in gone:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def collect() -> tuple:
+    """Sum this process's live values with the files written by other processes."""
+    counters, histograms = {}, {}
+    with _store.lock:
+        _store.check_fork()
+        _merge(counters, histograms, _store.dump())
+        own = _store.filename
+    directory = _Store.directory()
+    if not directory:
+        return counters, histograms
+
+    def read_all():
+        for path in glob.glob(os.path.join(directory, 'billing-*.json')):
+            if os.path.basename(path) == own:
+                continue
+            values = _load(path)
+            if values is not None:
+                _merge(counters, histograms, values)
+
+    if fcntl is None:
+        read_all()
+        return counters, histograms
+    try:
+        os.makedirs(directory, exist_ok=True)
+        lock = open(os.path.join(directory, '.billing-metrics.lock'), 'a')
+    except OSError:
+        read_all()
+        return counters, histograms
+    with lock:
+        # Serialize scrapes so none reads a file while another folds it away
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            _prune(directory, own)
+        except OSError:
+            pass
+        read_all()
+    return counters, histograms
+
+
+def _fmt_labels(pairs) -> str:
+    if not pairs:
+        return ''
+    body = ','.join(
+        '{}="{}"'.format(k, str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for k, v in pairs
+    )
+    return '{' + body + '}'
+
+
+def _fmt_value(value) -> str:
+    return repr(float(value))
+
+
+def render() -> str:
+    counters, histograms = collect()
+    lines = []
+    for metric in REGISTRY:
+        kind = 'counter' if isinstance(metric, Counter) else 'histogram'
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {kind}')
+        if kind == 'counter':
+            for (name, labels), value in sorted(counters.items()):
+                if name == metric.name:
+                    lines.append(f'{name}{_fmt_labels(labels)} {_fmt_value(value)}')
+            continue
+        for (name, labels), row in sorted(histograms.items()):
+            if name != metric.name:
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets, row):
+                cumulative += count
+                lines.append(f'{name}_bucket{_fmt_labels(labels + (("le", repr(bound)),))} {_fmt_value(cumulative)}')
+            lines.append(f'{name}_bucket{_fmt_labels(labels + (("le", "+Inf"),))} {_fmt_value(row[-1])}')
+            lines.append(f'{name}_sum{_fmt_labels(labels)} {_fmt_value(row[-2])}')
+            lines.append(f'{name}_count{_fmt_labels(labels)} {_fmt_value(row[-1])}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset() -> None:
+    """Drop this process's values (tests)."""
+    with _store.lock:
+        _store._reset()
@@ -14,9 +14,12 @@ Run:
 
 import uuid
 from decimal import Decimal
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
-from django.test import TestCase, Client
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from django.utils import timezone as django_timezone
 
@@ -31,18 +34,22 @@ from .models import (
     PricingRule,
     UsageEvent,
 )
-from .services import process_event
+from .services import process_event, process_events
 
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Test Fixtures
 # ─────────────────────────────────────────────────────────────────────────────
 
+# Request activity is written synchronously so no flusher thread touches the test database
+@override_settings(ACTIVITY_BUFFERED_WRITES=False)
 class BillingIntegrationTestCase(TestCase):
     """Base test case with shared fixtures."""
 
     def setUp(self):
         """Create test users, organizations, and pricing rules."""
+        cache.clear()  # metrics snapshots must not leak between tests
+
         # Admin user (for API access)
         self.admin = User.objects.create_superuser(
             username='admin', email='admin@test.local', password='test'
@@ -406,3 +413,1217 @@ class BillingIntegrationTestCase(TestCase):
         self.assertGreaterEqual(data['event_pipeline']['total'], 3)
         self.assertGreaterEqual(data['event_pipeline']['processed'], 3)
 
+    # ──────────────────────────────────────────────────────────────────────
+    # Test Group 7: Bulk Ingest (§3.2 async SDK batches)
+    # ──────────────────────────────────────────────────────────────────────
+
+    def _event(self, **overrides):
+        payload = {
+            'event_id': str(uuid.uuid4()),
+            'service': 'compute',
+            'event_type': 'vm.running',
+            'units': 1.0,
+            'unit_type': 'vm_hour',
+            'organization_id': str(self.org.id),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+        }
+        payload.update(overrides)
+        return payload
+
+    def test_batch_ingest_returns_per_event_results(self):
+        """Test: POST /events/ingest/batch/ processes a mixed batch in order."""
+        dup_id = str(uuid.uuid4())
+        events = [
+            self._event(event_id=dup_id),
+            self._event(event_id=dup_id),                      # in-batch duplicate
+            self._event(organization_id=str(uuid.uuid4())),    # unknown org
+            self._event(units='not_a_number'),                 # invalid
+            self._event(organization_id='test-corp', service='storage', unit_type='gb', units=10),
+        ]
+
+        response = self.client.post('/api/billing/events/ingest/batch/', {'events': events}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        data = response.data
+        self.assertEqual(data['received'], 5)
+        self.assertEqual(
+            [r['status'] for r in data['results']],
+            ['processed', 'duplicate', 'rejected', 'invalid', 'processed'],
+        )
+        self.assertEqual([r['index'] for r in data['results']], [0, 1, 2, 3, 4])
+        self.assertEqual(data['processed'], 2)
+        self.assertEqual(LedgerEntry.objects.filter(reference=dup_id).count(), 1)
+        self.assertEqual(self.org.balance.total_charges, Decimal('1.73'))
+
+    def test_batch_ingest_deduplicates_against_existing_events(self):
+        """Test: Replaying a batch creates no new events or ledger entries."""
+        events = [self._event() for _ in range(3)]
+        self.client.post('/api/billing/events/ingest/batch/', {'events': events}, format='json')
+        response = self.client.post('/api/billing/events/ingest/batch/', {'events': events}, format='json')
+
+        self.assertEqual(response.data['duplicate'], 3)
+        self.assertEqual(UsageEvent.objects.count(), 3)
+        self.assertEqual(LedgerEntry.objects.filter(entry_type='charge').count(), 3)
+
+    def test_batch_ingest_rejects_empty_and_oversized_batches(self):
+        """Test: Malformed or oversized batches are refused outright."""
+        response = self.client.post('/api/billing/events/ingest/batch/', {'events': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        with self.settings(BILLING_INGEST_BATCH_MAX=2):
+            events = [self._event() for _ in range(3)]
+            response = self.client.post('/api/billing/events/ingest/batch/', {'events': events}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(UsageEvent.objects.exists())
+
+    def test_batch_pipeline_query_count_is_constant(self):
+        """Test: process_events() cost does not grow with batch size."""
+        other = Organization.objects.create(name='Other Corp', slug='other-corp')
+
+        def batch(n):
+            return [
+                self._event(organization_id=str(org.id))
+                for _ in range(n) for org in (self.org, other)
+            ]
+
+        from .sequences import ledger_seq
+
+        process_events(batch(1))  # first batch also creates the OrgBalance rows
+        # Start each capture with an empty seq block so both fetch exactly one.
+        ledger_seq.reset()
+        with CaptureQueriesContext(connection) as small:
+            process_events(batch(5))
+        ledger_seq.reset()
+        with CaptureQueriesContext(connection) as large:
+            process_events(batch(250))
+
+        # INSERTs are chunked by the backend's bind-parameter limit; every
+        # other statement runs once per batch regardless of its size.
+        def non_inserts(ctx):
+            return [q for q in ctx.captured_queries if not q['sql'].startswith('INSERT')]
+
+        self.assertEqual(len(non_inserts(large)), len(non_inserts(small)))
+        self.assertLessEqual(len(large), 41)   # includes the per-batch pricing version check
+        self.assertEqual(UsageEvent.objects.count(), 512)
+
+    def test_batch_pipeline_running_balance_and_seq(self):
+        """Test: Bulk ledger writes keep seq unique and running balances chained."""
+        process_event(self._event(), source_ip='127.0.0.1')
+        process_events([self._event() for _ in range(3)])
+
+        entries = list(LedgerEntry.objects.filter(organization=self.org).order_by('seq'))
+        seqs = [e.seq for e in entries]
+        self.assertEqual(len(set(seqs)), 4)
+        self.assertEqual(seqs, sorted(seqs))
+        self.assertEqual(
+            [e.running_balance for e in entries],
+            [Decimal('1.23'), Decimal('2.46'), Decimal('3.69'), Decimal('4.92')],
+        )
+        self.org.balance.refresh_from_db()
+        self.assertEqual(self.org.balance.outstanding, Decimal('4.92'))
+
+    def test_sequence_allocator_reserves_blocks(self):
+        """Test: The allocator hands out unique values in blocks, one round-trip per block."""
+        from unittest import mock
+        from .models import BillingSequence
+        from .sequences import SequenceAllocator
+
+        alloc = SequenceAllocator('test_seq', 'test_seq', block_size=10)
+        # TestCase runs in a transaction; blocks are cached outside one (and always on PostgreSQL)
+        with mock.patch.object(SequenceAllocator, '_cacheable', return_value=True):
+            values = alloc.take(5)
+            with CaptureQueriesContext(connection) as ctx:
+                values += [alloc.next() for _ in range(5)]
+            self.assertEqual(len(ctx.captured_queries), 0)  # served from the cached block
+            values += alloc.take(3)
+        self.assertEqual(len(set(values)), 13)
+        self.assertEqual(values, sorted(values))
+
+        if connection.vendor == 'postgresql':
+            return
+        # Inside a transaction the counter row only advances by what is taken
+        alloc.reset()
+        reserved = BillingSequence.objects.get(name='test_seq').next_value
+        self.assertEqual(alloc.take(4), list(range(reserved, reserved + 4)))
+        self.assertEqual(BillingSequence.objects.get(name='test_seq').next_value, reserved + 4)
+
+    def test_sequence_allocator_floors_at_live_maximum(self):
+        """Test: A stale counter row never reissues a seq already in the ledger."""
+        from .models import BillingSequence
+        from .sequences import ledger_seq
+
+        ledger_seq.reset()
+        LedgerEntry.objects.create(
+            seq=500, organization=self.org, entry_type='charge',
+            amount=Decimal('1.00'), running_balance=Decimal('1.00'),
+        )
+        BillingSequence.objects.update_or_create(name=ledger_seq.name, defaults={'next_value': 1})
+        event = process_event(self._event(), source_ip='127.0.0.1')
+        self.assertGreater(event.ledger_entries.get().seq, 500)
+
+    def test_sequence_allocator_discards_rolled_back_block(self):
+        """Test: Values reserved inside a rolled-back transaction are not reused."""
+        from django.db import transaction
+        from .sequences import SequenceAllocator
+
+        alloc = SequenceAllocator('rollback_seq', 'rollback_seq', block_size=10)
+        try:
+            with transaction.atomic():
+                first = alloc.next()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        # Counter row rolled back → nothing beyond `first` was cached to be reused.
+        self.assertEqual(alloc.next(), first)
+        self.assertEqual(alloc.next(), first + 1)
+
+    def test_ledger_writes_serialize_on_org_balance(self):
+        """Test: Running balances derive from the locked OrgBalance.ledger_balance."""
+        from .services import BalanceEngine, LedgerWriter
+
+        LedgerWriter.write_charge(self.org, Decimal('10.00'), note='a')
+        LedgerWriter.write_payment(self.org, Decimal('4.00'), note='b')
+        entry = LedgerWriter.write_charge(self.org, Decimal('1.50'), note='c')
+        self.assertEqual(entry.running_balance, Decimal('7.50'))
+        self.org.balance.refresh_from_db()
+        self.assertEqual(self.org.balance.ledger_balance, Decimal('7.50'))
+        self.assertEqual(BalanceEngine.verify(), [])
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Test Group 8: Incremental balances (§3.3 Layer 3)
+    # ──────────────────────────────────────────────────────────────────────
+
+    def test_incremental_balance_matches_full_recompute(self):
+        """Test: Delta-maintained OrgBalance equals a full ledger re-aggregation."""
+        from .services import BalanceEngine, InvoiceGenerator, LedgerWriter
+
+        process_events([self._event() for _ in range(4)])
+        process_event(self._event(service='storage', unit_type='gb', units=20), source_ip='127.0.0.1')
+        LedgerWriter.write_credit(self.org, Decimal('1.00'), credit_type='promo')
+        invoice = Invoice.objects.create(invoice_number='INV-1', organization=self.org,
+                                         period_start='2026-01-01', period_end='2026-01-31', total=Decimal('5'))
+        InvoiceGenerator.record_payment(invoice, Decimal('2.50'))
+
+        balance = self.org.balance
+        balance.refresh_from_db()
+        self.assertEqual(balance.total_charges, Decimal('5.92'))
+        self.assertEqual(balance.total_payments, Decimal('2.50'))
+        self.assertEqual(balance.total_credits, Decimal('1.00'))
+        self.assertEqual(balance.outstanding, Decimal('2.42'))
+        self.assertEqual(BalanceEngine.verify(), [])
+
+    def test_incremental_balance_write_cost_is_constant(self):
+        """Test: A ledger write does not re-aggregate the org's history."""
+        from .services import LedgerWriter
+
+        process_events([self._event() for _ in range(50)])
+        with CaptureQueriesContext(connection) as ctx:
+            LedgerWriter.write_charge(self.org, Decimal('1.00'), service='compute')
+        self.assertFalse(any('SUM(' in q['sql'] for q in ctx.captured_queries))
+
+    def test_verify_balances_command_reports_and_repairs_drift(self):
+        """Test: billing_verify_balances detects drift and --repair fixes it."""
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import OrgBalance
+        from .services import BalanceEngine
+
+        process_events([self._event() for _ in range(2)])
+        OrgBalance.objects.filter(organization=self.org).update(outstanding=Decimal('99.00'))
+
+        out = StringIO()
+        call_command('billing_verify_balances', stdout=out)
+        self.assertIn('1 organization(s) drifting', out.getvalue())
+        self.assertEqual(len(BalanceEngine.verify()), 1)
+
+        call_command('billing_verify_balances', '--repair', stdout=StringIO())
+        self.assertEqual(BalanceEngine.verify(), [])
+        self.assertTrue(BillingAuditLog.objects.filter(action='BALANCE_REPAIR').exists())
+
+    def test_recompute_balance_mode(self):
+        """Test: BILLING_BALANCE_MODE='recompute' keeps the full re-aggregation path."""
+        from .services import BalanceEngine
+
+        with self.settings(BILLING_BALANCE_MODE='recompute'):
+            process_events([self._event() for _ in range(3)])
+            process_event(self._event(), source_ip='127.0.0.1')
+        self.assertEqual(self.org.balance.outstanding, Decimal('4.92'))
+        self.assertEqual(BalanceEngine.verify(), [])
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Test Group 9: Pricing rule cache
+    # ──────────────────────────────────────────────────────────────────────
+
+    def test_pricing_cache_serves_lookups_without_queries(self):
+        """Test: After the first lookup, active rules are resolved from memory."""
+        from django.test import override_settings
+        from .services import CostCalculator
+
+        self.assertEqual(CostCalculator.get_active_rule('compute', 'vm_hour'), self.compute_rule)
+        with override_settings(BILLING_PRICING_VERSION_CHECK_INTERVAL=3600), \
+                CaptureQueriesContext(connection) as ctx:
+            for _ in range(10):
+                CostCalculator.calculate('compute', 'vm_hour', Decimal('2'))
+                CostCalculator.get_active_rule('storage', 'gb')
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_pricing_cache_invalidated_by_rule_changes(self):
+        """Test: Saving a rule, or a version bump from another process, refreshes the snapshot."""
+        from django.test import override_settings
+        from .pricing import bump_version, pricing_cache
+        from .services import CostCalculator
+
+        CostCalculator.get_active_rule('compute', 'vm_hour')
+        v2 = PricingRule.objects.create(
+            service='compute', unit_type='vm_hour', unit_price=Decimal('2.00'), version=2,
+        )
+        self.assertEqual(CostCalculator.get_active_rule('compute', 'vm_hour'), v2)
+
+        # Another process edited a rule: only the version row in the database changes here.
+        with override_settings(BILLING_PRICING_VERSION_CHECK_INTERVAL=3600):
+            PricingRule.objects.filter(pk=v2.pk).update(is_active=False)
+            bump_version()
+            self.assertEqual(CostCalculator.get_active_rule('compute', 'vm_hour'), v2)
+            with CaptureQueriesContext(connection) as ctx:
+                process_events([self._event(), self._event()])
+            self.assertEqual(len([q for q in ctx.captured_queries if 'billing_billingsequence' in q['sql']
+                                  and 'pricing_rules_version' in q['sql']]), 1)
+            self.assertEqual(CostCalculator.get_active_rule('compute', 'vm_hour'), self.compute_rule)
+        self.assertEqual(pricing_cache.snapshot(verify=True)[('compute', 'vm_hour')].at(django_timezone.now()),
+                         self.compute_rule)
+
+    def test_pricing_cache_honours_effective_window(self):
+        """Test: Rules outside their effective_from / effective_to window are skipped."""
+        from .services import CostCalculator
+
+        now = datetime.now(timezone.utc)
+        PricingRule.objects.create(
+            service='compute', unit_type='vm_hour', unit_price=Decimal('9.00'), version=2,
+            effective_from=now + timedelta(days=1),
+        )
+        PricingRule.objects.create(
+            service='compute', unit_type='vm_hour', unit_price=Decimal('8.00'), version=3,
+            effective_from=now - timedelta(days=10), effective_to=now - timedelta(days=1),
+        )
+        self.assertEqual(CostCalculator.get_active_rule('compute', 'vm_hour'), self.compute_rule)
+
+    def test_pricing_timeline_resolves_overlapping_windows(self):
+        """Test: The highest version covering an instant wins; gaps are unpriced."""
+        from .pricing import RuleTimeline
+
+        t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        v1 = PricingRule(version=1, unit_price=Decimal('1'), effective_from=t0, effective_to=t0 + timedelta(days=30))
+        v2 = PricingRule(version=2, unit_price=Decimal('2'), effective_from=t0 + timedelta(days=10), effective_to=t0 + timedelta(days=20))
+        v3 = PricingRule(version=3, unit_price=Decimal('3'), effective_from=t0 + timedelta(days=40))
+        timeline = RuleTimeline([v3, v1, v2])
+
+        self.assertIsNone(timeline.at(t0 - timedelta(seconds=1)))
+        self.assertIs(timeline.at(t0), v1)
+        self.assertIs(timeline.at(t0 + timedelta(days=15)), v2)
+        self.assertIs(timeline.at(t0 + timedelta(days=20)), v1)
+        self.assertIsNone(timeline.at(t0 + timedelta(days=35)))
+        self.assertIs(timeline.at(t0 + timedelta(days=400)), v3)
+
+    def test_late_events_priced_at_event_timestamp(self):
+        """Test: Replayed / backfilled events use the rate in effect when they happened."""
+        now = datetime.now(timezone.utc)
+        PricingRule.objects.filter(pk=self.compute_rule.pk).update(
+            effective_from=now - timedelta(days=60), effective_to=now - timedelta(days=30),
+        )
+        PricingRule.objects.create(
+            service='compute', unit_type='vm_hour', unit_price=Decimal('2.00'), version=2,
+            effective_from=now - timedelta(days=30),
+        )
+        late = (now - timedelta(days=45)).isoformat()
+
+        single = process_event(self._event(timestamp=late), source_ip='127.0.0.1')
+        self.assertEqual(single.total_cost, Decimal('1.23'))
+
+        results = process_events([self._event(timestamp=late), self._event()])
+        self.assertEqual([r['total_cost'] for r in results], ['1.23', '2.00'])
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Test Group 10: Async ingest queue
+    # ──────────────────────────────────────────────────────────────────────
+
+    def test_async_ingest_stages_and_worker_drains(self):
+        """Test: Async mode returns 202 without pipeline work; the worker prices the backlog."""
+        from io import StringIO
+        from django.core.management import call_command
+        from django.test import override_settings
+        from .models import IngestQueueItem
+        from .services import ingest_queue_stats
+
+        # The rule must not start within the same millisecond as the events
+        PricingRule.objects.filter(pk=self.compute_rule.pk).update(
+            effective_from=datetime.now(timezone.utc) - timedelta(hours=1),
+        )
+        dup = self._event(timestamp='2099-01-01T00:00:00.123456+00:00')
+        with override_settings(BILLING_INGEST_MODE='async'):
+            single = self.client.post('/api/billing/events/ingest/', dup, format='json')
+            batch = self.client.post(
+                '/api/billing/events/ingest/batch/',
+                {'events': [self._event(), dup, {'event_id': 'bad'}]}, format='json',
+            )
+        self.assertEqual(single.status_code, 202)
+        self.assertEqual(single.data['status'], 'pending')
+        self.assertEqual(batch.status_code, 202)
+        self.assertEqual([r['status'] for r in batch.data['results']], ['pending', 'pending', 'invalid'])
+        self.assertFalse(UsageEvent.objects.exists())
+        self.assertFalse(LedgerEntry.objects.exists())
+
+        stats = ingest_queue_stats()
+        self.assertEqual(stats['depth'], 3)
+        self.assertGreaterEqual(stats['lag_seconds'], 0)
+        self.assertEqual(self.client.get('/api/billing/metrics/').data['event_pipeline']['pending'], 3)
+
+        out = StringIO()
+        call_command('billing_ingest_worker', '--once', '--batch-size', '2', stdout=out)
+        self.assertIn('processed=2', out.getvalue())
+        self.assertIn('duplicate=1', out.getvalue())
+        self.assertFalse(IngestQueueItem.objects.exists())
+        self.org.balance.refresh_from_db()
+        self.assertEqual(self.org.balance.total_charges, Decimal('2.46'))
+        staged = UsageEvent.objects.get(event_id=dup['event_id'])
+        self.assertEqual(staged.event_timestamp, datetime(2099, 1, 1, 0, 0, 0, 123456, tzinfo=timezone.utc))
+
+    def test_ingest_queue_isolates_failing_payloads(self):
+        """Test: A payload that breaks the pipeline is retried, then parked as failed."""
+        from unittest import mock
+        from django.test import override_settings
+        from . import services
+        from .models import IngestQueueItem
+
+        poison = self._event(event_type='poison')
+        real = services.process_events
+
+        def flaky(payloads, source_ip=None):
+            if any(p['event_type'] == 'poison' for p in payloads):
+                raise RuntimeError('pipeline exploded')
+            return real(payloads, source_ip=source_ip)
+
+        services.enqueue_events([self._event(), poison], source_ip='127.0.0.1')
+        with override_settings(BILLING_INGEST_MAX_ATTEMPTS=2), \
+                mock.patch.object(services, 'process_events', side_effect=flaky), \
+                self.assertLogs('billing', level='ERROR'):
+            first = services.drain_ingest_queue()
+            second = services.drain_ingest_queue()
+        self.assertEqual((first['processed'], first['failed']), (1, 0))
+        self.assertEqual((second['claimed'], second['failed']), (1, 1))
+        item = IngestQueueItem.objects.get()
+        self.assertEqual((item.status, item.attempts), ('failed', 2))
+        self.assertIn('pipeline exploded', item.last_error)
+        self.assertEqual(services.drain_ingest_queue()['claimed'], 0)
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Test Group 11: Usage rollups
+    # ──────────────────────────────────────────────────────────────────────
+
+    def test_rollups_maintained_by_pipeline(self):
+        """Test: Processed events are folded into hourly and daily rollups."""
+        from .models import UsageRollup
+
+        process_event(self._event(user_id=self.user.pk), source_ip='127.0.0.1')
+        process_events([self._event(user_id=self.user.pk), self._event(units=2.0), self._event(organization_id='nope')])
+
+        daily = UsageRollup.objects.filter(granularity='day')
+        self.assertEqual(UsageRollup.objects.filter(granularity='hour').count(), daily.count())
+        by_user = {r.user_key: r for r in daily}
+        self.assertEqual(by_user[self.user.pk].event_count, 2)
+        self.assertEqual(by_user[self.user.pk].total_cost, Decimal('2.46'))
+        self.assertEqual(by_user[0].total_units, Decimal('2'))
+
+    def test_dashboards_read_rollups(self):
+        """Test: Usage dashboards aggregate rollups, not raw events."""
+        process_events([self._event(user_id=self.user.pk) for _ in range(3)])
+
+        with CaptureQueriesContext(connection) as ctx:
+            org = self.client.get(f'/api/billing/organizations/{self.org.id}/usage/')
+            svc = self.client.get('/api/billing/services/compute/usage/')
+            user = self.client.get(f'/api/billing/users/{self.user.pk}/usage/')
+            bill = self.client.get('/api/billing/services/compute/billing/')
+        self.assertEqual(org.data[0]['count'], 3)
+        self.assertEqual(Decimal(svc.data['mtd_cost']), Decimal('3.69'))
+        self.assertEqual(user.data['timeline'][0]['event_count'], 3)
+        self.assertEqual(bill.data['monthly_trend'][0]['event_count'], 3)
+        aggregates = [q['sql'] for q in ctx.captured_queries if 'SUM(' in q['sql']]
+        self.assertTrue(aggregates)
+        self.assertFalse([sql for sql in aggregates if 'billing_usageevent' in sql])
+
+    def test_rollup_backfill_rebuilds_from_events(self):
+        """Test: billing_rollup_backfill reproduces the incrementally maintained rollups."""
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import UsageRollup
+
+        process_events([self._event(user_id=self.user.pk), self._event(units=3.0)])
+        snapshot = sorted(UsageRollup.objects.values_list(
+            'granularity', 'bucket', 'user_key', 'event_count', 'total_units', 'total_cost'))
+
+        UsageRollup.objects.update(event_count=0)
+        call_command('billing_rollup_backfill', stdout=StringIO())
+        rebuilt = sorted(UsageRollup.objects.values_list(
+            'granularity', 'bucket', 'user_key', 'event_count', 'total_units', 'total_cost'))
+        self.assertEqual(rebuilt, snapshot)
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Test Group 12: Metrics snapshot
+    # ──────────────────────────────────────────────────────────────────────
+
+    def test_metrics_use_one_query_per_table(self):
+        """Test: Billing metrics are computed with a handful of conditional aggregates."""
+        from .views import BillingMetricsView
+
+        process_events([self._event(), self._event(organization_id='nope')])
+        with CaptureQueriesContext(connection) as ctx:
+            data = BillingMetricsView.compute(django_timezone.now())
+        self.assertLessEqual(len(ctx.captured_queries), 10)
+        self.assertEqual(data['event_pipeline']['processed'], 1)
+        self.assertEqual(data['event_pipeline']['rejected'], 1)
+        self.assertEqual(data['ledger']['writes_today'], 1)
+
+    def test_metrics_snapshot_cached_with_fresh_bypass(self):
+        """Test: Polls within the TTL reuse the snapshot; ?fresh=1 recomputes."""
+        from unittest import mock
+        from .views import BillingMetricsView
+
+        first = self.client.get('/api/billing/metrics/')
+        process_event(self._event(), source_ip='127.0.0.1')
+
+        cached = self.client.get('/api/billing/metrics/')
+        self.assertEqual(cached.data['as_of'], first.data['as_of'])
+        self.assertEqual(cached.data['event_pipeline']['processed'], 0)
+
+        fresh = self.client.get('/api/billing/metrics/?fresh=1')
+        self.assertEqual(fresh.data['event_pipeline']['processed'], 1)
+
+        # Past the TTL the stale snapshot is served and a single refresh is scheduled.
+        snapshot = cache.get(BillingMetricsView.CACHE_KEY)
+        snapshot['computed_at'] -= timedelta(seconds=30)
+        cache.set(BillingMetricsView.CACHE_KEY, snapshot)
+        with mock.patch('billing.views.threading.Thread') as thread:
+            stale = self.client.get('/api/billing/metrics/')
+            self.client.get('/api/billing/metrics/')
+        self.assertEqual(stale.data['as_of'], fresh.data['as_of'])
+        self.assertGreaterEqual(stale.data['snapshot_age_seconds'], 30)
+        self.assertEqual(thread.call_count, 1)
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Test Group 13: Prometheus exposition
+    # ──────────────────────────────────────────────────────────────────────
+
+    def test_prometheus_counters_and_stage_histograms(self):
+        """Test: Pipeline outcomes and per-stage latencies are exposed on /metrics."""
+        from django.test import override_settings
+        from . import telemetry
+
+        telemetry.reset()
+        dup = self._event()
+        process_event(dup, source_ip='127.0.0.1')
+        process_event(dup, source_ip='127.0.0.1')
+        process_events([self._event(), self._event(organization_id='nope')])
+
+        self.assertEqual(self.client.get('/metrics').status_code, 403)  # APIClient auth is DRF-only
+        with override_settings(BILLING_METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer nope').status_code, 403)
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+        body = response.content.decode()
+        self.assertIn('# TYPE billing_events_ingested_total counter', body)
+        self.assertIn('billing_events_ingested_total{status="processed"} 2.0', body)
+        self.assertIn('billing_events_ingested_total{status="duplicate"} 1.0', body)
+        self.assertIn('billing_events_ingested_total{status="rejected"} 1.0', body)
+        self.assertIn('billing_pipeline_stage_seconds_count{pipeline="event",stage="consume"} 2.0', body)
+        for stage in ('consume', 'normalize', 'price', 'ledger', 'balance'):
+            if stage != 'consume':  # the duplicate stops after consume
+                self.assertIn(f'billing_pipeline_stage_seconds_count{{pipeline="event",stage="{stage}"}} 1.0', body)
+            self.assertIn(f'billing_pipeline_stage_seconds_count{{pipeline="batch",stage="{stage}"}} 1.0', body)
+        self.assertIn('billing_ledger_write_seconds_bucket{mode="single",le="+Inf"} 1.0', body)
+
+    def test_prometheus_aggregates_worker_processes(self):
+        """Test: Values persisted by other worker processes are summed into the exposition."""
+        import json
+        import os
+        import tempfile
+        from django.test import override_settings
+        from . import telemetry
+
+        telemetry.reset()
+        with tempfile.TemporaryDirectory() as directory, override_settings(BILLING_METRICS_DIR=directory):
+            with open(os.path.join(directory, 'billing-999999.json'), 'w') as fh:
+                json.dump({
+                    'counters': [['billing_events_ingested_total', [['status', 'processed']], 5.0]],
+                    'histograms': [],
+                }, fh)
+            telemetry.EVENTS_INGESTED.inc(2, status='processed')
+            self.assertNotIn(telemetry._store.filename, os.listdir(directory))  # no I/O in inc()
+            self.assertTrue(telemetry._store._thread.is_alive())
+            telemetry._store.flush()  # what the flusher thread does every interval
+            body = telemetry.render()
+            self.assertIn(telemetry._store.filename, os.listdir(directory))
+        self.assertIn('billing_events_ingested_total{status="processed"} 7.0', body)
+
+    def test_prometheus_flusher_writes_an_idle_workers_values(self):
+        """Test: A worker that goes quiet still gets its last increments onto disk."""
+        import json
+        import os
+        import tempfile
+        import time
+        from django.test import override_settings
+        from . import telemetry
+
+        telemetry.reset()
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(BILLING_METRICS_DIR=directory, BILLING_METRICS_FLUSH_INTERVAL=0.05):
+            telemetry.EVENTS_INGESTED.inc(3, status='processed')
+            path = os.path.join(directory, telemetry._store.filename)
+            deadline = time.monotonic() + 5
+            while not os.path.exists(path) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            with open(path) as fh:
+                counters = json.load(fh)['counters']
+            telemetry.reset()  # retire the flusher before the directory goes away
+        self.assertEqual(counters, [['billing_events_ingested_total', [['status', 'processed']], 3.0]])
+
+    def test_prometheus_folds_exited_processes_and_writes_outside_the_lock(self):
+        """Test: An exited worker's file is folded into billing-exited.json; totals stay put."""
+        import json
+        import os
+        import socket
+        import subprocess
+        import sys
+        import tempfile
+        from unittest import mock
+        from django.test import override_settings
+        from . import telemetry
+
+        exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+        exited.wait()
+        real_dump = json.dump
+
+        def dump_outside_lock(values, fh):
+            self.assertFalse(telemetry._store.lock.locked())
+            real_dump(values, fh)
+
+        telemetry.reset()
+        with tempfile.TemporaryDirectory() as directory, override_settings(BILLING_METRICS_DIR=directory):
+            with open(os.path.join(directory, f'billing-{exited.pid}-feedface.json'), 'w') as fh:
+                json.dump({
+                    'host': socket.gethostname(), 'pid': exited.pid,
+                    'counters': [['billing_events_ingested_total', [['status', 'processed']], 5.0]],
+                    'histograms': [],
+                }, fh)
+            telemetry.EVENTS_INGESTED.inc(2, status='processed')
+            with mock.patch.object(telemetry.json, 'dump', side_effect=dump_outside_lock) as dump:
+                telemetry._store.flush()
+            self.assertTrue(dump.called)
+
+            first, second = telemetry.render(), telemetry.render()
+            files = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+        self.assertEqual(files, sorted([telemetry._store.filename, telemetry.EXITED_FILE]))
+        for body in (first, second):
+            self.assertIn('billing_events_ingested_total{status="processed"} 7.0', body)
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Test Group 14: Idempotency front (LRU + Bloom filter)
+    # ──────────────────────────────────────────────────────────────────────
+
+    def test_new_event_ids_skip_the_lookup(self):
+        """Test: Unseen ids go straight to INSERT; committed ids are duplicates without a query."""
+        from .idempotency import idempotency
+
+        idempotency.reset()
+        batch = [self._event() for _ in range(3)]
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            results = process_events(batch)
+        self.assertEqual([r['status'] for r in results], ['processed'] * 3)
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('SELECT') and '"event_id" IN' in q['sql']])
+
+        with CaptureQueriesContext(connection) as ctx:
+            results = process_events(batch)
+        self.assertEqual([r['status'] for r in results], ['duplicate'] * 3)
+        self.assertFalse([q for q in ctx.captured_queries if '"event_id"' in q['sql']])
+
+    def test_unique_index_catches_ids_the_front_missed(self):
+        """Test: Ids inserted by another process (or before a restart) are still duplicates."""
+        from .idempotency import idempotency
+
+        old = self._event()
+        process_event(old, source_ip='127.0.0.1')
+        idempotency.reset()  # as if a different process had ingested `old`
+        self.assertEqual(process_event(old, source_ip='127.0.0.1').status, 'duplicate')
+
+        idempotency.reset()
+        results = process_events([old, self._event()])
+        self.assertEqual([r['status'] for r in results], ['duplicate', 'processed'])
+        self.assertEqual(UsageEvent.objects.count(), 2)
+        self.assertEqual(LedgerEntry.objects.count(), 2)
+
+    def test_rotating_bloom_filter(self):
+        """Test: No false negatives within the window; old generations rotate out."""
+        from unittest import mock
+        from .idempotency import RotatingBloomFilter
+
+        with mock.patch('billing.idempotency.time.monotonic', return_value=0.0) as clock:
+            bloom = RotatingBloomFilter(capacity=1000, generations=2, window=20)
+            keys = [uuid.uuid4().int for _ in range(1000)]
+            for key in keys:
+                bloom.add(key)
+            self.assertTrue(all(key in bloom for key in keys))
+            self.assertLess(sum(uuid.uuid4().int in bloom for _ in range(1000)), 50)
+
+            clock.return_value = 10.0
+            bloom.add(uuid.uuid4().int)       # opens the second generation
+            self.assertIn(keys[0], bloom)
+            clock.return_value = 20.0
+            bloom.add(uuid.uuid4().int)       # first generation rotates out
+            self.assertNotIn(keys[0], bloom)
+
+    def test_duplicates_are_counted_without_rewriting_the_event(self):
+        """Test: Redeliveries leave the original row alone and are flushed to DuplicateEventCount."""
+        from django.test import override_settings
+        from .idempotency import duplicate_log
+        from .models import DuplicateEventCount
+        from .views import BillingMetricsView
+
+        duplicate_log._reset()
+        payload = self._event()
+        original = process_event(payload, source_ip='127.0.0.1')
+
+        with override_settings(BILLING_DEDUP_FLUSH_INTERVAL=3600, BILLING_DEDUP_FLUSH_ROWS=1000):
+            with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(process_event(payload, source_ip='127.0.0.1').status, 'duplicate')
+                process_events([payload, payload])
+            self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')])
+            self.assertEqual(duplicate_log.pending(), 3)
+            self.assertFalse(DuplicateEventCount.objects.exists())
+
+        original.refresh_from_db()
+        self.assertEqual(original.status, 'processed')
+
+        self.assertEqual(duplicate_log.flush(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            process_events([payload])
+        duplicate_log.flush()
+        counter = DuplicateEventCount.objects.get(event_id=original.event_id)
+        self.assertEqual(counter.count, 4)
+        self.assertLessEqual(counter.first_seen_at, counter.last_seen_at)
+        pipeline = BillingMetricsView.compute(django_timezone.now())['event_pipeline']
+        self.assertEqual((pipeline['processed'], pipeline['duplicate']), (1, 4))
+
+    def test_idle_duplicate_counts_are_flushed_by_the_background_thread(self):
+        """Test: Pending duplicate counts reach the database without another duplicate arriving."""
+        import threading
+        from unittest import mock
+        from django.test import override_settings
+        from .idempotency import DuplicateLog
+
+        dup_log = DuplicateLog()
+        flushed = threading.Event()
+        with override_settings(BILLING_DEDUP_FLUSH_INTERVAL=0.01), \
+                mock.patch.object(DuplicateLog, '_upsert', side_effect=lambda pending: flushed.set()):
+            dup_log._add([uuid.uuid4()], django_timezone.now())
+            self.assertTrue(flushed.wait(5))
+        self.assertEqual(dup_log.pending(), 0)
+        dup_log._reset()  # retires the flusher thread
+
+    def test_retention_reports_and_audits_expired_duplicate_counters(self):
+        """Test: Expired DuplicateEventCount rows are counted in the report and audited when deleted."""
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import BillingAuditLog, DuplicateEventCount
+
+        old = django_timezone.now() - timedelta(days=800)
+        DuplicateEventCount.objects.create(event_id=uuid.uuid4(), count=2, first_seen_at=old, last_seen_at=old)
+        DuplicateEventCount.objects.create(
+            event_id=uuid.uuid4(), count=1, first_seen_at=old, last_seen_at=django_timezone.now(),
+        )
+
+        out = StringIO()
+        call_command('billing_retention', stdout=out)
+        self.assertIn('DupCounter   > 2 years : 1 records', out.getvalue())
+        self.assertEqual(DuplicateEventCount.objects.count(), 2)
+
+        call_command('billing_retention', '--execute', stdout=StringIO())
+        self.assertEqual(DuplicateEventCount.objects.count(), 1)
+        self.assertTrue(BillingAuditLog.objects.filter(
+            action='RETENTION_ENFORCEMENT', target__startswith='DuplicateEventCount: 1 records',
+        ).exists())
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Test Group 15: Keyset pagination & streaming exports
+    # ──────────────────────────────────────────────────────────────────────
+
+    def test_event_and_ledger_keyset_pagination(self):
+        """Test: Following next_cursor visits every row once, in key order, ties included."""
+        tie = datetime.now(timezone.utc) + timedelta(minutes=10)  # after the rules' effective_from
+        process_events(
+            [self._event(timestamp=tie.isoformat()) for _ in range(4)]
+            + [self._event(timestamp=(tie + timedelta(minutes=i)).isoformat()) for i in (-5, 5, 10)]
+        )
+
+        seen, cursor = [], ''
+        while cursor is not None:
+            response = self.client.get('/api/billing/events/', {'cursor': cursor, 'limit': 3})
+            self.assertEqual(response.status_code, 200)
+            seen.extend(row['id'] for row in response.data['results'])
+            cursor = response.data['next_cursor']
+        expected = [str(pk) for pk in UsageEvent.objects.order_by('event_timestamp', 'id').values_list('id', flat=True)]
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(seen), 7)
+
+        page = self.client.get('/api/billing/ledger/', {'cursor': '', 'limit': 4}).data
+        rest = self.client.get('/api/billing/ledger/', {'cursor': page['next_cursor'], 'limit': 4}).data
+        seqs = [row['seq'] for row in page['results'] + rest['results']]
+        self.assertEqual(seqs, sorted(LedgerEntry.objects.values_list('seq', flat=True)))
+        self.assertIsNone(rest['next_cursor'])
+
+        self.assertIsInstance(self.client.get('/api/billing/events/').data, list)  # legacy shape without ?cursor
+        self.assertEqual(self.client.get('/api/billing/events/', {'cursor': 'not-a-cursor'}).status_code, 400)
+
+    def test_streaming_exports(self):
+        """Test: Events and ledger stream as NDJSON / CSV with filters applied."""
+        import csv
+        import io
+        import json
+
+        process_events([self._event(metadata={'vm': 'a,b'}) for _ in range(3)] + [self._event(service='storage', unit_type='gb')])
+
+        response = self.client.get('/api/billing/events/export/', {'service': 'compute'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['metadata'], {'vm': 'a,b'})
+        self.assertEqual(Decimal(rows[0]['total_cost']), Decimal('1.23'))
+
+        response = self.client.get('/api/billing/ledger/export/', {'output': 'csv'})
+        self.assertIn('attachment; filename="ledger-', response['Content-Disposition'])
+        reader = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(len(reader), 4)
+        self.assertEqual([int(r['seq']) for r in reader], sorted(int(r['seq']) for r in reader))
+
+        self.assertEqual(self.client.get('/api/billing/ledger/export/', {'output': 'xml'}).status_code, 400)
+
+    def test_unparseable_time_bounds_are_rejected(self):
+        """Test: A since / until that won't parse is a 400, not an unfiltered list or a 500."""
+        process_event(self._event(), source_ip='127.0.0.1')
+        for path in ('/api/billing/events/', '/api/billing/events/export/',
+                     '/api/billing/ledger/', '/api/billing/ledger/export/'):
+            for params in ({'since': 'garbage'}, {'since': '2024-13-01'}, {'until': '2024-01-01T25:00'}):
+                response = self.client.get(path, params)
+                self.assertEqual(response.status_code, 400, (path, params))
+                name = next(iter(params))
+                self.assertEqual(response.json(), {'error': f'Invalid {name}. Use ISO-8601'})
+        self.assertEqual(self.client.get('/api/billing/events/', {'since': '2024-01-01T00:00:00Z'}).status_code, 200)
+
+    async def test_streaming_exports_are_async_under_asgi(self):
+        """Test: Over ASGI the export is an async iterator paging by keyset, not a materialised list."""
+        import json
+        from asgiref.sync import sync_to_async
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        await sync_to_async(process_events)([self._event() for _ in range(5)])
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.admin)}'}
+        with override_settings(BILLING_EXPORT_CHUNK_SIZE=2):
+            response = await self.async_client.get('/api/billing/events/export/', headers=headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.is_async)
+            body = b''.join([chunk async for chunk in response.streaming_content])
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        expected = await sync_to_async(list)(
+            UsageEvent.objects.order_by('event_timestamp', 'id').values_list('event_id', flat=True)
+        )
+        self.assertEqual([row['event_id'] for row in rows], [str(event_id) for event_id in expected])
+
+        with override_settings(BILLING_EXPORT_CHUNK_SIZE=2):
+            response = await self.async_client.get('/api/billing/ledger/export/', {'output': 'csv'}, headers=headers)
+            lines = b''.join([chunk async for chunk in response.streaming_content]).decode().splitlines()
+        self.assertEqual(len(lines), 6)   # header + one charge per event
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Test Group 16: Columnar archive of expired events
+    # ──────────────────────────────────────────────────────────────────────
+
+    def _archive_old_events(self, directory, fmt):
+        from io import StringIO
+        from django.core.management import call_command
+        from django.test import override_settings
+
+        jan = datetime.now(timezone.utc) + timedelta(days=1)
+        feb = jan + timedelta(days=40)
+        process_events(
+            [self._event(timestamp=jan.isoformat()) for _ in range(3)]
+            + [self._event(timestamp=feb.isoformat(), units=2.0)]
+            + [self._event(timestamp=feb.isoformat(), organization_id='nope')]
+        )
+        keep = process_event(self._event(), source_ip='127.0.0.1')
+        UsageEvent.objects.exclude(pk=keep.pk).update(received_at=django_timezone.now() - timedelta(days=800))
+
+        out = StringIO()
+        with override_settings(BILLING_ARCHIVE_DIR=directory, BILLING_ARCHIVE_FORMAT=fmt):
+            call_command('billing_retention', '--execute', '--archive', stdout=out)
+        self.assertEqual(list(UsageEvent.objects.values_list('pk', flat=True)), [keep.pk])
+        return jan, feb, out.getvalue()
+
+    def test_retention_archives_expired_events_before_delete(self):
+        """Test: Expired events land in per-month archive parts that can be re-aggregated."""
+        import tempfile
+        from django.test import override_settings
+        from .archive import query_archive, read_manifest
+
+        with tempfile.TemporaryDirectory() as directory:
+            jan, feb, out = self._archive_old_events(directory, 'ndjson.gz')
+            self.assertIn('[archive]', out)
+            with override_settings(BILLING_ARCHIVE_DIR=directory):
+                parts = read_manifest()['parts']
+                self.assertEqual(sorted(p['month'] for p in parts), sorted({jan.strftime('%Y-%m'), feb.strftime('%Y-%m')}))
+                self.assertEqual(sum(p['rows'] for p in parts), 5)
+
+                totals = query_archive()
+                self.assertEqual(len(totals), 1)
+                self.assertEqual(totals[0]['event_count'], 4)          # the rejected event is not summed
+                self.assertEqual(totals[0]['total_units'], Decimal('5'))
+                self.assertEqual(totals[0]['total_cost'], Decimal('6.15'))
+                by_month = query_archive(since=feb - timedelta(hours=1), group_by=('month',))
+                self.assertEqual([(r['month'], r['event_count']) for r in by_month], [(feb.strftime('%Y-%m'), 1)])
+
+    def test_archive_rerun_skips_already_archived_events(self):
+        """Test: A rerun after a failed delete archives nothing twice; late events still get archived."""
+        import os
+        import tempfile
+        from django.test import override_settings
+        from .archive import archive_usage_events, query_archive, read_manifest
+
+        jan = datetime.now(timezone.utc) + timedelta(days=1)
+        process_events([self._event(timestamp=(jan + timedelta(minutes=n)).isoformat()) for n in (0, 2)])
+        cutoff = django_timezone.now()
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(BILLING_ARCHIVE_DIR=directory, BILLING_ARCHIVE_FORMAT='ndjson.gz'):
+            self.assertEqual([p['rows'] for p in archive_usage_events(UsageEvent.objects.all(), received_before=cutoff)], [2])
+            # The delete step failed: the same events are still there on the next run
+            self.assertEqual(archive_usage_events(UsageEvent.objects.all(), received_before=cutoff), [])
+
+            # A late event inside the archived time range, received after the first run
+            process_events([self._event(timestamp=(jan + timedelta(minutes=1)).isoformat())])
+            rerun = archive_usage_events(UsageEvent.objects.all())
+            self.assertEqual([p['rows'] for p in rerun], [1])
+
+            self.assertEqual(query_archive()[0]['event_count'], 3)
+            self.assertEqual(len(read_manifest()['parts']), 2)
+            manifests = [f for f in os.listdir(os.path.join(directory, 'usage_events')) if f.startswith('manifest')]
+            self.assertEqual(sorted(manifests), ['manifest-000000000001.json', 'manifest-000000000002.json'])
+
+    def test_archive_parquet_roundtrip(self):
+        """Test: Parquet archives (pyarrow installed) re-aggregate like the NDJSON fallback."""
+        import tempfile
+        from django.test import override_settings
+        from . import archive
+
+        if archive.pq is None:
+            self.skipTest('pyarrow is not installed')
+        with tempfile.TemporaryDirectory() as directory:
+            self._archive_old_events(directory, 'parquet')
+            with override_settings(BILLING_ARCHIVE_DIR=directory):
+                totals = archive.query_archive(group_by=('service',))
+        self.assertEqual([(r['service'], r['event_count'], r['total_units']) for r in totals], [('compute', 4, Decimal('5'))])
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Test Group 17: Monthly partitioning (PostgreSQL)
+    # ──────────────────────────────────────────────────────────────────────
+
+    def test_partition_bounds_and_non_postgres_refusal(self):
+        """Test: Monthly bounds roll over years; other databases are refused cleanly."""
+        from datetime import date
+        from io import StringIO
+        from django.core.management import CommandError, call_command
+        from .partitioning import (
+            SPECS, PartitioningError, add_months, create_partition_sql, expired_partitions, is_partitioned,
+        )
+
+        spec = SPECS['usage_event']
+        self.assertEqual(add_months(date(2025, 11, 1), 3), date(2026, 2, 1))
+        self.assertEqual(add_months(date(2025, 1, 1), -1), date(2024, 12, 1))
+        sql = create_partition_sql(spec, date(2025, 12, 1))
+        self.assertIn('billing_usageevent_p202512', sql)
+        self.assertIn("FROM ('2025-12-01T00:00:00+00:00') TO ('2026-01-01T00:00:00+00:00')", sql)
+
+        if connection.vendor == 'postgresql':
+            self.skipTest('refusal path only applies to other databases')
+        self.assertFalse(is_partitioned(spec))
+        with self.assertRaises(PartitioningError):
+            expired_partitions(spec, django_timezone.now())
+        with self.assertRaisesRegex(CommandError, 'requires PostgreSQL'):
+            call_command('billing_partitions', '--ahead', '3', stdout=StringIO())
+
+    def test_partitioned_retention_keeps_late_events_and_global_event_ids(self):
+        """Test: (PostgreSQL) A month with a late delivery is not dropped; event ids stay unique across months."""
+        if connection.vendor != 'postgresql':
+            self.skipTest('partitioning requires PostgreSQL')
+        from io import StringIO
+        from django.core.management import call_command
+        from django.db import IntegrityError, transaction
+        from .partitioning import SPECS, convert_table, list_partitions, month_start, partition_name
+
+        spec = SPECS['usage_event']
+        late_month = datetime.now(timezone.utc) - timedelta(days=900)
+        old_month = late_month - timedelta(days=40)
+        dropped = process_event(self._event(timestamp=old_month.isoformat()), source_ip='127.0.0.1')
+        expired = process_event(self._event(timestamp=late_month.isoformat()), source_ip='127.0.0.1')
+        late = process_event(self._event(timestamp=late_month.isoformat()), source_ip='127.0.0.1')
+        convert_table(spec)
+        UsageEvent.objects.exclude(pk=late.pk).update(received_at=django_timezone.now() - timedelta(days=800))
+
+        # Same event_id in another month: the partitioned unique key alone would accept it
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            UsageEvent.objects.create(
+                event_id=late.event_id, organization=self.org, service='compute', event_type='vm.running',
+                units=Decimal('1'), unit_type='vm_hour', event_timestamp=django_timezone.now(),
+            )
+
+        out = StringIO()
+        call_command('billing_retention', '--execute', stdout=out)
+        self.assertEqual(list(UsageEvent.objects.values_list('pk', flat=True)), [late.pk])
+        names = {name for name, _ in list_partitions(spec)}
+        self.assertNotIn(partition_name(spec, month_start(old_month)), names)
+        self.assertIn(partition_name(spec, month_start(late_month)), names)
+        self.assertIn(f'kept partition {partition_name(spec, month_start(late_month))}', out.getvalue())
+
+        # Ids of dropped and deleted events are released with their rows
+        for event in (dropped, expired):
+            UsageEvent.objects.create(
+                event_id=event.event_id, organization=self.org, service='compute', event_type='vm.running',
+                units=Decimal('1'), unit_type='vm_hour', event_timestamp=django_timezone.now(),
+            )
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Test Group 18: Month-end billing run
+    # ──────────────────────────────────────────────────────────────────────
+
+    def _run_orgs(self):
+        return [self.org] + [
+            Organization.objects.create(name=f'Run Org {n}', slug=f'run-org-{n}', plan='pro', status='active')
+            for n in range(2)
+        ]
+
+    def test_billing_run_invoices_every_active_org_once(self):
+        """Test: billing_run invoices each active org with unique numbers; a rerun adds nothing."""
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import BillingRun, Invoice
+
+        orgs = self._run_orgs()
+        Organization.objects.create(name='Gone', slug='gone', plan='pro', status='suspended')
+        period = django_timezone.now().strftime('%Y-%m')
+
+        out = StringIO()
+        call_command('billing_run', '--period', period, stdout=out)
+        self.assertIn('completed: pending=0, done=3', out.getvalue())
+        self.assertIn('Per-org timing', out.getvalue())
+
+        invoices = Invoice.objects.all()
+        self.assertEqual(sorted(i.organization_id for i in invoices), sorted(o.pk for o in orgs))
+        numbers = [i.invoice_number for i in invoices]
+        self.assertEqual(len(set(numbers)), 3)
+        self.assertTrue(all(n.startswith('INV-') for n in numbers))
+
+        # A completed run is not resumed: a fresh run skips the already-invoiced orgs
+        call_command('billing_run', '--period', period, stdout=StringIO())
+        self.assertEqual(Invoice.objects.count(), 3)
+        latest = BillingRun.objects.first()
+        self.assertEqual(latest.items.filter(status='skipped').count(), 3)
+
+    def test_billing_run_resumes_failed_orgs(self):
+        """Test: a failed org is checkpointed and only it is invoiced on --retry-failed."""
+        from io import StringIO
+        from unittest import mock
+        from django.core.management import call_command
+        from .models import BillingRun, Invoice
+        from .services import InvoiceGenerator
+
+        orgs = self._run_orgs()
+        period = django_timezone.now().strftime('%Y-%m')
+        original = InvoiceGenerator.generate_for_period
+
+        def flaky(organization, *args, **kwargs):
+            if organization.pk == orgs[1].pk:
+                raise RuntimeError('payment gateway down')
+            return original(organization, *args, **kwargs)
+
+        with mock.patch.object(InvoiceGenerator, 'generate_for_period', side_effect=flaky):
+            call_command('billing_run', '--period', period, stdout=StringIO())
+        run = BillingRun.objects.get()
+        self.assertEqual(run.status, 'failed')
+        failed = run.items.get(status='failed')
+        self.assertEqual(failed.organization_id, orgs[1].pk)
+        self.assertIn('payment gateway down', failed.error)
+        self.assertEqual(Invoice.objects.count(), 2)
+
+        # --retry-failed reopens the same run and only the failed org is invoiced
+        call_command('billing_run', '--period', period, '--retry-failed', stdout=StringIO())
+        run.refresh_from_db()
+        self.assertEqual(run.status, 'completed')
+        self.assertEqual(BillingRun.objects.count(), 1)
+        self.assertEqual(Invoice.objects.filter(organization=orgs[1]).count(), 1)
+        self.assertEqual(Invoice.objects.count(), 3)
+        self.assertEqual(run.items.get(organization=orgs[1]).attempts, 2)
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Test Group 19: Bulk invoice assembly
+    # ──────────────────────────────────────────────────────────────────────
+
+    def test_invoice_assembly_query_count_is_constant(self):
+        """Test: Invoice queries do not grow with line items or credits; totals still add up."""
+        from .models import Credit, InvoiceLineItem
+        from .sequences import invoice_seq, ledger_seq
+        from .services import InvoiceGenerator, LedgerWriter
+
+        today = django_timezone.now().date()
+
+        def invoice_for(lines, credits):
+            org = Organization.objects.create(
+                name=f'Bulk {lines}', slug=f'bulk-{lines}', plan='pro', status='active',
+            )
+            for n in range(lines):
+                LedgerWriter.write_charge(
+                    org, Decimal('2.50'), service=f'svc{n}', unit_type='unit', units=Decimal('5'),
+                )
+            for n in range(credits):
+                Credit.objects.create(
+                    credit_number=f'CR-{lines}-{n}', organization=org, amount=Decimal('1.00'), reason='test',
+                )
+            invoice_seq.reset()
+            ledger_seq.reset()
+            with CaptureQueriesContext(connection) as ctx:
+                invoice = InvoiceGenerator.generate_for_period(org, today, today)
+            return invoice, len(ctx.captured_queries)
+
+        invoice_for(1, 0)  # warm up: sequence rows, content types, pricing snapshot
+        small, small_queries = invoice_for(2, 1)
+        large, large_queries = invoice_for(40, 12)
+
+        self.assertEqual(large_queries, small_queries)
+        self.assertEqual(large.subtotal, Decimal('100.00'))
+        self.assertEqual(large.credits_applied, Decimal('12.00'))
+        self.assertEqual(large.total, Decimal('88.00'))
+        self.assertEqual(InvoiceLineItem.objects.filter(invoice=large).count(), 40)
+        self.assertEqual(Credit.objects.filter(applied_to=large, status='applied').count(), 12)
+        self.assertEqual(small.total, Decimal('4.00'))
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Test Group 20: Ledger checkpoints & point-in-time balances
+    # ──────────────────────────────────────────────────────────────────────
+
+    def _dated_ledger(self):
+        """Charges, a payment and a credit spread over the last four months."""
+        from .services import LedgerWriter
+
+        now = django_timezone.now()
+        writes = [
+            (120, lambda: LedgerWriter.write_charge(self.org, Decimal('40.00'), service='compute', unit_type='vm_hour')),
+            (100, lambda: LedgerWriter.write_charge(self.org, Decimal('10.50'), service='storage', unit_type='gb')),
+            (70,  lambda: LedgerWriter.write_payment(self.org, Decimal('30.00'))),
+            (40,  lambda: LedgerWriter.write_credit(self.org, Decimal('5.00'))),
+            (10,  lambda: LedgerWriter.write_charge(self.org, Decimal('7.25'), service='compute', unit_type='vm_hour')),
+        ]
+        for days_ago, write in writes:
+            entry = write()
+            LedgerEntry.objects.filter(pk=entry.pk).update(created_at=now - timedelta(days=days_ago))
+        return now
+
+    def _brute_force_balance(self, when):
+        from django.db.models import Sum
+        return LedgerEntry.objects.filter(organization=self.org, created_at__lte=when).aggregate(
+            s=Sum('amount'))['s'] or Decimal('0')
+
+    def test_ledger_checkpoints_match_full_ledger_sums(self):
+        """Test: Checkpoint + tail equals a full ledger sum at any instant; reruns are incremental."""
+        from io import StringIO
+        from django.core.management import call_command
+        from .checkpoints import ledger_totals_at, write_checkpoints
+        from .models import LedgerCheckpoint
+        from .services import LedgerWriter
+
+        now = self._dated_ledger()
+        out = StringIO()
+        call_command('billing_ledger_checkpoints', '--backfill', stdout=out)
+        self.assertIn('ledger checkpoint(s)', out.getvalue())
+        self.assertGreaterEqual(LedgerCheckpoint.objects.filter(organization=self.org).count(), 4)
+        self.assertEqual(write_checkpoints(), 0)  # nothing new since the last cut-off
+
+        for days_ago in (150, 110, 95, 60, 41, 40, 20, 5, 0):
+            when = now - timedelta(days=days_ago)
+            totals = ledger_totals_at(self.org.pk, when)
+            self.assertEqual(totals['ledger_balance'], self._brute_force_balance(when), days_ago)
+
+        at = ledger_totals_at(self.org.pk, now - timedelta(days=20))
+        self.assertIsNotNone(at['checkpoint'])
+        self.assertEqual(
+            (at['total_charges'], at['total_payments'], at['total_credits'], at['outstanding']),
+            (Decimal('50.50'), Decimal('30.00'), Decimal('5.00'), Decimal('15.50')),
+        )
+        self.assertEqual(at['entry_count'], 4)
+
+        # A later entry only adds a checkpoint for the org that moved
+        other = Organization.objects.create(name='Quiet', slug='quiet', plan='pro', status='active')
+        entry = LedgerWriter.write_charge(self.org, Decimal('1.00'), service='compute', unit_type='vm_hour')
+        self.assertEqual(write_checkpoints(django_timezone.now()), 1)
+        self.assertFalse(LedgerCheckpoint.objects.filter(organization=other).exists())
+        self.assertEqual(
+            LedgerCheckpoint.objects.filter(organization=self.org).first().ledger_balance,
+            self._brute_force_balance(django_timezone.now()),
+        )
+
+    def test_org_statement_endpoint(self):
+        """Test: Statement endpoint reports opening / closing totals and movements."""
+        from .checkpoints import write_checkpoints
+
+        now = self._dated_ledger()
+        write_checkpoints(now - timedelta(days=50))
+        since = (now - timedelta(days=80)).isoformat()
+        response = self.client.get(f'/api/billing/organizations/{self.org.id}/statement/', {'since': since})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['opening']['ledger_balance'], '50.50')
+        self.assertEqual(data['closing']['ledger_balance'], str(self._brute_force_balance(now)))
+        self.assertEqual(data['movements']['total_payments'], '30.00')
+        self.assertEqual(data['movements']['entry_count'], 3)
+
+        response = self.client.get(f'/api/billing/organizations/{self.org.id}/statement/', {'since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Test Group 21: Compressed ingest bodies
+    # ──────────────────────────────────────────────────────────────────────
+
+    def test_batch_ingest_accepts_gzip_bodies(self):
+        """Test: Content-Encoding: gzip batches are inflated; corrupt or oversized bodies get 400."""
+        import gzip
+        import json
+        from django.test import override_settings
+
+        events = [self._event() for _ in range(20)]
+        body = gzip.compress(json.dumps({'events': events}).encode())
+        response = self.client.post(
+            '/api/billing/events/ingest/batch/', body,
+            content_type='application/json', HTTP_CONTENT_ENCODING='gzip',
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(UsageEvent.objects.filter(status='processed').count(), 20)
+
+        response = self.client.post(
+            '/api/billing/events/ingest/batch/', b'not gzip',
+            content_type='application/json', HTTP_CONTENT_ENCODING='gzip',
+        )
+        self.assertEqual(response.status_code, 400)
+
+        with override_settings(BILLING_INGEST_MAX_INFLATED_BYTES=1024):
+            response = self.client.post(
+                '/api/billing/events/ingest/batch/', body,
+                content_type='application/json', HTTP_CONTENT_ENCODING='gzip',
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('exceeds', response.json()['detail'])
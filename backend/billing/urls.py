@@ -7,14 +7,17 @@ urlpatterns = [
     path('summary/usage/',    views.PlatformUsageSummaryView.as_view()),
 
     # Event stream
-    path('events/',        views.EventListView.as_view()),
-    path('events/ingest/', views.EventIngestView.as_view()),
+    path('events/',              views.EventListView.as_view()),
+    path('events/export/',       views.EventExportView.as_view()),
+    path('events/ingest/',       views.EventIngestView.as_view()),
+    path('events/ingest/batch/', views.BatchEventIngestView.as_view()),
 
     # Organizations
     path('organizations/',                             views.OrganizationListView.as_view()),
     path('organizations/<uuid:org_id>/',               views.OrganizationDetailView.as_view()),
     path('organizations/<uuid:org_id>/usage/',         views.OrgUsageView.as_view()),
     path('organizations/<uuid:org_id>/invoices/',      views.OrgInvoicesView.as_view()),
+    path('organizations/<uuid:org_id>/statement/',     views.OrgStatementView.as_view()),
 
     # Invoices
     path('invoices/',                                  views.InvoiceListView.as_view()),
@@ -27,7 +30,8 @@ urlpatterns = [
     path('credits/issue/', views.CreditIssueView.as_view()),
 
     # Ledger
-    path('ledger/', views.LedgerView.as_view()),
+    path('ledger/',        views.LedgerView.as_view()),
+    path('ledger/export/', views.LedgerExportView.as_view()),
 
     # Audit
     path('audit/', views.AuditLogView.as_view()),
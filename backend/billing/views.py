@@ -5,22 +5,27 @@ Layer 4 — Dashboard API & Visualization Layer
 Endpoints:
   GET  /api/billing/summary/platform/
   GET  /api/billing/summary/usage/
-  GET  /api/billing/events/
+  GET  /api/billing/events/                   (?cursor= for keyset paging)
+  GET  /api/billing/events/export/            (NDJSON / CSV stream)
   POST /api/billing/events/ingest/
+  POST /api/billing/events/ingest/batch/
   GET  /api/billing/organizations/
   GET  /api/billing/organizations/:id/
   GET  /api/billing/organizations/:id/usage/
   GET  /api/billing/organizations/:id/invoices/
+  GET  /api/billing/organizations/:id/statement/ (?since=&until= point-in-time totals)
   GET  /api/billing/invoices/
   GET  /api/billing/invoices/:id/
   POST /api/billing/invoices/generate/
   POST /api/billing/invoices/:id/payment/
   GET  /api/billing/credits/
   POST /api/billing/credits/issue/
-  GET  /api/billing/ledger/
+  GET  /api/billing/ledger/                   (?cursor= for keyset paging)
+  GET  /api/billing/ledger/export/            (NDJSON / CSV stream)
   GET  /api/billing/audit/
   GET  /api/billing/pricing/
   GET  /api/billing/metrics/                  (§4.5 Monitoring)
+  GET  /metrics                               (Prometheus text exposition)
   GET  /api/billing/users/<id>/usage/         (§3.7 User-Level)
   GET  /api/billing/users/<id>/billing/       (§3.7 User-Level)
   GET  /api/billing/services/<s>/usage/       (§3.7 Service-Level)
@@ -28,9 +33,15 @@ Endpoints:
 """
 
 import logging
+import threading
 from decimal import Decimal
 
-from django.db.models import Count, Sum
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.permissions import IsAdminUser
@@ -38,9 +49,23 @@ from rest_framework.response import Response
 from rest_framework.throttling import ScopedRateThrottle
 from rest_framework.views import APIView
 
+from .checkpoints import ledger_statement
+from .exports import (
+    EVENT_EXPORT_FIELDS,
+    EXPORT_FORMATS,
+    LEDGER_EXPORT_FIELDS,
+    InvalidCursor,
+    event_cursor,
+    events_after,
+    keyset_page,
+    ledger_after,
+    ledger_cursor,
+    stream_export,
+)
 from .models import (
     BillingAuditLog,
     Credit,
+    DuplicateEventCount,
     Invoice,
     LedgerEntry,
     OrgBalance,
@@ -48,7 +73,9 @@ from .models import (
     Payment,
     PricingRule,
     UsageEvent,
+    UsageRollup,
 )
+from .parsers import GzipJSONParser
 from .serializers import (
     BillingAuditLogSerializer,
     CreditSerializer,
@@ -61,17 +88,26 @@ from .serializers import (
     UsageEventSerializer,
 )
 from .services import (
-    BalanceEngine,
     CostCalculator,
     InvoiceGenerator,
     LedgerWriter,
+    _as_datetime,
     _next_credit_number,
+    enqueue_events,
+    ingest_async,
+    ingest_queue_stats,
     process_event,
+    process_events,
 )
 
 log = logging.getLogger('billing')
 
 
+def _daily_usage(**filters):
+    """Daily UsageRollup rows — dashboard aggregates read these instead of raw events."""
+    return UsageRollup.objects.filter(granularity='day', **filters)
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Platform Summary (Layer 4)
 # ─────────────────────────────────────────────────────────────────────────────
@@ -114,9 +150,9 @@ class PlatformSummaryView(APIView):
         )
 
         usage_by_service = list(
-            UsageEvent.objects.filter(status='processed', event_timestamp__gte=month_start)
+            _daily_usage(bucket__gte=month_start)
             .values('service')
-            .annotate(total_units=Sum('units'), total_cost=Sum('total_cost'))
+            .annotate(total_units=Sum('total_units'), total_cost=Sum('total_cost'))
             .order_by('-total_cost')
         )
 
@@ -169,12 +205,12 @@ class PlatformUsageSummaryView(APIView):
         month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 
         by_service = list(
-            UsageEvent.objects.filter(status='processed', event_timestamp__gte=month_start)
+            _daily_usage(bucket__gte=month_start)
             .values('service', 'unit_type')
             .annotate(
-                total_units = Sum('units'),
+                total_units = Sum('total_units'),
                 total_cost  = Sum('total_cost'),
-                event_count = Count('id'),
+                event_count = Sum('event_count'),
                 org_count   = Count('organization', distinct=True),
             )
             .order_by('service')
@@ -200,34 +236,109 @@ class PlatformUsageSummaryView(APIView):
 # Event Stream (Layer 4)
 # ─────────────────────────────────────────────────────────────────────────────
 
+class InvalidTimeBound(ValueError):
+    pass
+
+
+def _time_bound(params, name):
+    """?since= / ?until= as an aware datetime, None when absent; InvalidTimeBound if it won't parse."""
+    raw = params.get(name)
+    if not raw:
+        return None
+    try:
+        value = _as_datetime(raw)
+    except ValueError:
+        value = None
+    if value is None:
+        raise InvalidTimeBound(f'Invalid {name}. Use ISO-8601')
+    return value
+
+
+def _filtered_events(params):
+    """UsageEvent filters shared by the list and export endpoints; raises InvalidTimeBound."""
+    qs        = UsageEvent.objects.all()
+    service   = params.get('service')
+    org_id    = params.get('org')
+    ev_type   = params.get('type')
+    ev_status = params.get('status')
+    since     = _time_bound(params, 'since')
+    until     = _time_bound(params, 'until')
+
+    if service:   qs = qs.filter(service=service)
+    if org_id:    qs = qs.filter(organization_id=org_id)
+    if ev_type:   qs = qs.filter(event_type=ev_type)
+    if ev_status: qs = qs.filter(status=ev_status)
+    if since:     qs = qs.filter(event_timestamp__gte=since)
+    if until:     qs = qs.filter(event_timestamp__lt=until)
+    return qs
+
+
+def _export_output(request):
+    """?output=ndjson|csv (DRF reserves ?format= for its renderers)."""
+    output = request.query_params.get('output', 'ndjson')
+    return output if output in EXPORT_FORMATS else None
+
+
 class EventListView(APIView):
-    """GET /api/billing/events/"""
+    """
+    GET /api/billing/events/
+
+    Without ?cursor= returns the newest `limit` events as a plain list.
+    With ?cursor= (empty for the first page) pages oldest-first by
+    (event_timestamp, id) and returns {"results": [...], "next_cursor": ...};
+    pass next_cursor back until it is null.
+    """
     permission_classes = [IsAdminUser]
 
     def get(self, request):
-        qs        = UsageEvent.objects.all()
-        service   = request.query_params.get('service')
-        org_id    = request.query_params.get('org')
-        ev_type   = request.query_params.get('type')
-        ev_status = request.query_params.get('status')
-        limit     = min(int(request.query_params.get('limit', 50)), 500)
+        try:
+            qs = _filtered_events(request.query_params).select_related('organization')
+        except InvalidTimeBound as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        limit  = min(int(request.query_params.get('limit', 50)), 500)
+        cursor = request.query_params.get('cursor')
+
+        if cursor is None:
+            return Response(UsageEventSerializer(qs[:limit], many=True).data)
+
+        try:
+            rows, next_cursor = keyset_page(events_after(qs, cursor), limit, event_cursor)
+        except InvalidCursor as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'results': UsageEventSerializer(rows, many=True).data, 'next_cursor': next_cursor})
+
 
-        if service:   qs = qs.filter(service=service)
-        if org_id:    qs = qs.filter(organization_id=org_id)
-        if ev_type:   qs = qs.filter(event_type=ev_type)
-        if ev_status: qs = qs.filter(status=ev_status)
+class EventExportView(APIView):
+    """
+    GET /api/billing/events/export/?output=ndjson|csv
+    Streams every matching event (same filters as /events/, including
+    since / until on event_timestamp) ordered by (event_timestamp, id).
+    """
+    permission_classes = [IsAdminUser]
 
-        return Response(UsageEventSerializer(qs[:limit], many=True).data)
+    def get(self, request):
+        output = _export_output(request)
+        if output is None:
+            return Response({'error': f'output must be one of {sorted(EXPORT_FORMATS)}'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            qs = _filtered_events(request.query_params).order_by('event_timestamp', 'id')
+        except InvalidTimeBound as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return stream_export(qs, EVENT_EXPORT_FIELDS, output, 'usage-events', request)
 
 
 class EventIngestView(APIView):
     """
     POST /api/billing/events/ingest/
     Layer 1 → Layer 2 → Layer 3 pipeline entry point.
+
+    With BILLING_INGEST_MODE='async' the validated payload is only staged
+    for billing_ingest_worker and 202 Accepted is returned (status 'pending').
     """
     permission_classes = [IsAdminUser]
     throttle_classes   = [ScopedRateThrottle]
     throttle_scope     = 'billing_ingest'
+    parser_classes     = [GzipJSONParser]
 
     def post(self, request):
         ser = UsageEventIngestSerializer(data=request.data)
@@ -235,6 +346,12 @@ class EventIngestView(APIView):
             return Response(ser.errors, status=status.HTTP_400_BAD_REQUEST)
 
         payload = dict(ser.validated_data)
+        if ingest_async():
+            item = enqueue_events([payload], source_ip=self._get_ip(request))[0]
+            return Response(
+                {'event_id': str(payload['event_id']), 'status': 'pending', 'queue_id': item.pk},
+                status=status.HTTP_202_ACCEPTED,
+            )
         try:
             event = process_event(payload, source_ip=self._get_ip(request))
         except ValueError as e:
@@ -253,6 +370,71 @@ class EventIngestView(APIView):
         return request.META.get('REMOTE_ADDR')
 
 
+class BatchEventIngestView(APIView):
+    """
+    POST /api/billing/events/ingest/batch/
+    Bulk Layer 1 → Layer 2 → Layer 3 entry point used by the async SDK workers.
+
+    Body: {"events": [<event>, ...]} — each event has the same schema as
+    /events/ingest/. Returns a summary plus one result per event, in order.
+    In async ingest mode valid events are staged (status 'pending', 202).
+    """
+    permission_classes = [IsAdminUser]
+    throttle_classes   = [ScopedRateThrottle]
+    throttle_scope     = 'billing_ingest'
+    parser_classes     = [GzipJSONParser]
+
+    def post(self, request):
+        events = request.data.get('events') if isinstance(request.data, dict) else None
+        if not isinstance(events, list) or not events:
+            return Response({'error': 'events must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+
+        max_events = getattr(settings, 'BILLING_INGEST_BATCH_MAX', 5000)
+        if len(events) > max_events:
+            return Response(
+                {'error': f'Batch too large: {len(events)} events (max {max_events})'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        results  = [None] * len(events)
+        payloads = []
+        indexes  = []
+        for i, item in enumerate(events):
+            ser = UsageEventIngestSerializer(data=item)
+            if not ser.is_valid():
+                results[i] = {
+                    'index': i,
+                    'event_id': str(item.get('event_id', '')) if isinstance(item, dict) else '',
+                    'status': 'invalid', 'total_cost': '0', 'error': ser.errors,
+                }
+                continue
+            payloads.append(dict(ser.validated_data))
+            indexes.append(i)
+
+        queued    = ingest_async()
+        source_ip = EventIngestView._get_ip(request)
+        if payloads and queued:
+            items = enqueue_events(payloads, source_ip=source_ip)
+            for i, payload, item in zip(indexes, payloads, items):
+                results[i] = {
+                    'index': i, 'event_id': str(payload['event_id']), 'status': 'pending',
+                    'total_cost': '0', 'error': '', 'queue_id': item.pk,
+                }
+        elif payloads:
+            for i, result in zip(indexes, process_events(payloads, source_ip=source_ip)):
+                result['index'] = i
+                results[i] = result
+
+        summary = {s: 0 for s in ('processed', 'rejected', 'duplicate', 'invalid', 'pending')}
+        for result in results:
+            summary[result['status']] += 1
+
+        return Response(
+            {'received': len(events), **summary, 'results': results},
+            status=status.HTTP_202_ACCEPTED if queued else status.HTTP_200_OK,
+        )
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Organizations (Layer 4)
 # ─────────────────────────────────────────────────────────────────────────────
@@ -301,9 +483,9 @@ class OrgUsageView(APIView):
 
     def get(self, request, org_id):
         data = (
-            UsageEvent.objects.filter(organization_id=org_id, status='processed')
+            _daily_usage(organization_id=org_id)
             .values('service', 'unit_type')
-            .annotate(total_units=Sum('units'), total_cost=Sum('total_cost'), count=Count('id'))
+            .annotate(total_units=Sum('total_units'), total_cost=Sum('total_cost'), count=Sum('event_count'))
             .order_by('service')
         )
         return Response(list(data))
@@ -318,6 +500,39 @@ class OrgInvoicesView(APIView):
         return Response(InvoiceSerializer(invoices, many=True).data)
 
 
+class OrgStatementView(APIView):
+    """
+    GET /api/billing/organizations/:id/statement/?since=&until=
+
+    Opening totals as of `since`, closing totals as of `until` (default now)
+    and the movement in between, read from the nearest ledger checkpoints.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, org_id):
+        if not Organization.objects.filter(pk=org_id).exists():
+            return Response({'error': 'Not found'}, status=404)
+        try:
+            bounds = {name: _time_bound(request.query_params, name) for name in ('since', 'until')}
+        except InvalidTimeBound as e:
+            return Response({'error': str(e)}, status=400)
+
+        statement = ledger_statement(org_id, **bounds)
+
+        def plain(totals):
+            return {
+                k: v.isoformat() if hasattr(v, 'isoformat') else str(v) if isinstance(v, Decimal) else v
+                for k, v in totals.items()
+            }
+
+        return Response({
+            'organization_id': str(org_id),
+            'opening':         plain(statement['opening']),
+            'closing':         plain(statement['closing']),
+            'movements':       plain(statement['movements']),
+        })
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Invoices (Layer 4)
 # ─────────────────────────────────────────────────────────────────────────────
@@ -478,7 +693,6 @@ class CreditIssueView(APIView):
             note=reason or f'Credit issued: {credit_type}',
             actor=request.user,
         )
-        BalanceEngine.recompute(org)
         BillingAuditLog.objects.create(
             actor=request.user, organization=org,
             action='CREDIT_ISSUED',
@@ -492,22 +706,68 @@ class CreditIssueView(APIView):
 # Ledger (Layer 4)
 # ─────────────────────────────────────────────────────────────────────────────
 
+def _filtered_ledger(params):
+    """LedgerEntry filters shared by the list and export endpoints; raises InvalidTimeBound."""
+    qs         = LedgerEntry.objects.all()
+    org_id     = params.get('org')
+    entry_type = params.get('type')
+    service    = params.get('service')
+    since      = _time_bound(params, 'since')
+    until      = _time_bound(params, 'until')
+
+    if org_id:     qs = qs.filter(organization_id=org_id)
+    if entry_type: qs = qs.filter(entry_type=entry_type)
+    if service:    qs = qs.filter(service=service)
+    if since:      qs = qs.filter(created_at__gte=since)
+    if until:      qs = qs.filter(created_at__lt=until)
+    return qs
+
+
 class LedgerView(APIView):
-    """GET /api/billing/ledger/"""
+    """
+    GET /api/billing/ledger/
+
+    Without ?cursor= returns the newest `limit` entries as a plain list.
+    With ?cursor= (empty for the first page) pages in seq order and returns
+    {"results": [...], "next_cursor": ...}.
+    """
     permission_classes = [IsAdminUser]
 
     def get(self, request):
-        qs         = LedgerEntry.objects.select_related('organization').all()
-        org_id     = request.query_params.get('org')
-        entry_type = request.query_params.get('type')
-        service    = request.query_params.get('service')
-        limit      = min(int(request.query_params.get('limit', 100)), 1000)
+        try:
+            qs = _filtered_ledger(request.query_params).select_related('organization')
+        except InvalidTimeBound as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        limit  = min(int(request.query_params.get('limit', 100)), 1000)
+        cursor = request.query_params.get('cursor')
+
+        if cursor is None:
+            return Response(LedgerEntrySerializer(qs[:limit], many=True).data)
 
-        if org_id:     qs = qs.filter(organization_id=org_id)
-        if entry_type: qs = qs.filter(entry_type=entry_type)
-        if service:    qs = qs.filter(service=service)
+        try:
+            rows, next_cursor = keyset_page(ledger_after(qs, cursor), limit, ledger_cursor)
+        except InvalidCursor as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'results': LedgerEntrySerializer(rows, many=True).data, 'next_cursor': next_cursor})
 
-        return Response(LedgerEntrySerializer(qs[:limit], many=True).data)
+
+class LedgerExportView(APIView):
+    """
+    GET /api/billing/ledger/export/?output=ndjson|csv
+    Streams every matching entry (same filters as /ledger/, plus since /
+    until on created_at) in seq order.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        output = _export_output(request)
+        if output is None:
+            return Response({'error': f'output must be one of {sorted(EXPORT_FORMATS)}'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            qs = ledger_after(_filtered_ledger(request.query_params), '')
+        except InvalidTimeBound as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return stream_export(qs, LEDGER_EXPORT_FIELDS, output, 'ledger', request)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -568,19 +828,19 @@ class UserUsageView(APIView):
         month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
         limit       = min(int(request.query_params.get('limit', 200)), 1000)
 
+        usage = _daily_usage(user_key=user.pk)
         by_service = list(
-            UsageEvent.objects.filter(user=user, status='processed')
-            .values('service', 'unit_type')
+            usage.values('service', 'unit_type')
             .annotate(
-                total_units = Sum('units'),
+                total_units = Sum('total_units'),
                 total_cost  = Sum('total_cost'),
-                event_count = Count('id'),
+                event_count = Sum('event_count'),
             )
             .order_by('service')
         )
 
         mtd_cost = (
-            UsageEvent.objects.filter(user=user, status='processed', event_timestamp__gte=month_start)
+            usage.filter(bucket__gte=month_start)
             .aggregate(s=Sum('total_cost'))['s'] or Decimal('0')
         )
 
@@ -589,10 +849,8 @@ class UserUsageView(APIView):
         ).data
 
         timeline = list(
-            UsageEvent.objects.filter(user=user, status='processed')
-            .extra(select={'day': "date_trunc('day', event_timestamp)"})
-            .values('day')
-            .annotate(total_cost=Sum('total_cost'), event_count=Count('id'))
+            usage.values(day=F('bucket'))
+            .annotate(total_cost=Sum('total_cost'), event_count=Sum('event_count'))
             .order_by('day')
         )
 
@@ -641,24 +899,22 @@ class UserBillingView(APIView):
         now         = timezone.now()
         month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 
+        usage = _daily_usage(user_key=user.pk)
         total_lifetime = (
-            UsageEvent.objects.filter(user=user, status='processed')
-            .aggregate(s=Sum('total_cost'))['s'] or Decimal('0')
+            usage.aggregate(s=Sum('total_cost'))['s'] or Decimal('0')
         )
         total_mtd = (
-            UsageEvent.objects.filter(user=user, status='processed', event_timestamp__gte=month_start)
+            usage.filter(bucket__gte=month_start)
             .aggregate(s=Sum('total_cost'))['s'] or Decimal('0')
         )
         top_services = list(
-            UsageEvent.objects.filter(user=user, status='processed')
-            .values('service')
+            usage.values('service')
             .annotate(total_cost=Sum('total_cost'))
             .order_by('-total_cost')[:5]
         )
         orgs_used = list(
-            UsageEvent.objects.filter(user=user, status='processed')
-            .values('organization__name', 'organization_id')
-            .annotate(total_cost=Sum('total_cost'), event_count=Count('id'))
+            usage.values('organization__name', 'organization_id')
+            .annotate(total_cost=Sum('total_cost'), event_count=Sum('event_count'))
             .order_by('-total_cost')
         )
 
@@ -699,35 +955,29 @@ class ServiceUsageView(APIView):
         now         = timezone.now()
         month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 
-        base = UsageEvent.objects.filter(service=service, status='processed')
+        base = _daily_usage(service=service)
 
         by_unit = list(
             base.values('unit_type')
-            .annotate(total_units=Sum('units'), total_cost=Sum('total_cost'), event_count=Count('id'))
+            .annotate(total_units=Sum('total_units'), total_cost=Sum('total_cost'), event_count=Sum('event_count'))
             .order_by('unit_type')
         )
 
         top_orgs = list(
             base.values('organization__name', 'organization_id')
-            .annotate(total_units=Sum('units'), total_cost=Sum('total_cost'))
+            .annotate(total_units=Sum('total_units'), total_cost=Sum('total_cost'))
             .order_by('-total_cost')[:10]
         )
 
         timeline = list(
-            base.extra(select={'day': "date_trunc('day', event_timestamp)"})
-            .values('day')
-            .annotate(total_units=Sum('units'), total_cost=Sum('total_cost'), event_count=Count('id'))
+            base.values(day=F('bucket'))
+            .annotate(total_units=Sum('total_units'), total_cost=Sum('total_cost'), event_count=Sum('event_count'))
             .order_by('day')
         )
 
-        mtd_units = (
-            base.filter(event_timestamp__gte=month_start)
-            .aggregate(s=Sum('units'))['s'] or Decimal('0')
-        )
-        mtd_cost = (
-            base.filter(event_timestamp__gte=month_start)
-            .aggregate(s=Sum('total_cost'))['s'] or Decimal('0')
-        )
+        mtd = base.filter(bucket__gte=month_start).aggregate(u=Sum('total_units'), c=Sum('total_cost'))
+        mtd_units = mtd['u'] or Decimal('0')
+        mtd_cost  = mtd['c'] or Decimal('0')
 
         return Response({
             'service':    service,
@@ -772,13 +1022,13 @@ class ServiceBillingView(APIView):
         now         = timezone.now()
         month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 
-        base = UsageEvent.objects.filter(service=service, status='processed')
+        base = _daily_usage(service=service)
 
         total_lifetime = (
             base.aggregate(s=Sum('total_cost'))['s'] or Decimal('0')
         )
         total_mtd = (
-            base.filter(event_timestamp__gte=month_start)
+            base.filter(bucket__gte=month_start)
             .aggregate(s=Sum('total_cost'))['s'] or Decimal('0')
         )
 
@@ -792,9 +1042,8 @@ class ServiceBillingView(APIView):
         pricing_rules = PricingRule.objects.filter(service=service, is_active=True)
 
         monthly_trend = list(
-            base.extra(select={'month': "date_trunc('month', event_timestamp)"})
-            .values('month')
-            .annotate(total_cost=Sum('total_cost'), event_count=Count('id'))
+            base.values(month=TruncMonth('bucket'))
+            .annotate(total_cost=Sum('total_cost'), event_count=Sum('event_count'))
             .order_by('month')
         )
 
@@ -826,109 +1075,168 @@ class BillingMetricsView(APIView):
 
     Returns operational health metrics for the billing pipeline:
       - Event pipeline health (queued, failed, duplicate counts)
+      - Async ingest queue backlog depth and lag
       - Ledger statistics (total entries, writes today)
       - Invoice pipeline statistics
       - Credit & payment statistics
       - Compliance posture summary (retention windows)
 
+    Each table is scanned once with conditional aggregation. The result is
+    cached as a snapshot for BILLING_METRICS_CACHE_TTL seconds; for a further
+    BILLING_METRICS_STALE_TTL seconds the stale snapshot is served while one
+    background thread recomputes it. ?fresh=1 bypasses the cache.
+
     Used by monitoring systems, alerting dashboards, and DevOps (§4.5).
     """
     permission_classes = [IsAdminUser]
     throttle_classes   = [ScopedRateThrottle]
     throttle_scope     = 'billing_read'
 
+    CACHE_KEY   = 'billing:metrics:snapshot'
+    REFRESH_KEY = 'billing:metrics:refreshing'
+
     def get(self, request):
-        now         = timezone.now()
+        ttl = getattr(settings, 'BILLING_METRICS_CACHE_TTL', 15)
+
+        snapshot = None if request.query_params.get('fresh') == '1' else cache.get(self.CACHE_KEY)
+        if snapshot is None:
+            snapshot = self.refresh()
+        else:
+            age = (timezone.now() - snapshot['computed_at']).total_seconds()
+            if age >= ttl and cache.add(self.REFRESH_KEY, True, timeout=max(ttl, 5)):
+                # Serve the stale snapshot; only the request holding the refresh lock recomputes.
+                threading.Thread(target=self._refresh_in_background, daemon=True).start()
+
+        age = (timezone.now() - snapshot['computed_at']).total_seconds()
+        return Response({**snapshot['data'], 'snapshot_age_seconds': round(age, 3)})
+
+    @classmethod
+    def refresh(cls) -> dict:
+        ttl   = getattr(settings, 'BILLING_METRICS_CACHE_TTL', 15)
+        stale = getattr(settings, 'BILLING_METRICS_STALE_TTL', 60)
+        now   = timezone.now()
+        snapshot = {'computed_at': now, 'data': cls.compute(now)}
+        cache.set(cls.CACHE_KEY, snapshot, timeout=ttl + stale)
+        return snapshot
+
+    @classmethod
+    def _refresh_in_background(cls):
+        from django.db import connection
+        try:
+            cls.refresh()
+        except Exception:
+            log.exception('Billing metrics refresh failed')
+        finally:
+            cache.delete(cls.REFRESH_KEY)
+            connection.close()
+
+    @staticmethod
+    def compute(now) -> dict:
+        from datetime import timedelta
+
         today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
         hour_start  = now.replace(minute=0, second=0, microsecond=0)
         month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 
+        # Retention windows (§4.4 E)
+        two_years_ago   = now - timedelta(days=730)
+        one_year_ago    = now - timedelta(days=365)
+        seven_years_ago = now - timedelta(days=2555)
+
         # ── Event pipeline ───────────────────────────────────────────────────
-        ev_qs = UsageEvent.objects
-        total_events     = ev_qs.count()
-        pending_events   = ev_qs.filter(status='pending').count()
-        processed_events = ev_qs.filter(status='processed').count()
-        rejected_events  = ev_qs.filter(status='rejected').count()
-        duplicate_events = ev_qs.filter(status='duplicate').count()
-        events_today     = ev_qs.filter(received_at__gte=today_start).count()
-        events_this_hour = ev_qs.filter(received_at__gte=hour_start).count()
-        events_mtd       = ev_qs.filter(received_at__gte=month_start).count()
+        ev = UsageEvent.objects.aggregate(
+            total     = Count('id'),
+            pending   = Count('id', filter=Q(status='pending')),
+            processed = Count('id', filter=Q(status='processed')),
+            rejected  = Count('id', filter=Q(status='rejected')),
+            today     = Count('id', filter=Q(received_at__gte=today_start)),
+            this_hour = Count('id', filter=Q(received_at__gte=hour_start)),
+            mtd       = Count('id', filter=Q(received_at__gte=month_start)),
+            retention = Count('id', filter=Q(received_at__lte=two_years_ago)),
+        )
+        # Redeliveries live in their own counter table; the events keep their status
+        ev['duplicate'] = DuplicateEventCount.objects.aggregate(n=Sum('count'))['n'] or 0
+        ingest_queue   = ingest_queue_stats()
+        total_events   = ev['total']
+        pending_events = ev['pending'] + ingest_queue['depth']
 
         # Error rate (rejected / total, guard div-zero)
         event_error_rate = (
-            round(rejected_events / total_events * 100, 2) if total_events else 0.0
+            round(ev['rejected'] / total_events * 100, 2) if total_events else 0.0
         )
         duplicate_rate = (
-            round(duplicate_events / (total_events + duplicate_events) * 100, 2)
-            if (total_events + duplicate_events) else 0.0
+            round(ev['duplicate'] / (total_events + ev['duplicate']) * 100, 2)
+            if (total_events + ev['duplicate']) else 0.0
         )
 
         # Events per service today
         by_service_today = list(
-            ev_qs.filter(received_at__gte=today_start)
+            UsageEvent.objects.filter(received_at__gte=today_start)
             .values('service')
             .annotate(count=Count('id'), cost=Sum('total_cost'))
             .order_by('-count')
         )
 
         # ── Ledger ───────────────────────────────────────────────────────────
-        total_ledger_entries  = LedgerEntry.objects.count()
-        ledger_writes_today   = LedgerEntry.objects.filter(created_at__gte=today_start).count()
-        ledger_writes_mtd     = LedgerEntry.objects.filter(created_at__gte=month_start).count()
         by_entry_type = list(
             LedgerEntry.objects.values('entry_type')
-            .annotate(count=Count('id'), total=Sum('amount'))
+            .annotate(
+                count     = Count('id'),
+                total     = Sum('amount'),
+                today     = Count('id', filter=Q(created_at__gte=today_start)),
+                mtd       = Count('id', filter=Q(created_at__gte=month_start)),
+                retention = Count('id', filter=Q(created_at__lte=seven_years_ago)),
+            )
+            .order_by('entry_type')
         )
 
         # ── Invoices ─────────────────────────────────────────────────────────
-        inv_counts = dict(
-            Invoice.objects
-            .values_list('status')
-            .annotate(n=Count('id'))
-        )
-        invoices_generated_mtd = Invoice.objects.filter(created_at__gte=month_start).count()
-        overdue_balance = (
-            Invoice.objects.filter(status='overdue')
-            .aggregate(s=Sum('total'))['s'] or Decimal('0')
+        inv_rows = list(
+            Invoice.objects.values('status')
+            .annotate(
+                n     = Count('id'),
+                mtd   = Count('id', filter=Q(created_at__gte=month_start)),
+                total = Sum('total'),
+            )
+            .order_by('status')
         )
+        inv_counts = {r['status']: r['n'] for r in inv_rows}
+        overdue_balance = next((r['total'] for r in inv_rows if r['status'] == 'overdue'), None) or Decimal('0')
 
         # ── Credits & Payments ───────────────────────────────────────────────
-        total_credits  = Credit.objects.count()
-        credits_mtd    = Credit.objects.filter(created_at__gte=month_start).count()
-        total_payments = Payment.objects.count()
-        failed_payments= Payment.objects.filter(status='failed').count()
+        credits  = Credit.objects.aggregate(
+            total = Count('id'),
+            mtd   = Count('id', filter=Q(created_at__gte=month_start)),
+        )
+        payments = Payment.objects.aggregate(
+            total  = Count('id'),
+            failed = Count('id', filter=Q(status='failed')),
+        )
 
         # ── Pricing rules ────────────────────────────────────────────────────
-        active_pricing_rules = PricingRule.objects.filter(is_active=True).count()
-        total_pricing_rules  = PricingRule.objects.count()
+        pricing = PricingRule.objects.aggregate(
+            total  = Count('id'),
+            active = Count('id', filter=Q(is_active=True)),
+        )
 
         # ── Audit trail ──────────────────────────────────────────────────────
-        audit_today = BillingAuditLog.objects.filter(created_at__gte=today_start).count()
-        high_severity_today = BillingAuditLog.objects.filter(
-            created_at__gte=today_start, severity='high'
-        ).count()
-
-        # ── Compliance / Retention posture (§4.4 E) ─────────────────────────
-        from datetime import timedelta
-        two_years_ago = now - timedelta(days=730)
-        one_year_ago  = now - timedelta(days=365)
-        seven_years_ago = now - timedelta(days=2555)
-
-        events_approaching_retention   = ev_qs.filter(received_at__lte=two_years_ago).count()
-        audit_approaching_retention    = BillingAuditLog.objects.filter(created_at__lte=one_year_ago).count()
-        ledger_approaching_retention   = LedgerEntry.objects.filter(created_at__lte=seven_years_ago).count()
+        audit = BillingAuditLog.objects.aggregate(
+            today     = Count('id', filter=Q(created_at__gte=today_start)),
+            high      = Count('id', filter=Q(created_at__gte=today_start, severity='high')),
+            retention = Count('id', filter=Q(created_at__lte=one_year_ago)),
+        )
 
-        return Response({
+        return {
             'as_of': now.isoformat(),
             'event_pipeline': {
                 'total':           total_events,
                 'pending':         pending_events,
-                'processed':       processed_events,
-                'rejected':        rejected_events,
-                'duplicate':       duplicate_events,
-                'today':           events_today,
-                'this_hour':       events_this_hour,
-                'mtd':             events_mtd,
+                'processed':       ev['processed'],
+                'rejected':        ev['rejected'],
+                'duplicate':       ev['duplicate'],
+                'today':           ev['today'],
+                'this_hour':       ev['this_hour'],
+                'mtd':             ev['mtd'],
                 'error_rate_pct':  event_error_rate,
                 'duplicate_rate_pct': duplicate_rate,
                 'by_service_today': [
@@ -940,10 +1248,11 @@ class BillingMetricsView(APIView):
                     for r in by_service_today
                 ],
             },
+            'ingest_queue': ingest_queue,
             'ledger': {
-                'total_entries':  total_ledger_entries,
-                'writes_today':   ledger_writes_today,
-                'writes_mtd':     ledger_writes_mtd,
+                'total_entries':  sum(r['count'] for r in by_entry_type),
+                'writes_today':   sum(r['today'] for r in by_entry_type),
+                'writes_mtd':     sum(r['mtd'] for r in by_entry_type),
                 'by_entry_type': [
                     {
                         'entry_type': r['entry_type'],
@@ -955,28 +1264,28 @@ class BillingMetricsView(APIView):
             },
             'invoices': {
                 'by_status':            inv_counts,
-                'generated_mtd':        invoices_generated_mtd,
+                'generated_mtd':        sum(r['mtd'] for r in inv_rows),
                 'overdue_balance':       str(overdue_balance),
                 'outstanding_count':     inv_counts.get('issued', 0) + inv_counts.get('outstanding', 0),
             },
             'credits_payments': {
-                'total_credits':    total_credits,
-                'credits_mtd':      credits_mtd,
-                'total_payments':   total_payments,
-                'failed_payments':  failed_payments,
+                'total_credits':    credits['total'],
+                'credits_mtd':      credits['mtd'],
+                'total_payments':   payments['total'],
+                'failed_payments':  payments['failed'],
             },
             'pricing': {
-                'active_rules': active_pricing_rules,
-                'total_rules':  total_pricing_rules,
+                'active_rules': pricing['active'],
+                'total_rules':  pricing['total'],
             },
             'audit': {
-                'events_today':       audit_today,
-                'high_severity_today': high_severity_today,
+                'events_today':       audit['today'],
+                'high_severity_today': audit['high'],
             },
             'retention_posture': {
-                'events_past_2yr_window':   events_approaching_retention,
-                'audit_past_1yr_window':    audit_approaching_retention,
-                'ledger_past_7yr_window':   ledger_approaching_retention,
+                'events_past_2yr_window':   ev['retention'],
+                'audit_past_1yr_window':    audit['retention'],
+                'ledger_past_7yr_window':   sum(r['retention'] for r in by_entry_type),
                 'policy': {
                     'events':   '2 years',
                     'audit':    '1 year',
@@ -984,4 +1293,30 @@ class BillingMetricsView(APIView):
                     'invoices': '7 years',
                 },
             },
-        })
+        }
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Prometheus exposition (§4.5 — Monitoring & Observability)
+# ─────────────────────────────────────────────────────────────────────────────
+
+def prometheus_metrics(request):
+    """
+    GET /metrics
+
+    In-process pipeline counters and histograms (billing/telemetry.py),
+    summed across worker processes, in the Prometheus text format.
+    Scrapers authenticate with `Authorization: Bearer <BILLING_METRICS_TOKEN>`;
+    staff sessions are accepted too.
+    """
+    from . import telemetry
+
+    token  = getattr(settings, 'BILLING_METRICS_TOKEN', '')
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    authorized = (
+        (token and constant_time_compare(header, f'Bearer {token}'))
+        or (request.user.is_authenticated and request.user.is_staff)
+    )
+    if not authorized:
+        return HttpResponse('Forbidden\n', status=403, content_type='text/plain')
+    return HttpResponse(telemetry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
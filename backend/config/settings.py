@@ -281,6 +281,63 @@ OPENWEATHER_API_KEY = config('OPENWEATHER_API_KEY', default='').strip()
 # Support system
 SUPPORT_ATTACHMENT_MAX_MB = config('SUPPORT_ATTACHMENT_MAX_MB', default=10, cast=int)
 
+# Billing pipeline
+# Max events accepted by POST /api/billing/events/ingest/batch/ in one request.
+BILLING_INGEST_BATCH_MAX = config('BILLING_INGEST_BATCH_MAX', default=5000, cast=int)
+# Max size of a gzip-encoded ingest body once inflated (Content-Encoding: gzip).
+BILLING_INGEST_MAX_INFLATED_BYTES = config('BILLING_INGEST_MAX_INFLATED_BYTES', default=32 * 1024 * 1024, cast=int)
+# 'incremental' applies each ledger write's delta to OrgBalance atomically;
+# 'recompute' re-aggregates the org's full ledger after every write.
+# Use `manage.py billing_verify_balances` to detect / repair drift.
+BILLING_BALANCE_MODE = config('BILLING_BALANCE_MODE', default='incremental')
+# Ledger sequence numbers reserved per worker round-trip (see billing/sequences.py).
+BILLING_SEQUENCE_BLOCK = config('BILLING_SEQUENCE_BLOCK', default=100, cast=int)
+# Invoice numbers reserved per round-trip; unused numbers leave gaps, so keep it small.
+BILLING_INVOICE_NUMBER_BLOCK = config('BILLING_INVOICE_NUMBER_BLOCK', default=20, cast=int)
+# Max age (seconds) of the in-process pricing rule snapshot. PricingRule writes
+# also bump a version counter in the database; batches check it once each,
+# single lookups at most every VERSION_CHECK_INTERVAL seconds.
+BILLING_PRICING_CACHE_TTL = config('BILLING_PRICING_CACHE_TTL', default=60, cast=int)
+BILLING_PRICING_VERSION_CHECK_INTERVAL = config('BILLING_PRICING_VERSION_CHECK_INTERVAL', default=1.0, cast=float)
+# 'sync' runs the full pipeline inside the ingest request; 'async' only stages
+# validated payloads (202 Accepted) for `manage.py billing_ingest_worker`.
+BILLING_INGEST_MODE = config('BILLING_INGEST_MODE', default='sync')
+BILLING_INGEST_WORKER_BATCH = config('BILLING_INGEST_WORKER_BATCH', default=500, cast=int)
+BILLING_INGEST_MAX_ATTEMPTS = config('BILLING_INGEST_MAX_ATTEMPTS', default=5, cast=int)
+# GET /api/billing/metrics/ snapshot: fresh for CACHE_TTL seconds, then served
+# stale for up to STALE_TTL more while one background refresh runs.
+BILLING_METRICS_CACHE_TTL = config('BILLING_METRICS_CACHE_TTL', default=15, cast=int)
+BILLING_METRICS_STALE_TTL = config('BILLING_METRICS_STALE_TTL', default=60, cast=int)
+# GET /metrics (Prometheus). Scrapers send `Authorization: Bearer <token>`.
+# With BILLING_METRICS_DIR set, a background thread in each process persists
+# its changed counters there every FLUSH_INTERVAL seconds and the endpoint
+# sums all of them (clear the directory on full redeploys).
+BILLING_METRICS_TOKEN = config('BILLING_METRICS_TOKEN', default='')
+BILLING_METRICS_DIR = config('BILLING_METRICS_DIR', default='')
+BILLING_METRICS_FLUSH_INTERVAL = config('BILLING_METRICS_FLUSH_INTERVAL', default=1.0, cast=float)
+# In-memory event_id idempotency front (see billing/idempotency.py): an LRU of
+# committed ids plus a Bloom filter of ids inserted within WINDOW seconds
+# (CAPACITY ids per quarter-window generation). The unique index stays authoritative.
+BILLING_IDEMPOTENCY_FRONT = config('BILLING_IDEMPOTENCY_FRONT', default=True, cast=bool)
+BILLING_IDEMPOTENCY_LRU_SIZE = config('BILLING_IDEMPOTENCY_LRU_SIZE', default=100000, cast=int)
+BILLING_IDEMPOTENCY_BLOOM_CAPACITY = config('BILLING_IDEMPOTENCY_BLOOM_CAPACITY', default=1000000, cast=int)
+BILLING_IDEMPOTENCY_WINDOW = config('BILLING_IDEMPOTENCY_WINDOW', default=86400, cast=int)
+# Duplicate deliveries are counted in memory and upserted into DuplicateEventCount
+# by a background thread every FLUSH_INTERVAL seconds, or by the request once
+# FLUSH_ROWS distinct ids are pending.
+BILLING_DEDUP_FLUSH_INTERVAL = config('BILLING_DEDUP_FLUSH_INTERVAL', default=5.0, cast=float)
+BILLING_DEDUP_FLUSH_ROWS = config('BILLING_DEDUP_FLUSH_ROWS', default=1000, cast=int)
+# Rows fetched per round-trip by the streaming NDJSON / CSV export endpoints.
+BILLING_EXPORT_CHUNK_SIZE = config('BILLING_EXPORT_CHUNK_SIZE', default=2000, cast=int)
+# `billing_retention --archive`: expired events are archived per month before
+# deletion. Format: auto | parquet | arrow (both need pyarrow) | ndjson.gz.
+# Empty DIR stores archives via default_storage under billing-archive/.
+BILLING_ARCHIVE_FORMAT = config('BILLING_ARCHIVE_FORMAT', default='auto')
+BILLING_ARCHIVE_DIR = config('BILLING_ARCHIVE_DIR', default='')
+# `billing_ledger_checkpoints` only folds ledger entries older than this many
+# seconds into a checkpoint, so transactions still in flight are not missed.
+BILLING_LEDGER_CHECKPOINT_LAG = config('BILLING_LEDGER_CHECKPOINT_LAG', default=300, cast=int)
+
 # ── Social Hub OAuth credentials ──────────────────────────────────────────
 # All values must be set in the environment (or .env file) — never hardcoded.
 SOCIAL_OAUTH = {
@@ -431,6 +488,26 @@ ACTIVITY_EXCLUDE_PATHS = config(
 )
 ACTIVITY_INCLUDE_APPS = config('ACTIVITY_INCLUDE_APPS', default='', cast=Csv())
 ACTIVITY_EXCLUDE_APPS = config('ACTIVITY_EXCLUDE_APPS', default='', cast=Csv())
+# Model change log (activity/signals.py): app_label.model allow / deny lists and
+# per-model sampling (e.g. "blog.postview=0.1"). High-volume billing rows are
+# already audited by the ledger.
+ACTIVITY_SIGNAL_INCLUDE_MODELS = config('ACTIVITY_SIGNAL_INCLUDE_MODELS', default='', cast=Csv())
+ACTIVITY_SIGNAL_EXCLUDE_MODELS = config(
+    'ACTIVITY_SIGNAL_EXCLUDE_MODELS',
+    default='billing.usageevent,billing.ledgerentry',
+    cast=Csv()
+)
+ACTIVITY_SIGNAL_SAMPLE_RATES = config('ACTIVITY_SIGNAL_SAMPLE_RATES', default='', cast=Csv())
+# Request activity and committed model changes are queued in memory and
+# bulk-inserted by a background thread (activity/buffer.py). Tests that need
+# rows inside the test transaction turn it off with override_settings.
+ACTIVITY_BUFFERED_WRITES = config('ACTIVITY_BUFFERED_WRITES', default=True, cast=bool)
+# Max buffered events per process; the oldest are dropped beyond this
+ACTIVITY_BUFFER_SIZE = config('ACTIVITY_BUFFER_SIZE', default=10000, cast=int)
+# Flush when this many events are waiting …
+ACTIVITY_BUFFER_FLUSH_ROWS = config('ACTIVITY_BUFFER_FLUSH_ROWS', default=500, cast=int)
+# … or at least this often
+ACTIVITY_BUFFER_FLUSH_INTERVAL_MS = config('ACTIVITY_BUFFER_FLUSH_INTERVAL_MS', default=1000, cast=int)
 
 # Cache Configuration for Better Performance
 CACHES = {
@@ -8,6 +8,7 @@ from django.conf.urls.static import static
 from rest_framework_simplejwt.views import TokenRefreshView
 from accounts.jwt import EmailOrUsernameTokenObtainPairView
 from accounts.auth_views import CsrfView, CookieLoginView, CookieRefreshView, CookieLogoutView
+from billing.views import prometheus_metrics
 from . import views
 
 urlpatterns = [
@@ -15,6 +16,7 @@ urlpatterns = [
     path('sitemap.xml', views.sitemap, name='sitemap'),
     path('robots.txt', views.robots, name='robots'),
     path('api/status/', views.api_status, name='api_status'),
+    path('metrics', prometheus_metrics, name='prometheus_metrics'),
     path('admin/', admin.site.urls),
 
     # JWT Authentication
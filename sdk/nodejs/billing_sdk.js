@@ -20,6 +20,12 @@
  *   });
  *
  *   await sdk.close();
+ *
+ * Pre-aggregation (chatty services such as per-call auth events):
+ *   const sdk = new BillingSDK({ ..., service: 'auth', aggregateWindow: 60000 });
+ *
+ *   emit() folds events into one event per (organizationId, unitType,
+ *   projectId, eventType) and minute; close() sends the open windows.
  */
 
 const crypto  = require('crypto');
@@ -239,6 +245,105 @@ class AsyncWorker {
   }
 }
 
+// ─────────────────────────────────────────────────────────────────────────────
+// Client-side aggregation
+// ─────────────────────────────────────────────────────────────────────────────
+
+const UNIT_SCALE = 1e6;   // units are summed as integer micro-units (6 dp, as stored)
+
+function formatUnits(micro) {
+  const whole = Math.trunc(micro / UNIT_SCALE);
+  const frac  = String(micro % UNIT_SCALE).padStart(6, '0').replace(/0+$/, '');
+  return frac ? `${whole}.${frac}` : String(whole);
+}
+
+/**
+ * Sums units per (organizationId, unitType, projectId, eventType) over
+ * wall-clock windows of `window` ms and hands one event per key and window
+ * to `sink` once the window has closed.
+ *
+ * Windows are aligned to the epoch and the aggregate is stamped with the
+ * window start; userId, metadata and eventId of the folded events are
+ * dropped. The event_id is fixed when the window closes (instance, key,
+ * window, emission counter), so retries are deduplicated while a window
+ * flushed early and refilled is sent as a second event.
+ */
+class Aggregator {
+  constructor({ sink, service, window, maxKeys = 10000 }) {
+    this._sink     = sink;
+    this._service  = service;
+    this._window   = window;
+    this._maxKeys  = maxKeys;
+    this._source   = crypto.randomBytes(16).toString('hex');
+    this._buckets  = new Map();   // JSON [key…, window start] → { units, count }
+    this._emitted  = 0;
+    this._inflight = new Set();
+    this.folded    = 0;
+    this._timer    = setInterval(() => this._close(Date.now()), Math.min(this._window / 4, 1000));
+    if (this._timer.unref) this._timer.unref();
+  }
+
+  add(event) {
+    const at = event.timestamp ? Date.parse(event.timestamp) : Date.now();
+    if (isNaN(at)) throw new Error('timestamp must be ISO8601');
+    const start = at - (at % this._window);
+    const id = JSON.stringify([
+      String(event.organizationId), event.unitType, event.projectId || '', event.eventType, start,
+    ]);
+    let bucket = this._buckets.get(id);
+    if (!bucket) {
+      if (this._buckets.size >= this._maxKeys) this._close(null);
+      bucket = { units: 0, count: 0 };
+      this._buckets.set(id, bucket);
+    }
+    bucket.units += Math.round(Number(event.units) * UNIT_SCALE);
+    bucket.count += 1;
+    this.folded  += 1;
+  }
+
+  /** Close every open window now and wait for the aggregates to be handed off. */
+  async flush() {
+    this._close(null);
+    await Promise.all([...this._inflight]);
+  }
+
+  async stop() {
+    clearInterval(this._timer);
+    await this.flush();
+  }
+
+  stats() {
+    return { aggregated: this.folded, windows: this._emitted, openWindows: this._buckets.size };
+  }
+
+  // Pop the windows that ended by `before` (all when null) and send them.
+  _close(before) {
+    const payloads = [];
+    for (const [id, bucket] of this._buckets) {
+      const [organizationId, unitType, projectId, eventType, start] = JSON.parse(id);
+      if (before !== null && start + this._window > before) continue;
+      this._buckets.delete(id);
+      this._emitted += 1;
+      const windowStart = new Date(start).toISOString();
+      const payload = {
+        event_type:      eventType,
+        organization_id: organizationId,
+        units:           formatUnits(bucket.units),
+        unit_type:       unitType,
+        service:         this._service,
+        timestamp:       windowStart,
+        metadata:        { aggregated_events: bucket.count, window_seconds: this._window / 1000 },
+      };
+      if (projectId) payload.project_id = projectId;
+      payload.event_id = deterministicId({ ...payload, source: this._source, emission: this._emitted });
+      payloads.push(payload);
+    }
+    if (!payloads.length) return;
+    const sent = Promise.resolve(this._sink(payloads)).finally(() => this._inflight.delete(sent));
+    this._inflight.add(sent);
+  }
+}
+
 // ─────────────────────────────────────────────────────────────────────────────
 // Public SDK
 // ─────────────────────────────────────────────────────────────────────────────
@@ -253,19 +358,37 @@ class BillingSDK {
    * @param {number}  [options.batchSize=50]
    * @param {number}  [options.maxRetries=4]
    * @param {number}  [options.timeout=10000]
+   * @param {number}  [options.aggregateWindow=0]  - ms; when set, emit() sums units per
+   *   (organizationId, unitType, projectId, eventType) and sends one event per window
+   * @param {number}  [options.aggregateMaxKeys=10000] - open windows before all are flushed early
    */
-  constructor({ endpoint, apiKey, service, asyncMode = false, batchSize = 50, maxRetries = 4, timeout = 10000 }) {
+  constructor({
+    endpoint, apiKey, service, asyncMode = false, batchSize = 50, maxRetries = 4, timeout = 10000,
+    aggregateWindow = 0, aggregateMaxKeys = 10000,
+  }) {
     if (!VALID_SERVICES.has(service)) {
       throw new Error(`Invalid service "${service}"`);
     }
+    if (!(aggregateWindow >= 0)) {
+      throw new Error('aggregateWindow must be >= 0');
+    }
     this._endpoint   = endpoint.replace(/\/$/, '') + '/';
     this._apiKey     = apiKey;
     this._service    = service;
     this._maxRetries = maxRetries;
     this._timeout    = timeout;
+    this._batchSize  = batchSize;
     this._worker     = asyncMode
       ? new AsyncWorker({ transport: this._endpoint, apiKey, batchSize })
       : null;
+    this._aggregator = aggregateWindow
+      ? new Aggregator({
+          sink:    (payloads) => this._deliverAggregates(payloads),
+          service,
+          window:  aggregateWindow,
+          maxKeys: aggregateMaxKeys,
+        })
+      : null;
   }
 
   /**
@@ -282,10 +405,15 @@ class BillingSDK {
    *   metadata?       {object}
    *   timestamp?      {string}  — ISO8601 (defaults to now)
    *
-   * @returns {Promise<object|null>} API response in sync mode, null in async.
+   * @returns {Promise<object|null>} API response in sync mode, null in async
+   *   or aggregation mode.
    */
   async emit(event) {
     validateEvent(event, this._service);
+    if (this._aggregator) {
+      this._aggregator.add(event);
+      return null;
+    }
     const payload = buildPayload(event, this._service);
 
     if (this._worker) {
@@ -300,13 +428,13 @@ class BillingSDK {
 
   /**
    * Emit multiple events as a single batch (sync only).
-   * In async mode each event is individually queued.
+   * In async or aggregation mode each event goes through emit().
    *
    * @param {object[]} events
    * @returns {Promise<object[]|null>}
    */
   async emitBatch(events) {
-    if (this._worker) {
+    if (this._worker || this._aggregator) {
       for (const ev of events) await this.emit(ev);
       return null;
     }
@@ -325,15 +453,42 @@ class BillingSDK {
     );
   }
 
-  /** Block until all async-queued events have been sent. */
+  /** Close open aggregation windows; block until all async-queued events have been sent. */
   async flush() {
+    if (this._aggregator) await this._aggregator.flush();
     if (this._worker) await this._worker.drain();
   }
 
-  /** Flush and shut down the async worker. */
+  /** Flush open aggregation windows, then shut down the async worker. */
   async close() {
+    if (this._aggregator) await this._aggregator.stop();
     if (this._worker) await this._worker.stop();
   }
+
+  /** Aggregation counters: aggregated (events folded), windows (events sent), openWindows. */
+  stats() {
+    return this._aggregator ? this._aggregator.stats() : { aggregated: 0, windows: 0, openWindows: 0 };
+  }
+
+  // Aggregator sink: queue closed windows (async) or send them in batches.
+  async _deliverAggregates(payloads) {
+    if (this._worker) {
+      for (const payload of payloads) this._worker.enqueue(payload);
+      return;
+    }
+    const batchUrl = this._endpoint.replace('/ingest/', '/ingest/batch/');
+    for (let i = 0; i < payloads.length; i += this._batchSize) {
+      const chunk = payloads.slice(i, i + this._batchSize);
+      try {
+        await withRetry(
+          () => httpPost(batchUrl, this._apiKey, { events: chunk }, this._timeout),
+          this._maxRetries,
+        );
+      } catch (err) {
+        process.stderr.write(`[billing_sdk] aggregate send failed (${chunk.length} events): ${err.message}\n`);
+      }
+    }
+  }
 }
 
 module.exports = { BillingSDK, VALID_SERVICES, VALID_UNIT_TYPES };
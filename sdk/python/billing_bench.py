@@ -0,0 +1,529 @@
+"""
+AtonixDev Billing & Usage — SDK load generator and stand-in ingest server
+
+Drives synthetic multi-org, multi-service usage through BillingSDK and
+reports throughput, latency and (against Django) database queries per event,
+so ingest regressions show up in numbers before they reach production.
+
+Targets:
+    stub     a local HTTP/1.1 keep-alive server that accepts the ingest and
+             batch endpoints (gzip included) and answers like
+             EventIngestView / BatchEventIngestView without touching a
+             database. Measures the SDK and the network path alone.
+    django   the real billing ingest views, served in-process by wsgiref on
+             a throwaway SQLite database (or --database-url, e.g. Postgres).
+             Migrates, seeds bench-org-N organizations and pricing rules, and
+             counts the queries every request runs.
+    <URL>    any running ingest endpoint; pass --api-key.
+
+Modes:
+    sync     emit() per event from --concurrency threads
+    batch    emit_batch() of --batch-size events from --concurrency threads
+    async    emit() into the async worker, then flush(); latency is the
+             enqueue time, throughput includes the drain
+
+Request latency (one HTTP round trip, any mode) is measured around the
+SDK transport and reported next to the per-call latency. For the stub and
+django targets the events the server actually accepted are counted too:
+throughput is based on delivered events, and --fail-below fails a run that
+lost any.
+
+SQLite serializes writers: keep --concurrency low for the django target
+or use --database-url postgres://…
+
+Usage:
+    python billing_bench.py --target stub --mode async --events 50000
+    python billing_bench.py --target django --mode batch --events 5000 --batch-size 100
+    python billing_bench.py --target django --database-url postgres://u:p@localhost/bench --concurrency 8
+    python billing_bench.py --target stub --mode sync --json --fail-below 2000    # CI gate
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn
+from typing import Any, Callable, Dict, List, Optional
+
+from billing_sdk import BillingSDK
+
+# service → unit types accepted by the ingest schema
+SERVICE_UNITS = {
+    'compute':    ['vm_hour'],
+    'storage':    ['gb'],
+    'email':      ['email'],
+    'domain':     ['domain'],
+    'pipeline':   ['pipeline_run'],
+    'networking': ['gb_transfer'],
+    'monitoring': ['agent_hour'],
+    'auth':       ['api_call'],
+    'secrets':    ['key'],
+}
+
+INGEST_PATH = '/api/billing/events/ingest/'
+
+
+# ─── Statistics ──────────────────────────────────────────────────────────────
+
+class _Samples:
+    """Thread-safe latency samples in milliseconds."""
+
+    def __init__(self):
+        self._values: List[float] = []
+        self._lock = threading.Lock()
+
+    def add(self, ms: float) -> None:
+        with self._lock:
+            self._values.append(ms)
+
+    def summary(self) -> Dict[str, Any]:
+        values = sorted(self._values)
+        if not values:
+            return {'count': 0, 'p50': None, 'p99': None, 'max': None}
+
+        def pct(p):
+            return round(values[min(len(values) - 1, int(len(values) * p))], 3)
+        return {'count': len(values), 'p50': pct(0.50), 'p99': pct(0.99), 'max': round(values[-1], 3)}
+
+
+# ─── Stub server ─────────────────────────────────────────────────────────────
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version        = 'HTTP/1.1'
+    disable_nagle_algorithm = True   # headers and body go out in separate writes
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        try:
+            data = json.loads(body or b'{}')
+        except ValueError:
+            return self._reply(400, {'error': 'Invalid JSON'})
+
+        if self.path.rstrip('/').endswith('/batch'):
+            events = data.get('events') or []
+            self.server.accept(e.get('event_id') for e in events)
+            results = [{'event_id': e.get('event_id'), 'status': 'processed'} for e in events]
+            return self._reply(200, {
+                'received':  len(events),
+                'processed': len(events),
+                'rejected':  0,
+                'duplicate': 0,
+                'invalid':   0,
+                'pending':   0,
+                'results':   results,
+            })
+        self.server.accept([data.get('event_id')])
+        return self._reply(201, {'event_id': data.get('event_id'), 'status': 'processed'})
+
+    def _reply(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StubServer(ThreadingHTTPServer):
+    """Stand-in ingest server for dev / CI; remembers the event_ids it accepted."""
+
+    daemon_threads     = True
+    request_queue_size = 128
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        super().__init__((host, port), _StubHandler)
+        self.event_ids = set()
+        self._lock     = threading.Lock()
+
+    def accept(self, event_ids) -> None:
+        with self._lock:
+            self.event_ids.update(event_ids)
+
+    @property
+    def events(self) -> int:
+        """Distinct events accepted (a retried delivery counts once)."""
+        with self._lock:
+            return len(self.event_ids)
+
+    def delivered(self, event_ids: List[str]) -> int:
+        with self._lock:
+            return sum(1 for event_id in event_ids if event_id in self.event_ids)
+
+    @property
+    def endpoint(self) -> str:
+        return f'http://{self.server_address[0]}:{self.server_address[1]}{INGEST_PATH}'
+
+
+# ─── Django target ───────────────────────────────────────────────────────────
+
+class DjangoTarget:
+    """
+    The real ingest views behind wsgiref, with per-request query counting.
+    Django is configured from the environment, so this must run before
+    anything else imports Django settings.
+    """
+
+    def __init__(self, backend_dir: str, database_url: Optional[str], orgs: int, services: List[str]):
+        self._tmp = None
+        if not database_url:
+            self._tmp = tempfile.mkdtemp(prefix='billing-bench-')
+            database_url = f'sqlite:///{self._tmp}/bench.sqlite3'
+        os.environ['DATABASE_URL']            = database_url
+        os.environ['DJANGO_SETTINGS_MODULE']  = 'config.settings'
+        os.environ['DEBUG']                   = 'False'     # DEBUG keeps every query in memory
+        os.environ['SECURE_SSL_REDIRECT']     = 'False'
+        os.environ['ALLOWED_HOSTS']           = '127.0.0.1,localhost'
+        os.environ['BILLING_THROTTLE_INGEST'] = '100000000/min'
+        sys.path.insert(0, os.path.abspath(backend_dir))
+
+        import django
+        django.setup()
+        from django.core.management import call_command
+        from django.db import connection
+
+        call_command('migrate', verbosity=0, interactive=False)
+        self.vendor = connection.vendor
+        self.database_url = database_url
+        self.api_key, self.org_ids = self._seed(orgs, services)
+        self.queries  = 0
+        self.requests = 0
+        self._lock    = threading.Lock()
+
+        from django.core.wsgi import get_wsgi_application
+        from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+        class _Server(ThreadingMixIn, WSGIServer):
+            daemon_threads     = True
+            request_queue_size = 128
+
+        class _Quiet(WSGIRequestHandler):
+            def log_message(self, *args):
+                pass
+
+        self.httpd = make_server('127.0.0.1', 0, self._wrap(get_wsgi_application()),
+                                 server_class=_Server, handler_class=_Quiet)
+
+    @staticmethod
+    def _seed(orgs: int, services: List[str]):
+        from django.contrib.auth import get_user_model
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        from billing.models import Organization, PricingRule
+
+        User = get_user_model()
+        user = User.objects.filter(username='billing-bench').first()
+        if user is None:
+            user = User.objects.create_superuser('billing-bench', 'billing-bench@localhost', None)
+        org_ids = []
+        for n in range(orgs):
+            org, _ = Organization.objects.get_or_create(
+                slug     = f'bench-org-{n}',
+                defaults = {'name': f'Bench Org {n}', 'plan': 'pro', 'status': 'active'},
+            )
+            org_ids.append(str(org.pk))
+        for service in services:
+            for unit_type in SERVICE_UNITS[service]:
+                if not PricingRule.objects.filter(service=service, unit_type=unit_type, is_active=True).exists():
+                    PricingRule.objects.create(service=service, unit_type=unit_type, unit_price='0.010000')
+        return str(AccessToken.for_user(user)), org_ids
+
+    def _wrap(self, app):
+        from django.db import connection
+
+        def counted(environ, start_response):
+            n = [0]
+
+            def counter(execute, sql, params, many, context):
+                n[0] += 1
+                return execute(sql, params, many, context)
+            with connection.execute_wrapper(counter):
+                result = app(environ, start_response)
+                try:
+                    body = list(result)
+                finally:
+                    # request_finished (connection cleanup) runs on close()
+                    if hasattr(result, 'close'):
+                        result.close()
+            with self._lock:
+                self.queries  += n[0]
+                self.requests += 1
+            return body
+        return counted
+
+    @property
+    def endpoint(self) -> str:
+        return f'http://127.0.0.1:{self.httpd.server_address[1]}{INGEST_PATH}'
+
+    def stored_events(self, event_ids: List[str]) -> int:
+        """How many of event_ids the ingest path stored."""
+        from billing.models import UsageEvent
+        return sum(
+            UsageEvent.objects.filter(event_id__in=event_ids[i:i + 500]).count()
+            for i in range(0, len(event_ids), 500)
+        )
+
+    def close(self) -> None:
+        from django.db import connections
+
+        from activity.buffer import activity_buffer
+        from billing.idempotency import duplicate_log
+
+        # Write what the background flushers still hold before the database goes away
+        activity_buffer.stop()
+        duplicate_log.flush()
+        connections.close_all()
+        if self._tmp:
+            shutil.rmtree(self._tmp, ignore_errors=True)
+
+
+# ─── Load generation ─────────────────────────────────────────────────────────
+
+def _events(n: int, org_ids: List[str], services: List[str], seed: int):
+    """n synthetic (service, event) pairs spread across orgs and services."""
+    rng = random.Random(seed)
+    for i in range(n):
+        service = services[i % len(services)]
+        yield service, {
+            'event_id':        str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            'event_type':      f'{service}.usage',
+            'organization_id': rng.choice(org_ids),
+            'project_id':      f'project-{rng.randrange(8)}',
+            'units':           round(rng.uniform(0.01, 10), 4),
+            'unit_type':       SERVICE_UNITS[service][0],
+            'metadata':        {'region': rng.choice(['us-east-1', 'eu-west-1', 'ap-south-1'])},
+        }
+
+
+def _instrument(sdk: BillingSDK, samples: _Samples) -> None:
+    """Time every HTTP round trip the SDK makes."""
+    transport = sdk._transport
+    post = transport._post
+
+    def timed(path, body):
+        started = time.perf_counter()
+        try:
+            return post(path, body)
+        finally:
+            samples.add((time.perf_counter() - started) * 1000)
+    transport._post = timed
+
+
+def run(endpoint: str, api_key: str, org_ids: List[str], args,
+        delivered: Optional[Callable[[List[str]], int]] = None) -> Dict[str, Any]:
+    """
+    Send args.events events and report. `delivered(event_ids)` counts the
+    ones the target actually accepted; without it (URL targets) delivery is
+    unverified and throughput is based on events sent.
+    """
+    calls, requests = _Samples(), _Samples()
+    sdks = {}
+    for service in args.services:
+        sdks[service] = BillingSDK(
+            endpoint, api_key, service,
+            async_mode = args.mode == 'async',
+            batch_size = args.batch_size,
+            workers    = args.workers if args.mode == 'async' else args.concurrency,
+            compress   = not args.no_compress,
+        )
+        _instrument(sdks[service], requests)
+
+    work = list(_events(args.events, org_ids, args.services, args.seed))
+    errors = []
+
+    def drive(chunk):
+        try:
+            if args.mode == 'batch':
+                by_service: Dict[str, List[Dict[str, Any]]] = {}
+                for service, event in chunk:
+                    batch = by_service.setdefault(service, [])
+                    batch.append(event)
+                    if len(batch) >= args.batch_size:
+                        started = time.perf_counter()
+                        sdks[service].emit_batch(batch)
+                        calls.add((time.perf_counter() - started) * 1000)
+                        by_service[service] = []
+                for service, batch in by_service.items():
+                    if batch:
+                        started = time.perf_counter()
+                        sdks[service].emit_batch(batch)
+                        calls.add((time.perf_counter() - started) * 1000)
+            else:
+                for service, event in chunk:
+                    started = time.perf_counter()
+                    sdks[service].emit(event)
+                    calls.add((time.perf_counter() - started) * 1000)
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = 1 if args.mode == 'async' else args.concurrency
+    chunks  = [work[i::threads] for i in range(threads)]
+    started = time.perf_counter()
+    pool = [threading.Thread(target=drive, args=(chunk,), daemon=True) for chunk in chunks]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    for sdk in sdks.values():
+        sdk.flush()
+    elapsed = time.perf_counter() - started
+
+    dropped = 0
+    for sdk in sdks.values():
+        dropped += sdk.stats()['dropped']
+        sdk.close()
+    if errors:
+        raise RuntimeError(f'{len(errors)} driver thread(s) failed; first error: {errors[0]}')
+
+    # Async sends that fail are logged and swallowed by the SDK: count what arrived
+    received = delivered([event['event_id'] for _, event in work]) if delivered else None
+    counted  = args.events if received is None else received
+    return {
+        'mode':           args.mode,
+        'events':         args.events,
+        'delivered':      received,
+        'orgs':           len(org_ids),
+        'services':       args.services,
+        'concurrency':    threads,
+        'seconds':        round(elapsed, 3),
+        'events_per_sec': round(counted / elapsed, 1) if elapsed else None,
+        'call_ms':        calls.summary(),
+        'request_ms':     requests.summary(),
+        'dropped':        dropped,
+    }
+
+
+# ─── CLI ─────────────────────────────────────────────────────────────────────
+
+def _parse_args(argv=None):
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description='Load-test the billing ingest path through BillingSDK.')
+    parser.add_argument('--target', default='stub', help='stub, django, or an ingest endpoint URL (default: stub).')
+    parser.add_argument('--mode', choices=['sync', 'async', 'batch'], default='batch')
+    parser.add_argument('--events', type=int, default=10_000, help='Events to send (default: 10000).')
+    parser.add_argument('--orgs', type=int, default=20, help='Synthetic organizations (default: 20).')
+    parser.add_argument('--services', default='compute,storage,email,networking',
+                        help='Comma-separated services to emit for (default: compute,storage,email,networking).')
+    parser.add_argument('--concurrency', type=int, default=4, help='Driver threads in sync / batch mode (default: 4).')
+    parser.add_argument('--batch-size', type=int, default=100, dest='batch_size', help='Events per batch (default: 100).')
+    parser.add_argument('--workers', type=int, default=4, help='SDK sender threads in async mode (default: 4).')
+    parser.add_argument('--no-compress', action='store_true', dest='no_compress', help='Send bodies uncompressed.')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for the synthetic events (default: 1).')
+    parser.add_argument('--api-key', dest='api_key', default='bench', help='Bearer token for a URL target.')
+    parser.add_argument('--backend-dir', dest='backend_dir', default=os.path.join(here, '..', '..', 'backend'),
+                        help='Django project directory for --target django.')
+    parser.add_argument('--database-url', dest='database_url',
+                        help='Database for --target django (default: a temporary SQLite file).')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON.')
+    parser.add_argument('--fail-below', type=float, dest='fail_below',
+                        help='Exit with status 1 if events/sec is below this value or events went undelivered.')
+    args = parser.parse_args(argv)
+
+    args.services = [s.strip() for s in args.services.split(',') if s.strip()]
+    unknown = sorted(set(args.services) - set(SERVICE_UNITS))
+    if unknown:
+        parser.error(f'unknown service(s): {", ".join(unknown)}')
+    for name in ('events', 'orgs', 'concurrency', 'batch_size', 'workers'):
+        if getattr(args, name) < 1:
+            parser.error(f'--{name.replace("_", "-")} must be positive')
+    return args
+
+
+def _print(report: Dict[str, Any]) -> None:
+    def ms(s):
+        if not s['count']:
+            return '—'
+        return f'p50={s["p50"]:.2f}ms p99={s["p99"]:.2f}ms max={s["max"]:.2f}ms (n={s["count"]})'
+    print(f'target        {report["target"]}')
+    print(f'mode          {report["mode"]}  concurrency={report["concurrency"]}  '
+          f'orgs={report["orgs"]}  services={",".join(report["services"])}')
+    print(f'events        {report["events"]:,} in {report["seconds"]}s')
+    if report['delivered'] is None:
+        print('delivered     unverified (URL target)')
+    else:
+        print(f'delivered     {report["delivered"]:,}')
+    print(f'throughput    {report["events_per_sec"]:,} events/s')
+    print(f'call latency  {ms(report["call_ms"])}')
+    print(f'request       {ms(report["request_ms"])}')
+    if 'queries_per_event' in report:
+        print(f'queries       {report["queries_per_event"]} per event, '
+              f'{report["queries_per_request"]} per request ({report["database"]})')
+    if report['dropped']:
+        print(f'dropped       {report["dropped"]:,}')
+
+
+def main(argv=None) -> int:
+    args = _parse_args(argv)
+    server, django_target = None, None
+    if args.target == 'stub':
+        server = StubServer()
+        endpoint, api_key = server.endpoint, 'bench'
+        org_ids = [str(uuid.UUID(int=n + 1)) for n in range(args.orgs)]
+    elif args.target == 'django':
+        django_target = DjangoTarget(args.backend_dir, args.database_url, args.orgs, args.services)
+        server = django_target.httpd
+        endpoint, api_key, org_ids = django_target.endpoint, django_target.api_key, django_target.org_ids
+        # Async mode runs --workers senders per service; sync / batch drivers block per call
+        senders = len(args.services) * args.workers if args.mode == 'async' else args.concurrency
+        if django_target.vendor == 'sqlite' and senders > 1:
+            print(f'warning: SQLite serializes writes; {senders} concurrent senders will hit lock '
+                  f'errors (503). Use one sender (--concurrency 1, or one service with --workers 1 '
+                  f'in async mode) or --database-url postgres://…', file=sys.stderr)
+    else:
+        endpoint, api_key = args.target, args.api_key
+        org_ids = [str(uuid.UUID(int=n + 1)) for n in range(args.orgs)]
+
+    if django_target is not None:
+        delivered = django_target.stored_events
+    elif server is not None:
+        delivered = server.delivered
+    else:
+        delivered = None
+
+    if server is not None:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        report = run(endpoint, api_key, org_ids, args, delivered)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    report['target'] = args.target
+    if django_target is not None:
+        report['database']            = django_target.vendor
+        report['queries']             = django_target.queries
+        report['queries_per_event']   = round(django_target.queries / args.events, 2)
+        report['queries_per_request'] = round(django_target.queries / max(django_target.requests, 1), 1)
+        django_target.close()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print(report)
+    if args.fail_below is not None:
+        if report['delivered'] is not None and report['delivered'] != report['events']:
+            print(f'FAIL: {report["delivered"]} of {report["events"]} events delivered', file=sys.stderr)
+            return 1
+        if (report['events_per_sec'] or 0) < args.fail_below:
+            print(f'FAIL: {report["events_per_sec"]} events/s is below {args.fail_below}', file=sys.stderr)
+            return 1
+    elif report['delivered'] is not None and report['delivered'] != report['events']:
+        print(f'warning: only {report["delivered"]} of {report["events"]} events delivered', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
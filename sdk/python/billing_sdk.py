@@ -17,24 +17,41 @@ Usage:
         'unit_type':       'vm_hour',
         'metadata':        {'region': 'us-east-1'},
     })
+
+Async delivery:
+    sdk = BillingSDK(..., async_mode=True,
+                     queue_size=10_000,           # bounded in-memory queue
+                     overflow='spill',            # block | drop_oldest | spill
+                     spool_dir='/var/spool/billing-sdk/compute')
+
+    With a spool directory, batches that still fail after retries (and, with
+    overflow='spill', events that do not fit in the queue) are appended to
+    on-disk segment files and replayed in the background — including after a
+    restart. Events still in the in-memory queue when the process is killed
+    are lost; keep queue_size small if that window matters.
+
+Pre-aggregation:
+    sdk = BillingSDK(..., service='auth', aggregate_window=60)
+
+    emit() folds events into one event per (organization_id, unit_type,
+    project_id, event_type) and minute; close() sends the open windows.
+    Use it where per-occurrence detail (user_id, metadata) is not needed.
 """
 
+import gzip
 import hashlib
+import http.client
 import json
 import logging
+import os
 import time
 import threading
 import uuid
 from datetime import datetime, timezone
-from queue import Empty, Queue
+from decimal import Decimal
+from queue import Empty, Full, Queue
 from typing import Any, Dict, List, Optional
-
-try:
-    import urllib.request as _urllib
-    import urllib.error as _urllib_err
-    _HAS_URLLIB = True
-except ImportError:
-    _HAS_URLLIB = False
+from urllib.parse import urlsplit
 
 log = logging.getLogger('atonixdev.billing_sdk')
 
@@ -85,44 +102,110 @@ def _validate_event(event: Dict[str, Any], service: str) -> None:
 # HTTP Transport
 # ─────────────────────────────────────────────────────────────────────────────
 
+GZIP_MIN_BYTES = 1024   # smaller bodies are sent uncompressed
+
+
+def _encode(payload: Dict[str, Any]) -> bytes:
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+
+class _ConnectionPool:
+    """
+    Keep-alive HTTP(S) connections to one host, shared by the sender threads.
+    A request on a reused connection that the server has meanwhile closed is
+    retried once on a fresh one (POSTs are idempotent by event_id).
+    """
+
+    def __init__(self, endpoint: str, timeout: int, size: int):
+        url = urlsplit(endpoint)
+        self._cls     = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self._host    = url.hostname
+        self._port    = url.port
+        self._timeout = timeout
+        self._size    = size
+        self._idle: List[http.client.HTTPConnection] = []
+        self._lock    = threading.Lock()
+
+    def request(self, path: str, body: bytes, headers: Dict[str, str]):
+        """POST `body`; returns (status, response bytes)."""
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        reused = conn is not None
+        while True:
+            if conn is None:
+                conn = self._cls(self._host, self._port, timeout=self._timeout)
+            try:
+                conn.request('POST', path, body=body, headers=headers)
+                resp = conn.getresponse()
+                data = resp.read()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                if not reused:
+                    raise
+                conn, reused = None, False
+                continue
+            if resp.will_close:
+                conn.close()
+            else:
+                with self._lock:
+                    if len(self._idle) < self._size:
+                        self._idle.append(conn)
+                        conn = None
+                if conn is not None:
+                    conn.close()
+            return resp.status, data
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
 class _Transport:
-    def __init__(self, endpoint: str, api_key: str, timeout: int = 10):
+    def __init__(self, endpoint: str, api_key: str, timeout: int = 10,
+                 compress: bool = True, pool_size: int = 4):
         self.endpoint = endpoint.rstrip('/')
+        # endpoint is stored without its trailing slash, so derive the batch
+        # URL from the path suffix (…/events/ingest → …/events/ingest/batch).
+        self.batch_endpoint = self.endpoint + '/batch'
         self.api_key  = api_key
         self.timeout  = timeout
-
-    def send(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        body    = json.dumps(payload).encode('utf-8')
-        headers = {
+        self.compress = compress
+        self._path    = urlsplit(self.endpoint).path
+        self._pool    = _ConnectionPool(self.endpoint, timeout, pool_size)
+        self._headers = {
             'Content-Type':  'application/json',
             'Authorization': f'Bearer {self.api_key}',
             'User-Agent':    'atonixdev-billing-sdk/python/1.0',
         }
-        req = _urllib.Request(self.endpoint + '/', data=body, headers=headers, method='POST')
-        try:
-            with _urllib.urlopen(req, timeout=self.timeout) as resp:
-                return json.loads(resp.read().decode('utf-8'))
-        except _urllib_err.HTTPError as exc:
-            body = exc.read().decode('utf-8', errors='replace')
-            raise RuntimeError(f'HTTP {exc.code}: {body}') from exc
+
+    def send(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return self._post(self._path + '/', _encode(payload))
 
     def send_batch(self, payloads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        body    = json.dumps({'events': payloads}).encode('utf-8')
-        headers = {
-            'Content-Type':  'application/json',
-            'Authorization': f'Bearer {self.api_key}',
-            'User-Agent':    'atonixdev-billing-sdk/python/1.0',
-        }
-        req = _urllib.Request(
-            self.endpoint.replace('/ingest/', '/ingest/batch/') + '/',
-            data=body, headers=headers, method='POST',
-        )
+        return self.send_records([_encode(p) for p in payloads])
+
+    def send_records(self, records: List[bytes]) -> List[Dict[str, Any]]:
+        """Send already-encoded events (one JSON object each) as one batch."""
+        return self._post(self._path + '/batch/', b'{"events":[' + b','.join(records) + b']}')
+
+    def _post(self, path: str, body: bytes):
+        headers = self._headers
+        if self.compress and len(body) >= GZIP_MIN_BYTES:
+            body    = gzip.compress(body, compresslevel=1)
+            headers = {**headers, 'Content-Encoding': 'gzip'}
         try:
-            with _urllib.urlopen(req, timeout=self.timeout) as resp:
-                return json.loads(resp.read().decode('utf-8'))
-        except _urllib_err.HTTPError as exc:
-            body = exc.read().decode('utf-8', errors='replace')
-            raise RuntimeError(f'HTTP {exc.code}: {body}') from exc
+            status, data = self._pool.request(path, body, headers)
+        except (http.client.HTTPException, OSError) as exc:
+            # Raised as RuntimeError so _with_retry treats it as transient
+            raise RuntimeError(f'Connection error: {exc}') from exc
+        if status >= 400:
+            raise RuntimeError(f'HTTP {status}: {data.decode("utf-8", errors="replace")}')
+        return json.loads(data.decode('utf-8'))
+
+    def close(self) -> None:
+        self._pool.close()
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -147,73 +230,499 @@ def _with_retry(fn, max_retries: int = 4, base_delay: float = 0.5):
             delay = min(delay * 2, 30.0)
 
 
+def _is_client_error(exc: Exception) -> bool:
+    return isinstance(exc, RuntimeError) and str(exc).startswith('HTTP 4')
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# On-disk spool
+# ─────────────────────────────────────────────────────────────────────────────
+
+SPOOL_SEGMENT_BYTES = 8 * 1024 * 1024
+
+
+class _Spool:
+    """
+    Append-only on-disk spool of event payloads, one JSON line per event.
+
+    Records go to the active segment file and are fsync'd in groups (every
+    `fsync_every` records or `fsync_interval` seconds, whichever comes first),
+    so a burst costs one fsync instead of one per event. Segments are replayed
+    oldest first; the read position inside a segment is kept in a side `.ack`
+    file and a segment is deleted once fully delivered. Segments left behind
+    by a previous process are replayed on start-up.
+
+    Delivery is at-least-once: a crash between a send and its ack replays the
+    batch, and the ingest API drops the repeat by event_id. Use one spool
+    directory per emitting process.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = SPOOL_SEGMENT_BYTES,
+                 fsync_every: int = 256, fsync_interval: float = 0.5):
+        os.makedirs(directory, exist_ok=True)
+        self._dir            = directory
+        self._segment_bytes  = segment_bytes
+        self._fsync_every    = fsync_every
+        self._fsync_interval = fsync_interval
+        self._lock           = threading.Lock()
+        self._sealed         = sorted(
+            int(name[:-4]) for name in os.listdir(directory)
+            if name.endswith('.seg') and name[:-4].isdigit()
+        )
+        self._next           = self._sealed[-1] + 1 if self._sealed else 1
+        self._active         = None   # (seq, file object) being appended to
+        self._unsynced       = 0
+        self._synced_at      = time.monotonic()
+
+    def _path(self, seq: int, ext: str = 'seg') -> str:
+        return os.path.join(self._dir, f'{seq:012d}.{ext}')
+
+    # ── Writing ──────────────────────────────────────────────────────────────
+
+    def append(self, payloads: List[Dict[str, Any]]) -> None:
+        self.append_records([_encode(p) for p in payloads])
+
+    def append_records(self, records: List[bytes]) -> None:
+        """Append already-encoded events (one JSON object each, no newline)."""
+        data = b''.join(record + b'\n' for record in records)
+        with self._lock:
+            if self._active is None:
+                self._active = (self._next, open(self._path(self._next), 'ab'))
+                self._next += 1
+            fh = self._active[1]
+            fh.write(data)
+            self._unsynced += len(records)
+            if fh.tell() >= self._segment_bytes:
+                self._seal()
+            elif self._unsynced >= self._fsync_every:
+                self._sync()
+
+    def tick(self) -> None:
+        """fsync records that have waited longer than fsync_interval."""
+        with self._lock:
+            if self._unsynced and time.monotonic() - self._synced_at >= self._fsync_interval:
+                self._sync()
+
+    def _sync(self) -> None:
+        if self._active is not None and self._unsynced:
+            fh = self._active[1]
+            fh.flush()
+            os.fsync(fh.fileno())
+        self._unsynced  = 0
+        self._synced_at = time.monotonic()
+
+    def _seal(self) -> None:
+        if self._active is None:
+            return
+        self._sync()
+        seq, fh = self._active
+        fh.close()
+        self._active = None
+        self._sealed.append(seq)
+
+    def close(self) -> None:
+        with self._lock:
+            self._seal()
+
+    # ── Replay ───────────────────────────────────────────────────────────────
+
+    def read(self, max_records: int):
+        """
+        Return (seq, records, offset, exhausted) from the oldest segment, or
+        None when the spool is empty. Records are the encoded events. Pass
+        the tuple's last three fields back to ack() once they are delivered.
+        """
+        with self._lock:
+            if not self._sealed:
+                self._seal()   # nothing older: hand the active segment over
+            if not self._sealed:
+                return None
+            seq = self._sealed[0]
+        offset = self._read_ack(seq)
+        records: List[bytes] = []
+        with open(self._path(seq), 'rb') as fh:
+            fh.seek(offset)
+            while len(records) < max_records:
+                line = fh.readline()
+                if not line:
+                    break
+                offset += len(line)
+                if not line.endswith(b'\n'):
+                    log.warning('billing_sdk spool: dropping torn record at the end of %s', self._path(seq))
+                    break
+                try:
+                    json.loads(line)
+                except ValueError:
+                    log.warning('billing_sdk spool: skipping corrupt record in %s', self._path(seq))
+                    continue
+                records.append(line[:-1])
+            exhausted = not fh.read(1)
+        return seq, records, offset, exhausted
+
+    def ack(self, seq: int, offset: int, exhausted: bool) -> None:
+        if exhausted:
+            for ext in ('seg', 'ack'):
+                try:
+                    os.remove(self._path(seq, ext))
+                except FileNotFoundError:
+                    pass
+            with self._lock:
+                if self._sealed and self._sealed[0] == seq:
+                    self._sealed.pop(0)
+            return
+        tmp = self._path(seq, 'ack.tmp')
+        with open(tmp, 'w') as fh:
+            fh.write(str(offset))
+        os.replace(tmp, self._path(seq, 'ack'))
+
+    def _read_ack(self, seq: int) -> int:
+        try:
+            with open(self._path(seq, 'ack')) as fh:
+                return int(fh.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def pending_bytes(self) -> int:
+        total = 0
+        with self._lock:
+            seqs = list(self._sealed) + ([self._active[0]] if self._active else [])
+        for seq in seqs:
+            try:
+                total += os.path.getsize(self._path(seq)) - self._read_ack(seq)
+            except FileNotFoundError:
+                pass
+        return total
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Async batch worker
 # ─────────────────────────────────────────────────────────────────────────────
 
+OVERFLOW_POLICIES = ('block', 'drop_oldest', 'spill')
+
+
+class _Sender(threading.Thread):
+    """Sends the batches of one partition, strictly one after another."""
+
+    def __init__(self, worker: '_AsyncWorker', index: int):
+        super().__init__(daemon=True, name=f'billing-sdk-sender-{index}')
+        self._worker = worker
+        self.batches: Queue = Queue(maxsize=2)   # backpressure on the collector
+
+    def run(self) -> None:
+        while True:
+            records = self.batches.get()
+            if records is None:
+                return
+            self._worker._send_batch(records)
+
+
 class _AsyncWorker(threading.Thread):
-    """Background thread that drains an in-memory queue in micro-batches."""
+    """
+    Background collector that drains a bounded in-memory queue into batches
+    and hands them to `workers` sender threads.
+
+    Events are partitioned by organization_id, one partition per sender. A
+    sender retries a batch before it sends the next one, so the events of one
+    organization reach the API in emit order even across retries. A batch is
+    handed over once it holds batch_size events, would exceed max_batch_bytes
+    of encoded JSON, or has waited flush_interval seconds.
+
+    When the queue is full, enqueue() applies the overflow policy:
+      block       — wait for room (backpressure on the emitting thread)
+      drop_oldest — discard the oldest queued event to make room
+      spill       — append the event to the on-disk spool
+    Batches that still fail after retries go to the spool when there is one.
+    The collector replays the spool whenever it is idle, backing off while
+    the endpoint keeps failing.
+    """
 
     def __init__(self, transport: _Transport, service: str,
-                 batch_size: int = 50, flush_interval: float = 2.0):
+                 batch_size: int = 50, flush_interval: float = 2.0,
+                 max_retries: int = 4, queue_size: int = 10_000,
+                 overflow: str = 'block', spool: Optional[_Spool] = None,
+                 workers: int = 4, max_batch_bytes: int = 1_000_000):
         super().__init__(daemon=True, name='billing-sdk-worker')
-        self._q              = Queue()
-        self._transport      = transport
-        self._service        = service
-        self._batch_size     = batch_size
-        self._flush_interval = flush_interval
-        self._stop_event     = threading.Event()
+        self._q               = Queue(maxsize=queue_size)
+        self._transport       = transport
+        self._service         = service
+        self._batch_size      = batch_size
+        self._max_batch_bytes = max_batch_bytes
+        self._flush_interval  = flush_interval
+        self._max_retries     = max_retries
+        self._overflow        = overflow
+        self._spool           = spool
+        self._stop_event      = threading.Event()
+        self._counts_lock     = threading.Lock()
+        self.dropped          = 0
+        self.spilled          = 0
+        self._replay_at       = 0.0
+        self._replay_delay    = 0.5
+        self._senders         = [_Sender(self, i) for i in range(max(1, workers))]
+        self._pending         = [[] for _ in self._senders]   # encoded records per partition
+        self._pending_bytes   = [0] * len(self._senders)
+        self._opened_at       = [0.0] * len(self._senders)
 
     def enqueue(self, payload: Dict[str, Any]) -> None:
-        self._q.put(payload)
+        if self._overflow == 'block':
+            self._q.put(payload)
+            return
+        try:
+            self._q.put_nowait(payload)
+            return
+        except Full:
+            pass
+        if self._overflow == 'spill':
+            self._spool.append([payload])
+            with self._counts_lock:
+                self.spilled += 1
+            return
+        while True:  # drop_oldest
+            try:
+                self._q.get_nowait()
+                self._q.task_done()
+                with self._counts_lock:
+                    self.dropped += 1
+                    dropped = self.dropped
+                if dropped % 1000 == 1:
+                    log.warning('billing_sdk queue full: %d events dropped so far', dropped)
+            except Empty:
+                pass
+            try:
+                self._q.put_nowait(payload)
+                return
+            except Full:
+                continue
 
     def flush(self) -> None:
-        """Block until the queue is empty."""
+        """Block until every queued event has been delivered, spooled or dropped."""
         self._q.join()
 
     def stop(self) -> None:
         self._stop_event.set()
         self.flush()
+        self.join(timeout=self._flush_interval + 1)
 
-    def run(self) -> None:
-        while not self._stop_event.is_set():
-            batch: List[Dict[str, Any]] = []
-            deadline = time.monotonic() + self._flush_interval
+    def stats(self) -> Dict[str, int]:
+        with self._counts_lock:
+            counts = {'dropped': self.dropped, 'spilled': self.spilled}
+        counts['queued'] = self._q.qsize()
+        counts['spool_bytes'] = self._spool.pending_bytes() if self._spool else 0
+        return counts
 
-            # Collect up to batch_size events or until flush_interval
-            while len(batch) < self._batch_size:
-                remaining = deadline - time.monotonic()
-                if remaining <= 0:
-                    break
-                try:
-                    item = self._q.get(timeout=min(remaining, 0.1))
-                    batch.append(item)
-                except Empty:
-                    if time.monotonic() >= deadline:
-                        break
+    # ── Collector loop ───────────────────────────────────────────────────────
 
-            if batch:
-                self._send_batch(batch)
+    def run(self) -> None:
+        for sender in self._senders:
+            sender.start()
+        checked_at = time.monotonic()
+        while not self._stop_event.is_set():
+            try:
+                self._add(self._q.get(timeout=0.1))
+                idle = False
+            except Empty:
+                idle = True
+            now = time.monotonic()
+            if idle or now - checked_at >= 0.05:
+                checked_at = now
+                for i, opened_at in enumerate(self._opened_at):
+                    if self._pending[i] and now - opened_at >= self._flush_interval:
+                        self._dispatch(i)
+            if idle and self._spool is not None:
+                self._spool.tick()
+                if not any(self._pending):
+                    while not self._stop_event.is_set() and self._q.empty() and self._replay_spool():
+                        pass
 
         # Drain remaining on shutdown
-        remaining: List[Dict[str, Any]] = []
-        while not self._q.empty():
+        while True:
             try:
-                remaining.append(self._q.get_nowait())
+                self._add(self._q.get_nowait())
             except Empty:
                 break
-        if remaining:
-            self._send_batch(remaining)
-
-    def _send_batch(self, batch: List[Dict[str, Any]]) -> None:
+        for i in range(len(self._senders)):
+            if self._pending[i]:
+                self._dispatch(i)
+        for sender in self._senders:
+            sender.batches.put(None)
+        for sender in self._senders:
+            sender.join()
+        if self._spool is not None:
+            self._spool.close()
+        self._transport.close()
+
+    def _add(self, payload: Dict[str, Any]) -> None:
+        record = _encode(payload)
+        i = hash(str(payload.get('organization_id'))) % len(self._senders)
+        if self._pending[i] and self._pending_bytes[i] + len(record) + 1 > self._max_batch_bytes:
+            self._dispatch(i)
+        if not self._pending[i]:
+            self._opened_at[i] = time.monotonic()
+        self._pending[i].append(record)
+        self._pending_bytes[i] += len(record) + 1
+        if len(self._pending[i]) >= self._batch_size:
+            self._dispatch(i)
+
+    def _dispatch(self, i: int) -> None:
+        records, self._pending[i], self._pending_bytes[i] = self._pending[i], [], 0
+        self._senders[i].batches.put(records)
+
+    # ── Sending (sender threads) ─────────────────────────────────────────────
+
+    def _send_batch(self, records: List[bytes]) -> None:
         try:
-            _with_retry(lambda: self._transport.send_batch(batch))
+            _with_retry(lambda: self._transport.send_records(records), max_retries=self._max_retries)
         except Exception as exc:  # noqa: BLE001
-            log.error('billing_sdk async batch send failed (%d events): %s', len(batch), exc)
+            if self._spool is not None and not _is_client_error(exc):
+                self._spool.append_records(records)
+                log.warning('billing_sdk async batch send failed, spooled %d events: %s', len(records), exc)
+            else:
+                log.error('billing_sdk async batch send failed (%d events): %s', len(records), exc)
         finally:
-            for _ in batch:
+            for _ in records:
                 self._q.task_done()
 
+    def _replay_spool(self) -> bool:
+        """Send one spooled batch. Returns True if the spool may have more to send now."""
+        if time.monotonic() < self._replay_at:
+            return False
+        chunk = self._spool.read(self._batch_size)
+        if chunk is None:
+            return False
+        seq, records, offset, exhausted = chunk
+        if records:
+            try:
+                self._transport.send_records(records)
+            except Exception as exc:  # noqa: BLE001
+                if not _is_client_error(exc):
+                    log.warning('billing_sdk spool replay failed, retrying in %.1fs: %s', self._replay_delay, exc)
+                    self._replay_at    = time.monotonic() + self._replay_delay
+                    self._replay_delay = min(self._replay_delay * 2, 30.0)
+                    return False
+                log.error('billing_sdk spooled batch rejected (%d events): %s', len(records), exc)
+        self._replay_delay = 0.5
+        self._spool.ack(seq, offset, exhausted)
+        return True
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Client-side aggregation
+# ─────────────────────────────────────────────────────────────────────────────
+
+AGGREGATE_KEY = ('organization_id', 'unit_type', 'project_id', 'event_type')
+
+
+def _epoch_seconds(timestamp: Optional[str]) -> float:
+    if not timestamp:
+        return time.time()
+    try:
+        parsed = datetime.fromisoformat(str(timestamp).replace('Z', '+00:00'))
+    except ValueError as exc:
+        raise ValueError(f'timestamp must be ISO8601: {exc}') from exc
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class _Aggregator(threading.Thread):
+    """
+    Sums units per (organization_id, unit_type, project_id, event_type) over
+    wall-clock windows of `window` seconds and hands one event per key and
+    window to `sink` once the window has closed.
+
+    Windows are aligned to the epoch, so a window that divides a day never
+    straddles a month boundary. The aggregate is stamped with the window
+    start; user_id, metadata and event_id of the folded events are dropped.
+    Its event_id is fixed when the window closes — derived from this
+    instance, the key, the window and an emission counter — so retries and
+    spool replays are deduplicated, while a window that is flushed early
+    (flush(), close(), max_keys) and then receives more events is sent as a
+    second event instead of colliding with the first.
+    """
+
+    def __init__(self, sink, service: str, window: float, max_keys: int = 10_000):
+        super().__init__(daemon=True, name='billing-sdk-aggregator')
+        self._sink       = sink
+        self._service    = service
+        self._window     = window
+        self._max_keys   = max_keys
+        self._source     = uuid.uuid4().hex
+        self._buckets: Dict[tuple, list] = {}   # (key, window start) → [units, count]
+        self._lock       = threading.Lock()
+        self._stop_event = threading.Event()
+        self._emitted    = 0
+        self.folded      = 0
+
+    def add(self, event: Dict[str, Any]) -> None:
+        at    = _epoch_seconds(event.get('timestamp'))
+        start = at - at % self._window
+        key   = tuple(str(event.get(field) or '') for field in AGGREGATE_KEY)
+        units = Decimal(str(event['units']))
+        full  = []
+        with self._lock:
+            bucket = self._buckets.get((key, start))
+            if bucket is None:
+                if len(self._buckets) >= self._max_keys:
+                    full = self._take(None)
+                bucket = self._buckets[(key, start)] = [Decimal('0'), 0]
+            bucket[0] += units
+            bucket[1] += 1
+            self.folded += 1
+        if full:
+            self._sink(full)
+
+    def flush(self) -> None:
+        """Close every open window now."""
+        with self._lock:
+            payloads = self._take(None)
+        if payloads:
+            self._sink(payloads)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join(timeout=self._window + 1)
+        self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'aggregated': self.folded, 'windows': self._emitted, 'open_windows': len(self._buckets)}
+
+    def run(self) -> None:
+        tick = min(self._window / 4, 1.0)
+        while not self._stop_event.wait(tick):
+            with self._lock:
+                payloads = self._take(time.time())
+            if payloads:
+                try:
+                    self._sink(payloads)
+                except Exception as exc:  # noqa: BLE001
+                    log.error('billing_sdk aggregate delivery failed (%d events): %s', len(payloads), exc)
+
+    def _take(self, before: Optional[float]) -> List[Dict[str, Any]]:
+        """Pop the windows that ended by `before` (all when None). Caller holds the lock."""
+        closed = [wk for wk in self._buckets if before is None or wk[1] + self._window <= before]
+        payloads = []
+        for key, start in closed:
+            units, count = self._buckets.pop((key, start))
+            self._emitted += 1
+            org_id, unit_type, project_id, event_type = key
+            window_start = datetime.fromtimestamp(start, timezone.utc).isoformat()
+            fingerprint = json.dumps([self._source, self._service, *key, window_start, self._emitted])
+            payload = {
+                'event_id':        str(uuid.UUID(hashlib.sha256(fingerprint.encode()).hexdigest()[:32])),
+                'event_type':      event_type,
+                'organization_id': org_id,
+                'units':           format(units, 'f'),
+                'unit_type':       unit_type,
+                'service':         self._service,
+                'timestamp':       window_start,
+                'metadata':        {'aggregated_events': count, 'window_seconds': self._window},
+            }
+            if project_id:
+                payload['project_id'] = project_id
+            payloads.append(payload)
+        return payloads
+
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Public SDK
@@ -234,6 +743,21 @@ class BillingSDK:
     batch_size: Max events per async batch (default 50)
     max_retries: Retry attempts on transient failures (default 4)
     timeout   : HTTP request timeout in seconds (default 10)
+    workers   : Concurrent sender threads in async mode (default 4). Events
+                of one organization always go through the same sender.
+    max_batch_bytes: Max encoded JSON bytes per async batch (default 1 MB)
+    compress  : gzip request bodies of 1 KB and more (default True)
+    queue_size: Max events held in memory by the async worker (default 10000)
+    overflow  : What emit() does when the queue is full in async mode:
+                'block' (default), 'drop_oldest' or 'spill' (needs spool_dir)
+    spool_dir : Directory for the on-disk spool of undelivered events
+                (async mode). One directory per process.
+    aggregate_window: Seconds (0 = off). When set, emit() sums units per
+                (organization_id, unit_type, project_id, event_type) and
+                sends one event per key and window once the window closes.
+                For chatty services (per-call auth, per-second monitoring).
+    aggregate_max_keys: Open (key, window) pairs before every open window is
+                flushed early (default 10000)
     """
 
     def __init__(
@@ -245,20 +769,50 @@ class BillingSDK:
         batch_size:  int   = 50,
         max_retries: int   = 4,
         timeout:     int   = 10,
+        queue_size:  int   = 10_000,
+        overflow:    str   = 'block',
+        spool_dir:   Optional[str] = None,
+        workers:     int   = 4,
+        max_batch_bytes: int = 1_000_000,
+        compress:    bool  = True,
+        aggregate_window:   float = 0,
+        aggregate_max_keys: int   = 10_000,
     ):
         if service not in VALID_SERVICES:
             raise ValueError(f'Invalid service "{service}"')
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f'Invalid overflow "{overflow}". Valid: {", ".join(OVERFLOW_POLICIES)}')
+        if overflow == 'spill' and not spool_dir:
+            raise ValueError('overflow="spill" requires spool_dir')
+        if aggregate_window < 0:
+            raise ValueError('aggregate_window must be >= 0')
 
         self._service     = service
         self._max_retries = max_retries
-        self._transport   = _Transport(endpoint, api_key, timeout)
+        self._transport   = _Transport(endpoint, api_key, timeout, compress=compress, pool_size=workers)
         self._async       = async_mode
+        self._batch_size  = batch_size
         self._worker: Optional[_AsyncWorker] = None
+        self._aggregator: Optional[_Aggregator] = None
 
         if async_mode:
-            self._worker = _AsyncWorker(self._transport, service, batch_size)
+            self._worker = _AsyncWorker(
+                self._transport, service, batch_size,
+                max_retries     = max_retries,
+                queue_size      = queue_size,
+                overflow        = overflow,
+                spool           = _Spool(spool_dir) if spool_dir else None,
+                workers         = workers,
+                max_batch_bytes = max_batch_bytes,
+            )
             self._worker.start()
 
+        if aggregate_window:
+            self._aggregator = _Aggregator(
+                self._deliver_aggregates, service, aggregate_window, max_keys=aggregate_max_keys,
+            )
+            self._aggregator.start()
+
     # ------------------------------------------------------------------
     def emit(self, event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
@@ -277,9 +831,13 @@ class BillingSDK:
           metadata   dict  — arbitrary key/value pairs
           timestamp  str   — ISO8601 (defaults to now)
 
-        Returns the API response dict in sync mode, None in async mode.
+        Returns the API response dict in sync mode, None in async or
+        aggregation mode.
         """
         _validate_event(event, self._service)
+        if self._aggregator:
+            self._aggregator.add(event)
+            return None
         payload = self._build_payload(event)
 
         if self._async and self._worker:
@@ -294,9 +852,10 @@ class BillingSDK:
         """
         Emit a list of events as a single batch request (sync).
 
-        No-op in async mode (events are already batched by the worker).
+        In async or aggregation mode each event goes through emit() (events
+        are batched by the worker / folded into windows).
         """
-        if self._async:
+        if self._async or self._aggregator:
             for ev in events:
                 self.emit(ev)
             return None
@@ -312,16 +871,49 @@ class BillingSDK:
         )
 
     def flush(self) -> None:
-        """Block until all async-queued events have been delivered."""
+        """Close open aggregation windows; block until all async-queued events have been delivered."""
+        if self._aggregator:
+            self._aggregator.flush()
         if self._worker:
             self._worker.flush()
 
     def close(self) -> None:
-        """Flush and shut down the async worker."""
+        """Flush open aggregation windows and the async worker; close pooled connections."""
+        if self._aggregator:
+            self._aggregator.stop()
         if self._worker:
             self._worker.stop()
+        else:
+            self._transport.close()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Async worker counters: queued, dropped, spilled, spool_bytes; with
+        aggregation also aggregated (events folded), windows (events sent)
+        and open_windows.
+        """
+        if self._worker:
+            counts = self._worker.stats()
+        else:
+            counts = {'queued': 0, 'dropped': 0, 'spilled': 0, 'spool_bytes': 0}
+        if self._aggregator:
+            counts.update(self._aggregator.stats())
+        return counts
 
     # ------------------------------------------------------------------
+    def _deliver_aggregates(self, payloads: List[Dict[str, Any]]) -> None:
+        """Aggregator sink: queue closed windows (async) or send them in batches."""
+        if self._worker:
+            for payload in payloads:
+                self._worker.enqueue(payload)
+            return
+        for i in range(0, len(payloads), self._batch_size):
+            chunk = payloads[i:i + self._batch_size]
+            try:
+                _with_retry(lambda: self._transport.send_batch(chunk), max_retries=self._max_retries)
+            except Exception as exc:  # noqa: BLE001
+                log.error('billing_sdk aggregate send failed (%d events): %s', len(chunk), exc)
+
     def _build_payload(self, event: Dict[str, Any]) -> Dict[str, Any]:
         """Attach service identity, timestamp, and idempotency key."""
         payload = dict(event)